@@ -0,0 +1,3 @@
+from agent.agent import main
+
+main()
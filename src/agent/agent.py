@@ -0,0 +1,109 @@
+"""
+Standalone agent pushing the measurements of the host it runs on to
+HostinGuard, e.g. every second in batches of 60 samples:
+
+    python -m agent --url https://hostinguard.example.com/hostinguard-ingest --app app1 \
+        --interval 1 --batch-size 60 --token <INGEST TOKEN>
+
+It depends on the standard library only and does not need Django settings.
+"""
+import argparse
+import logging
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+from agent import protocol
+from services.procfs import client as procfs_client
+
+logger = logging.getLogger(__name__)
+
+TOKEN_HEADER = 'X-HostinGuard-Token'
+
+
+class Agent(object):
+    """
+    Samples the host every `interval` seconds and pushes the samples in frames
+    of `batch_size`. Samples not pushed yet are kept up to `max_pending`, the
+    oldest being dropped beyond it, and pushed along with the next batch.
+    """
+    TIMEOUT = 10
+
+    def __init__(self, url, app, interval, batch_size, token=None, max_pending=3600,
+                 proc_root=procfs_client.DEFAULT_ROOT):
+        self.url = url
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.token = token
+        self.client = procfs_client.Client(proc_root)
+        self.pending = deque(maxlen=max_pending)
+
+    def sample(self):
+        self.pending.append((time.time(), self.client.measure()))
+
+    def push(self) -> bool:
+        """
+        Pushes every pending sample, returns False when they were not pushed:
+        kept for later after a network error, 429 or 5xx, dropped when
+        HostinGuard rejects them for good (other 4xx, e.g. a wrong token).
+        """
+        samples = list(self.pending)
+        frames = b''.join(
+            protocol.encode(self.app, samples[start:start + protocol.MAX_SAMPLES])
+            for start in range(0, len(samples), protocol.MAX_SAMPLES)
+        )
+        request = urllib.request.Request(self.url, data=frames, method='POST')
+        request.add_header('Content-Type', 'application/octet-stream')
+        if self.token:
+            request.add_header(TOKEN_HEADER, self.token)
+        try:
+            with urllib.request.urlopen(request, timeout=self.TIMEOUT):
+                pass
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code != 429:
+                logger.error('push of ' + str(len(samples)) + ' samples rejected, dropping them: ' + str(e))
+                self._drop(samples)
+            else:
+                logger.warning('push of ' + str(len(samples)) + ' samples failed: ' + str(e))
+            return False
+        except OSError as e:
+            logger.warning('push of ' + str(len(samples)) + ' samples failed: ' + str(e))
+            return False
+        self._drop(samples)
+        return True
+
+    def _drop(self, samples: list):
+        # the samples sampled meanwhile stay pending
+        for _ in samples:
+            self.pending.popleft()
+
+    def run_forever(self):
+        next_sample = time.monotonic()
+        while True:
+            self.sample()
+            if len(self.pending) >= self.batch_size:
+                self.push()
+            next_sample += self.interval
+            time.sleep(max(0, next_sample - time.monotonic()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pushes the host measurements to HostinGuard.')
+    parser.add_argument('--url', required=True, help='URL of the hostinguard-ingest endpoint')
+    parser.add_argument('--app', required=True, help='monitored app the host belongs to')
+    parser.add_argument('--interval', type=float, default=1, help='seconds between samples')
+    parser.add_argument('--batch-size', type=int, default=60, help='samples pushed per request')
+    parser.add_argument('--token', help='ingest token, as set in the INGEST settings')
+    parser.add_argument('--proc-root', default=procfs_client.DEFAULT_ROOT)
+    options = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    Agent(
+        url=options.url,
+        app=options.app,
+        interval=options.interval,
+        batch_size=options.batch_size,
+        token=options.token,
+        proc_root=options.proc_root
+    ).run_forever()
@@ -0,0 +1,165 @@
+"""
+Binary frames pushed by the agents to the hostinguard-ingest endpoint.
+
+A frame carries a batch of samples of one app, its header being followed by
+the (zlib compressed) body:
+
+    header  magic "HG" | version (B) | flags (B) | samples (H) | body length (I)
+    body    app name | metric names (H) | samples
+
+Strings are length-prefixed (H) UTF-8, metric names are listed once per frame
+and every sample is its timestamp (d, seconds since the epoch), its number of
+metrics (H) and as many (name index (H), value (d)) pairs.
+Nested metrics are flattened, e.g. logs_data[404] -> "logs_data.404".
+"""
+import struct
+import zlib
+
+MAGIC = b'HG'
+VERSION = 1
+# flags
+COMPRESSED = 0x01
+
+HEADER = struct.Struct('>2sBBHI')
+LENGTH = struct.Struct('>H')
+SAMPLE = struct.Struct('>dH')
+METRIC = struct.Struct('>Hd')
+MAX_SAMPLES = 0xffff
+# decoded bytes accepted per request, all frames included, so that a small
+# compressed body cannot expand into an unbounded one
+MAX_BODY_SIZE = 16 * 1024 * 1024
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def encode(app: str, samples: list, compress=True) -> bytes:
+    """
+    Returns the frame of `samples`, a list of (timestamp, data) tuples.
+    """
+    if len(samples) > MAX_SAMPLES:
+        raise ProtocolError('too many samples in a frame: ' + str(len(samples)))
+    names = {}
+    encoded_samples = []
+    for timestamp, data in samples:
+        metrics = list(flatten(data))
+        encoded_samples.append(SAMPLE.pack(timestamp, len(metrics)))
+        for name, value in metrics:
+            index = names.setdefault(name, len(names))
+            encoded_samples.append(METRIC.pack(index, value))
+
+    body = [_pack_string(app), LENGTH.pack(len(names))]
+    body.extend(_pack_string(name) for name in names)
+    body.extend(encoded_samples)
+    body = b''.join(body)
+    if len(body) > MAX_BODY_SIZE:
+        raise ProtocolError('frame body too large: ' + str(len(body)) + ' bytes')
+    flags = 0
+    if compress:
+        body = zlib.compress(body)
+        flags |= COMPRESSED
+    return HEADER.pack(MAGIC, VERSION, flags, len(samples), len(body)) + body
+
+
+def decode(frames: bytes) -> list:
+    """
+    Returns the (app, timestamp, data) samples of one or more concatenated frames.
+    """
+    samples = []
+    offset = 0
+    decoded_size = 0
+    while offset < len(frames):
+        if offset + HEADER.size > len(frames):
+            raise ProtocolError('truncated frame header')
+        magic, version, flags, count, length = HEADER.unpack_from(frames, offset)
+        if magic != MAGIC:
+            raise ProtocolError('not a hostinguard frame')
+        if version != VERSION:
+            raise ProtocolError('unsupported frame version ' + str(version))
+        offset += HEADER.size
+        body = frames[offset:offset + length]
+        if len(body) != length:
+            raise ProtocolError('truncated frame body')
+        offset += length
+        if flags & COMPRESSED:
+            decompressor = zlib.decompressobj()
+            try:
+                body = decompressor.decompress(body, MAX_BODY_SIZE - decoded_size + 1)
+            except zlib.error as e:
+                raise ProtocolError('corrupted frame body: ' + str(e))
+            if decompressor.unconsumed_tail:
+                raise ProtocolError('frame body too large')
+            if not decompressor.eof:
+                raise ProtocolError('corrupted frame body: incomplete stream')
+        decoded_size += len(body)
+        if decoded_size > MAX_BODY_SIZE:
+            raise ProtocolError('frame body too large')
+        try:
+            samples.extend(_decode_body(body, count))
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise ProtocolError('malformed frame body: ' + str(e))
+    return samples
+
+
+def flatten(data: dict, prefix=''):
+    """
+    Yields the (name, value) of every numeric field of `data`, nested ones
+    included, as float. Shared with the time series store and the rollups.
+    """
+    for key, value in data.items():
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            yield prefix + str(key), float(value)
+        elif isinstance(value, dict):
+            yield from flatten(value, prefix + str(key) + '.')
+
+
+def unflatten(metrics: dict) -> dict:
+    """
+    Nests back the flattened metrics, integral values becoming int again.
+    """
+    data = {}
+    for name, value in metrics.items():
+        *parents, key = name.split('.')
+        node = data
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[key] = int(value) if value.is_integer() else value
+    return data
+
+
+def _decode_body(body, count):
+    app, offset = _unpack_string(body, 0)
+    names_count, = LENGTH.unpack_from(body, offset)
+    offset += LENGTH.size
+    names = []
+    for _ in range(names_count):
+        name, offset = _unpack_string(body, offset)
+        names.append(name)
+
+    samples = []
+    for _ in range(count):
+        timestamp, metrics_count = SAMPLE.unpack_from(body, offset)
+        offset += SAMPLE.size
+        metrics = {}
+        for _ in range(metrics_count):
+            index, value = METRIC.unpack_from(body, offset)
+            offset += METRIC.size
+            metrics[names[index]] = value
+        samples.append((app, timestamp, unflatten(metrics)))
+    return samples
+
+
+def _pack_string(value):
+    encoded = value.encode('utf-8')
+    return LENGTH.pack(len(encoded)) + encoded
+
+
+def _unpack_string(body, offset):
+    length, = LENGTH.unpack_from(body, offset)
+    offset += LENGTH.size
+    if offset + length > len(body):
+        raise ProtocolError('truncated string')
+    return bytes(body[offset:offset + length]).decode('utf-8'), offset + length
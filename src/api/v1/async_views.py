@@ -0,0 +1,58 @@
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers may be coroutines, served natively by the ASGI
+    application (see asgi.py) instead of holding a worker thread each.
+    DRF only calls handlers synchronously, so dispatch() is awaited in place
+    of APIView.dispatch; under WSGI Django runs the view through async_to_sync.
+
+    The handlers call the backends having an async client (WHM, the static
+    endpoints, ES) natively; the blocking work left (e.g. Google Analytics,
+    the spool) is awaited through sync_to_async(..., thread_sensitive=False),
+    so that the event loop keeps serving the other requests meanwhile.
+    """
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        # a coroutine function, which is how Django tells async views apart
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+        return async_view
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Same as APIView.dispatch, awaiting the coroutine handlers.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # authentication, permissions and throttling may query the database
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
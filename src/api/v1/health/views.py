@@ -1,19 +1,19 @@
-import importlib
 import logging
-import os
 from datetime import datetime
 
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.views import APIView
 
-settings = importlib.import_module(os.environ['DJANGO_SETTINGS_MODULE'])
+from api.v1.async_views import AsyncAPIView
+from main import conf
+
+settings = conf.get_settings()
 logger = logging.getLogger(settings.LOGGER)
 
 
-class HealthView(APIView):
+class HealthView(AsyncAPIView):
 
-    def get(self, request):
+    async def get(self, request):
         response = {'date': datetime.now()}
         logger.info('health response: ' + str(response['date']))
         return Response(
@@ -0,0 +1,320 @@
+import logging
+import math
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+from api.v1.hostinguard import ratelimit, retry
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+# fields following the request line of a raw access log line, quoted ones included
+FIELDS = re.compile(r'"[^"]*"|\S+')
+# the months of the log timestamps, whatever the locale of the process (%b is not)
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+MONTH_NUMBERS = {month: number for number, month in enumerate(MONTHS, 1)}
+
+
+def count_statuses(lines: Iterable, at: Optional[datetime] = None) -> dict:
+    """
+    Builds the status code histogram of an access log in a single pass and
+    constant memory, accepting both:
+    - pre-aggregated "uniq -c" lines, e.g. "541432 200"
+    - raw Apache (common/combined) access log lines, e.g.
+      1.2.3.4 - - [18/Oct/2026:10:00:00 +0000] "GET / HTTP/1.1" 200 1234 "-" "curl/7.58.0"
+      only counted when logged the day of `at`, if given, in the offset of
+      their own timestamp.
+    Malformed lines are skipped.
+    """
+    counts = {}
+    # day of `at` by log offset, e.g. {'+0200': '18/Oct/2026'}
+    days = {}
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        if '"' in line:
+            if at is not None and not is_logged_on(line, at, days):
+                continue
+            # the status code follows the quoted request line
+            parts = line.split('"', 2)
+            fields = parts[2].split(None, 1) if len(parts) == 3 else None
+            if not fields or not fields[0].isdigit():
+                continue
+            status_code, count = int(fields[0]), 1
+        else:
+            fields = line.split()
+            if len(fields) != 2 or not fields[0].isdigit() or not fields[1].isdigit():
+                continue
+            status_code, count = int(fields[1]), int(fields[0])
+        counts[status_code] = counts.get(status_code, 0) + count
+    return counts
+
+
+def is_network_error(error) -> bool:
+    # requests is only imported once used, not to slow down the start of every process
+    import requests
+
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def format_day(at: datetime) -> str:
+    """
+    Returns the day of `at` as written in the access log timestamps, e.g. "18/Oct/2026".
+    """
+    return '%02d/%s/%04d' % (at.day, MONTHS[at.month - 1], at.year)
+
+
+def is_logged_on(line: str, at: datetime, days: dict) -> bool:
+    """
+    Tells whether the raw access log `line` was logged the day of `at`, in the
+    offset of its timestamp (e.g. [18/Oct/2026:00:10:00 +0200]): the local day
+    of the server writing the log. `days` caches the day of `at` by offset.
+    """
+    start = line.find('[') + 1
+    timestamp = line[start:start + 26]
+    if not start or len(timestamp) != 26:
+        return False
+    offset = timestamp[21:]
+    day = days.get(offset)
+    if day is None:
+        if offset[0] not in '+-' or not offset[1:].isdigit():
+            return False
+        delta = timedelta(hours=int(offset[1:3]), minutes=int(offset[3:]))
+        day = days[offset] = format_day(at.astimezone(timezone(-delta if offset[0] == '-' else delta)))
+    return timestamp[:11] == day
+
+
+def parse_minute(raw_minute: str) -> Optional[str]:
+    """
+    Returns the ISO minute of an access log timestamp minute, e.g.
+    "18/Oct/2026:10:00" -> "2026-10-18T10:00", None when malformed.
+    """
+    month = MONTH_NUMBERS.get(raw_minute[3:6])
+    day, year, hour, minute = raw_minute[:2], raw_minute[7:11], raw_minute[12:14], raw_minute[15:17]
+    if month is None or not (day + year + hour + minute).isdigit():
+        return None
+    try:
+        return datetime(int(year), month, int(day), int(hour), int(minute)).strftime('%Y-%m-%dT%H:%M')
+    except ValueError:
+        return None
+
+
+class LatencyHistogram(object):
+    """
+    Log-bucketed (HDR style) histogram of response times: O(1) updates, a few
+    hundred buckets whatever the number of samples, and percentiles with
+    `precision` relative error.
+    """
+
+    def __init__(self, precision=0.02):
+        self.log_base = math.log(1 + precision)
+        self.buckets = {}
+        self.count = 0
+        self.max = 0
+
+    def add(self, value: float):
+        index = int(math.log(value) / self.log_base) if value >= 1 else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def percentile(self, percent: float) -> float:
+        if not self.count:
+            return 0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(math.exp(index * self.log_base), self.max) if index else min(1, self.max)
+        return self.max
+
+
+class IncrementalLogIngester(object):
+    """
+    Reads only the access log lines appended since the previous call, from a
+    local file (`location` is a path) or an HTTP endpoint supporting Range
+    requests (`location` is a URL).
+    The byte offset of the last complete line is remembered, and reset when the
+    file is rotated (inode change) or truncated: lines appended to the old file
+    after the previous call are then lost. Reading starts from the end of the log,
+    so the first call only sets the offset.
+
+    The response times are only measured when `response_time_field` tells
+    where the LogFormat puts them (Apache "%D", microseconds): the position of
+    the field among the ones following the request line, quoted ones counting
+    as one, e.g. 4 for '%h %l %u %t "%r" %>s %b "%{Referer}i" "%{User-agent}i" %D'
+    (or -1, as it comes last).
+    """
+    CHUNK_SIZE = 64 * 1024
+    TIMEOUT = 5
+    RETRY_POLICY = retry.RetryPolicy(
+        max_attempts=3,
+        deadline=10,
+        retry_on_exceptions=is_network_error
+    )
+    PERCENTILES = (50, 90, 99)
+    # parsed timestamps cached, cleared once beyond a day of minutes
+    MINUTES_CACHE_SIZE = 1440
+
+    def __init__(self, location, response_time_field: Optional[int] = None):
+        self.location = location
+        self.response_time_field = response_time_field
+        self.offset = None
+        self.inode = None
+        self._minutes = {}
+        self._lock = threading.Lock()
+
+    def ingest(self) -> dict:
+        """
+        Returns the status codes counted since the previous call (logs_delta),
+        split by minute as well (logs_minutes), and their response time
+        percentiles in milliseconds, when configured.
+        The offset only moves once every new line is counted: lines read by a
+        call that fails are read again by the next one.
+        """
+        statuses = {}
+        minutes = {}
+        latencies = LatencyHistogram()
+        with self._lock:
+            if len(self._minutes) > self.MINUTES_CACHE_SIZE:
+                self._minutes.clear()
+            offset = None
+            for line, offset in self.read_new_lines():
+                parsed = self.parse_line(line)
+                if parsed is None:
+                    continue
+                minute, status_code, response_time = parsed
+                statuses[status_code] = statuses.get(status_code, 0) + 1
+                minute_counts = minutes.setdefault(minute, {})
+                minute_counts[status_code] = minute_counts.get(status_code, 0) + 1
+                if response_time is not None:
+                    latencies.add(response_time / 1000)
+            if offset is not None:
+                self.offset = offset
+
+        data = {
+            'logs_delta': statuses,
+            'logs_minutes': [{'minute': minute, 'counts': counts} for minute, counts in sorted(minutes.items())],
+        }
+        if self.response_time_field is None:
+            return data
+        data['response_time_max'] = latencies.max
+        for percent in self.PERCENTILES:
+            data['response_time_p' + str(percent)] = latencies.percentile(percent)
+        return data
+
+    def parse_line(self, line: bytes) -> Optional[tuple]:
+        """
+        Returns the (minute, status code, response time) of a raw access log
+        line, None when malformed. The response time is None when missing or
+        not configured.
+        """
+        line = line.decode('utf-8', 'replace')
+        parts = line.split('"', 2)
+        if len(parts) != 3 or '[' not in parts[0]:
+            return None
+        fields = FIELDS.findall(parts[2])
+        if not fields or not fields[0].isdigit():
+            return None
+        # [18/Oct/2026:10:00:00 +0000] -> "18/Oct/2026:10:00"
+        raw_minute = parts[0][parts[0].index('[') + 1:][:17]
+        minute = self._minutes.get(raw_minute)
+        if minute is None:
+            minute = parse_minute(raw_minute)
+            if minute is None:
+                return None
+            self._minutes[raw_minute] = minute
+        response_time = None
+        if self.response_time_field is not None and -len(fields) <= self.response_time_field < len(fields):
+            field = fields[self.response_time_field]
+            response_time = int(field) if field.isdigit() else None
+        return minute, int(fields[0]), response_time
+
+    def read_new_lines(self) -> Iterator[Tuple[bytes, int]]:
+        """
+        Yields the complete lines following the offset, along with the offset
+        following each of them, left to the caller to remember.
+        """
+        if self.location.startswith(('http://', 'https://')):
+            chunks = self._read_url()
+        else:
+            chunks = self._read_file()
+        offset = None
+        pending = b''
+        for chunk in chunks:
+            if offset is None:
+                # once the chunks start, the offset is reset if the log was rotated
+                offset = self.offset
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                offset += len(line) + 1
+                yield line, offset
+
+    def _read_file(self) -> Iterator[bytes]:
+        stat = os.stat(self.location)
+        if self.offset is None:
+            self.offset, self.inode = stat.st_size, stat.st_ino
+            return
+        if stat.st_ino != self.inode or stat.st_size < self.offset:
+            logger.info('access log ' + self.location + ' rotated, reading it from the start')
+            self.offset, self.inode = 0, stat.st_ino
+        with open(self.location, 'rb') as log:
+            log.seek(self.offset)
+            for chunk in iter(lambda: log.read(self.CHUNK_SIZE), b''):
+                yield chunk
+
+    def _read_url(self) -> Iterator[bytes]:
+        import requests
+
+        host = urlparse(self.location).hostname
+        if self.offset is None:
+            response = retry.call(
+                lambda: requests.head(self.location, timeout=self.TIMEOUT),
+                policy=self.RETRY_POLICY,
+                endpoint='static:' + host,
+                limit=ratelimit.Limit(ratelimit.STATIC, host)
+            )
+            self.offset = int(response.headers.get('Content-Length', 0))
+            return
+        headers = {'Range': 'bytes=%d-' % self.offset}
+        response = retry.call(
+            lambda: requests.get(self.location, headers=headers, timeout=self.TIMEOUT, stream=True),
+            policy=self.RETRY_POLICY,
+            endpoint='static:' + host,
+            limit=ratelimit.Limit(ratelimit.STATIC, host)
+        )
+        with response:
+            if response.status_code == 416:
+                # nothing new, unless the log was truncated or rotated
+                size = response.headers.get('Content-Range', '*/').rsplit('/', 1)[-1]
+                if size.isdigit() and int(size) < self.offset:
+                    logger.info('access log ' + self.location + ' rotated, reading it from the start')
+                    self.offset = 0
+                return
+            response.raise_for_status()
+            # the server ignored the Range header, skipping what was already read
+            skip = self.offset if response.status_code != 206 else 0
+            for chunk in response.iter_content(self.CHUNK_SIZE):
+                if skip:
+                    chunk, skip = chunk[skip:], max(0, skip - len(chunk))
+                if chunk:
+                    yield chunk
+
+
+# ingesters by log location, they must survive between ticks
+_ingesters = {}
+_ingesters_lock = threading.Lock()
+
+
+def get_ingester(location, response_time_field=None) -> IncrementalLogIngester:
+    with _ingesters_lock:
+        if location not in _ingesters:
+            _ingesters[location] = IncrementalLogIngester(location, response_time_field)
+        return _ingesters[location]
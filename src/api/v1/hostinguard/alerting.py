@@ -0,0 +1,297 @@
+import json
+import logging
+import math
+import operator
+import queue
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+FIRING = 'firing'
+RESOLVED = 'resolved'
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+
+def derive_metrics(data: dict) -> dict:
+    """
+    Returns the metrics computed out of the collected ones, e.g. the ratio of
+    50x responses out of the logs_data status histogram.
+    """
+    derived = {}
+    statuses = data.get('logs_data')
+    if isinstance(statuses, dict):
+        # 999 is the custom code of missing logs
+        codes = {int(code): count for code, count in statuses.items() if str(code).isdigit()}
+        total = sum(count for code, count in codes.items() if code != 999)
+        errors = sum(count for code, count in codes.items() if 500 <= code < 600)
+        if total:
+            derived['logs_5xx_ratio'] = errors / total
+    return derived
+
+
+class ThresholdRule(object):
+    """
+    Fires while `metric` compared (`op`) to a static `value` holds, e.g. cpu_5 > 4.
+    """
+
+    def __init__(self, name, metric, op, value, apps=None):
+        if op not in OPERATORS:
+            expected = ', '.join(OPERATORS)
+            raise ImproperlyConfigured('alerting rule ' + name + ': unknown OP ' + repr(op) + ', expected ' + expected)
+        self.name = name
+        self.metric = metric
+        self.op = op
+        self.value = value
+        self.apps = apps
+        self.compare = OPERATORS[op]
+
+    def new_state(self):
+        return None
+
+    def check(self, value, state):
+        firing = self.compare(value, self.value)
+        return firing, '%s %s %s %s' % (self.metric, value, self.op, self.value)
+
+
+class AnomalyRule(object):
+    """
+    Fires when `metric` deviates more than `threshold` standard deviations from
+    its exponentially weighted moving average (EWMA, smoothing `alpha`), once
+    `warmup` samples were seen. Mean and variance are updated in O(1).
+    """
+
+    def __init__(self, name, metric, threshold=3, alpha=0.1, warmup=10, apps=None):
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.alpha = alpha
+        self.warmup = warmup
+        self.apps = apps
+
+    def new_state(self):
+        return {'count': 0, 'mean': 0.0, 'var': 0.0}
+
+    def check(self, value, state):
+        zscore = 0.0
+        if state['count'] and state['var'] > 0:
+            zscore = (value - state['mean']) / math.sqrt(state['var'])
+        firing = state['count'] >= self.warmup and abs(zscore) > self.threshold
+        message = '%s %s z-score %.2f (ewma %.2f)' % (self.metric, value, zscore, state['mean'])
+
+        if state['count']:
+            diff = value - state['mean']
+            increment = self.alpha * diff
+            state['mean'] += increment
+            state['var'] = (1 - self.alpha) * (state['var'] + diff * increment)
+        else:
+            state['mean'] = value
+        state['count'] += 1
+        return firing, message
+
+
+class LogSink(object):
+
+    def send(self, alert: dict):
+        log = logger.warning if alert['state'] == FIRING else logger.info
+        log('alert ' + alert['state'] + ': ' + alert['app'] + ' ' + alert['rule'] + ' - ' + alert['message'])
+
+
+class FileSink(object):
+    """
+    Appends the alerts as JSON lines to `path`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, alert: dict):
+        with self._lock, open(self.path, 'a') as alerts:
+            alerts.write(json.dumps(alert) + '\n')
+
+
+class WebhookSink(object):
+    """
+    POSTs the alerts as JSON to `url` from a background thread, so that a slow
+    or unreachable endpoint does not hold up the collection ticks. Up to
+    `max_pending` alerts wait to be sent, the newer ones are dropped meanwhile.
+    """
+    TIMEOUT = 5
+    MAX_PENDING = 100
+
+    def __init__(self, url, max_pending=MAX_PENDING):
+        self.url = url
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def send(self, alert: dict):
+        try:
+            self._queue.put_nowait(alert)
+        except queue.Full:
+            logger.warning('alert webhook ' + self.url + ' lagging behind, ' + alert['rule'] + ' alert dropped')
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._post_pending, name='hostinguard-alert-webhook',
+                                                daemon=True)
+                self._thread.start()
+
+    def join(self):
+        """
+        Waits until every pending alert is sent.
+        """
+        self._queue.join()
+
+    def _post_pending(self):
+        # requests is only imported once an alert is posted, not to slow down the start of every process
+        import requests
+
+        while True:
+            alert = self._queue.get()
+            try:
+                requests.post(self.url, json=alert, timeout=self.TIMEOUT)
+            except Exception:
+                logger.exception('alert webhook ' + self.url + ' failed')
+            finally:
+                self._queue.task_done()
+
+
+class AlertEngine(object):
+    """
+    Evaluates every collected document against the rules, keeping per app and
+    rule state only (no history is scanned).
+    A rule notifies the sinks when it starts firing, again every `cooldown`
+    seconds while it keeps firing, and once more when it is resolved.
+    """
+
+    def __init__(self, rules, sinks, cooldown):
+        self.rules = rules
+        self.sinks = sinks
+        self.cooldown = cooldown
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def evaluate(self, app, data: dict, timestamp: float = None) -> list:
+        """
+        Returns the alerts notified for `data`.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        metrics = dict(data, **derive_metrics(data))
+        alerts = []
+        with self._lock:
+            for rule in self.rules:
+                value = metrics.get(rule.metric)
+                if (rule.apps and app not in rule.apps) or not isinstance(value, (int, float)):
+                    continue
+                state = self._states.setdefault((app, rule.name), {'rule': rule.new_state(), 'notified': None})
+                firing, message = rule.check(value, state['rule'])
+                alert = {
+                    'app': app,
+                    'rule': rule.name,
+                    'metric': rule.metric,
+                    'value': value,
+                    'message': message,
+                    'timestamp': timestamp,
+                }
+                if firing and (state['notified'] is None or timestamp - state['notified'] >= self.cooldown):
+                    state['notified'] = timestamp
+                    alerts.append(dict(alert, state=FIRING))
+                elif not firing and state['notified'] is not None:
+                    state['notified'] = None
+                    alerts.append(dict(alert, state=RESOLVED))
+
+        for alert in alerts:
+            for sink in self.sinks:
+                try:
+                    sink.send(alert)
+                except Exception:
+                    logger.exception('alert sink ' + type(sink).__name__ + ' failed')
+        return alerts
+
+
+def build_rule(definition: dict):
+    """
+    Returns the rule of an ALERTING RULES `definition`, raising
+    ImproperlyConfigured when it is not valid.
+    """
+    try:
+        options = {
+            'name': definition['NAME'],
+            'metric': definition['METRIC'],
+            'apps': definition.get('APPS'),
+        }
+        rule_type = definition.get('TYPE', 'threshold')
+        if rule_type == 'threshold':
+            return ThresholdRule(op=definition['OP'], value=definition['VALUE'], **options)
+    except KeyError as e:
+        raise ImproperlyConfigured('alerting rule ' + str(definition.get('NAME')) + ': missing ' + str(e))
+    if rule_type != 'anomaly':
+        raise ImproperlyConfigured('alerting rule ' + options['name'] + ': unknown TYPE ' + repr(rule_type))
+    return AnomalyRule(
+        threshold=definition.get('THRESHOLD', 3),
+        alpha=definition.get('ALPHA', 0.1),
+        warmup=definition.get('WARMUP', 10),
+        **options
+    )
+
+
+def build_sink(definition: dict):
+    options = {key.lower(): value for key, value in definition.items() if key != 'CLASS'}
+    return import_string(definition['CLASS'])(**options)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_alert_engine() -> AlertEngine:
+    """
+    Returns the alert engine of this process, built out of the ALERTING settings.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            alerting = getattr(settings, 'ALERTING', {})
+            _engine = AlertEngine(
+                rules=build_rules(alerting.get('RULES', [])),
+                sinks=[build_sink(sink) for sink in alerting.get('SINKS', [])],
+                cooldown=alerting.get('COOLDOWN', 900)
+            )
+        return _engine
+
+
+def build_rules(definitions: list) -> list:
+    """
+    Returns the rules of the valid `definitions`, the invalid ones being
+    reported once, when the engine is built, instead of failing every tick.
+    """
+    rules = []
+    for definition in definitions:
+        try:
+            rules.append(build_rule(definition))
+        except ImproperlyConfigured as e:
+            logger.error('alerting rule ignored: ' + str(e))
+    return rules
+
+
+def reset():
+    """
+    Drops the alert engine, rebuilt out of the settings on next use.
+    """
+    global _engine
+    with _engine_lock:
+        _engine = None
@@ -1,67 +1,84 @@
-import importlib
+import asyncio
 import logging
-import os
 
+from asgiref.sync import sync_to_async
+from django.utils.timezone import now
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.views import APIView
 
-from api.v1.hostinguard import service_handler
+from api.v1.async_views import AsyncAPIView
+from api.v1.hostinguard import (collector, es_writer, indices, pipeline,
+                                service_handler, spool)
 from api.v1.hostinguard.constants import APP1
+from api.v1.hostinguard.views import get_response_status
+from main import conf
 
-settings = importlib.import_module(os.environ['DJANGO_SETTINGS_MODULE'])
+settings = conf.get_settings()
 logger = logging.getLogger(settings.LOGGER)
 
 
-class HostinGuardView(APIView):
+class HostinGuardView(AsyncAPIView):
 
-    def post(self, request):
+    async def post(self, request):
         """
         Fetches last server measurements and update ElasticSearch accordingly.
-        This EP should be triggered automatically through a scheduled job.
+        This EP should be triggered automatically through a scheduled job,
+        "manage.py hostinguard_collect" collects all the apps without it.
         """
-        google_handler = service_handler.GoogleHandler(
-            api_name=settings.GOOGLE_API[APP1]['API_NAME'],
-            api_version=settings.GOOGLE_API[APP1]['API_VERSION'],
-            scopes=settings.GOOGLE_API[APP1]['SCOPES'],
-            key_file_location=settings.GOOGLE_API[APP1]['KEY_FILE_LOCATION']
-        )
-        google_data = google_handler.get_google_data()
-        logger.debug('google_data: ' + str(google_data))
+        response = await self.update()
+        logger.debug('es persistence: ' + response['result'])
 
-        cpanel_handler = service_handler.CPanelHandler(
-            host=settings.CPANEL[APP1]['HOST'],
-            username=settings.CPANEL[APP1]['USERNAME'],
-            password=settings.CPANEL[APP1]['PASSWORD'],
-            use_ssl=settings.CPANEL[APP1]['USE_SSL']
-        )
-        cpanel_data = cpanel_handler.get_cpanel_data()
-        logger.debug('cpanel_data: ' + str(cpanel_data))
+        http_status, response_status = get_response_status([response])
+        if http_status == status.HTTP_400_BAD_REQUEST:
+            return Response(status=http_status, data={'status': response_status, 'error': response.get('error')})
+        return Response(status=http_status, data={'status': response_status})
 
-        static_resource_handler = service_handler.StaticResourceHandler(
-            free_ep=settings.STATIC_RESOURCE[APP1]['FREE_EP'],
-            logs_ep=settings.STATIC_RESOURCE[APP1]['LOGS_EP']
-        )
-        memory_data = static_resource_handler.get_memory_data()
-        logger.debug('memory_data: ' + str(memory_data))
-        logs_data = {'logs_data': static_resource_handler.get_logs_data()}
-        logger.debug('logs_data: ' + str(logs_data))
+    async def update(self) -> dict:
+        """
+        Collects APP1 and persists its document, returning the persistence result.
+        ES is called through the async HTTP client, while the spool and the
+        pipeline are written in a thread of the event loop executor. A document
+        given to the bulk writer is answered with its own result once flushed.
+        """
+        data = await collector.collect_app_async(APP1)
+        index = indices.get_index(APP1, data.setdefault('timestamp', now()))
 
-        data = {
-            **google_data,
-            **cpanel_data,
-            **memory_data,
-            **logs_data
-        }
+        if spool.is_enabled() or pipeline.is_enabled():
+            return await sync_to_async(self.persist, thread_sensitive=False)(index, data)
+        if getattr(settings, 'ES_BULK', {}).get('ENABLED'):
+            writer = es_writer.get_bulk_writer(
+                es_service=settings.ES_SERVICE,
+                max_docs=settings.ES_BULK['MAX_DOCS'],
+                flush_interval=settings.ES_BULK['FLUSH_INTERVAL']
+            )
+            # answered once the document is flushed, along with the others buffered meanwhile
+            return await asyncio.wrap_future(writer.write(
+                index=index,
+                doc_type=settings.ES[APP1]['DOC_TYPE'],
+                data=data
+            ))
         elastic_search_handler = service_handler.ElasticSearchHandler(
             es_service=settings.ES_SERVICE,
-            index=settings.ES[APP1]['INDEX'],
+            index=index,
             doc_type=settings.ES[APP1]['DOC_TYPE']
         )
-        response = elastic_search_handler.write_result(data)
-        logger.debug('es persistence: ' + response['result'])
+        return await elastic_search_handler.write_result_async(data)
 
-        if response['result'] == 'created':
-            return Response(status=status.HTTP_201_CREATED, data={'status': 'SUCCESS'})
-        else:
-            return Response(status=status.HTTP_400_BAD_REQUEST, data={'status': 'FAILURE'})
+    @staticmethod
+    def persist(index, data: dict) -> dict:
+        """
+        Hands the APP1 document `data` over to the pipeline or the spool, the
+        pipeline first when both are enabled (see persistence.write), returning its result.
+        """
+        if pipeline.is_enabled():
+            return pipeline.get_pipeline().write(
+                index=index,
+                doc_type=settings.ES[APP1]['DOC_TYPE'],
+                data=data
+            )
+        spool.get_spool().append({
+            'index': index,
+            'doc_type': settings.ES[APP1]['DOC_TYPE'],
+            'data': data
+        })
+        return {'result': 'spooled'}
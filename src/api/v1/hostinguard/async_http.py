@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+# long-lived httpx.AsyncClient of the static endpoints and ES, by event loop:
+# their connections are bound to it. Each goes with the task closing it once
+# the loop shuts down (see close_on_shutdown).
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the httpx.AsyncClient shared by the coroutines of the running event
+    loop, creating it on first use. Failed requests are not retried by the
+    client itself, see retry.call_async.
+    """
+    # httpx is only imported once used, not to slow down the start of every process
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        entry = _clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient()
+            entry = _clients[loop] = (client, loop.create_task(close_on_shutdown(loop, client)))
+        return entry[0]
+
+
+async def close_on_shutdown(loop, client):
+    """
+    Closes `client` once `loop` shuts down, cancelling its pending tasks as
+    asyncio.run does: async_to_sync runs every call on a new loop when there is
+    no long-lived one (WSGI), which would otherwise leave the connections open.
+    """
+    try:
+        await loop.create_future()
+    finally:
+        with _lock:
+            _clients.pop(loop, None)
+        await client.aclose()
+
+
+def reset():
+    """
+    Drops every cached client.
+    """
+    with _lock:
+        _clients.clear()
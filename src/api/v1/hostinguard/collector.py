@@ -0,0 +1,489 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent import futures
+
+from asgiref.sync import sync_to_async
+from django.utils.timezone import now
+
+from api.v1.hostinguard import (access_logs, alerting, constants, indices,
+                                instrumentation, persistence, rollup,
+                                service_handler, timeseries)
+from main import conf
+from services.cpanelapi import client as cpanel_client
+from services.procfs import client as procfs_client
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+
+class SequentialCollector(object):
+    """
+    Runs the data sources of a tick one after another.
+    """
+
+    def collect(self, sources: dict) -> dict:
+        data = {}
+        for name, source in sources.items():
+            result = source()
+            logger.debug(name + '_data: ' + str(result))
+            data.update(result)
+        return data
+
+    async def collect_async(self, sources: dict) -> dict:
+        """
+        Same as collect(), for coroutine function sources (see build_async_sources).
+        """
+        data = {}
+        for name, source in sources.items():
+            result = await source()
+            logger.debug(name + '_data: ' + str(result))
+            data.update(result)
+        return data
+
+
+class ConcurrentCollector(object):
+    """
+    Runs the data sources of a tick concurrently, each one bounded by its own deadline.
+    Sources missing their deadline (or failing) are listed under the PARTIAL_SOURCES
+    field, so that one slow backend does not hold up the whole tick.
+
+    The sources run in a long-lived pool of `max_workers` threads, shared by
+    every collector of the same size: a late source keeps its thread until it
+    returns, so that late sources never hold more than `max_workers` threads.
+    """
+
+    # sources executors, by max workers
+    _executors = {}
+    _executors_lock = threading.Lock()
+
+    def __init__(self, max_workers, timeout, source_timeouts=None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.source_timeouts = source_timeouts or {}
+
+    def collect(self, sources: dict) -> dict:
+        executor = self.get_executor()
+        started = time.monotonic()
+        pending = {name: executor.submit(source) for name, source in sources.items()}
+
+        data = {}
+        for name, future in pending.items():
+            try:
+                result = future.result(timeout=self.get_timeout(name, started))
+            except futures.TimeoutError:
+                # dropped when every worker is still busy, left running in background otherwise
+                future.cancel()
+                logger.warning('source ' + name + ' missed its deadline')
+                self.set_partial(data, name)
+                continue
+            except Exception:
+                logger.exception('source ' + name + ' failed')
+                self.set_partial(data, name)
+                continue
+            logger.debug(name + '_data: ' + str(result))
+            data.update(result)
+        return data
+
+    async def collect_async(self, sources: dict) -> dict:
+        """
+        Same as collect(), for coroutine function sources (see build_async_sources),
+        at most `max_workers` of them running at a time. Sources missing their
+        deadline are cancelled.
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(source):
+            async with semaphore:
+                return await source()
+
+        started = time.monotonic()
+        pending = {name: asyncio.ensure_future(run(source)) for name, source in sources.items()}
+
+        data = {}
+        for name, task in pending.items():
+            try:
+                result = await asyncio.wait_for(task, timeout=self.get_timeout(name, started))
+            except asyncio.TimeoutError:
+                logger.warning('source ' + name + ' missed its deadline')
+                self.set_partial(data, name)
+                continue
+            except Exception:
+                logger.exception('source ' + name + ' failed')
+                self.set_partial(data, name)
+                continue
+            logger.debug(name + '_data: ' + str(result))
+            data.update(result)
+        return data
+
+    def get_executor(self) -> futures.ThreadPoolExecutor:
+        with self._executors_lock:
+            if self.max_workers not in self._executors:
+                self._executors[self.max_workers] = futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='source')
+            return self._executors[self.max_workers]
+
+    def get_timeout(self, name, started) -> float:
+        """
+        Returns the seconds left to the source `name` of a tick started at `started`.
+        """
+        return max(0, started + self.source_timeouts.get(name, self.timeout) - time.monotonic())
+
+    @staticmethod
+    def set_partial(data: dict, name):
+        data.setdefault(constants.PARTIAL_SOURCES, []).append(name)
+        instrumentation.registry.inc('hostinguard_partial_sources_total', {'source': name})
+
+
+def get_collector():
+    """
+    Returns the collector configured through the COLLECTION settings.
+    """
+    collection = getattr(settings, 'COLLECTION', {})
+    if collection.get('CONCURRENT'):
+        return ConcurrentCollector(
+            max_workers=collection.get('MAX_WORKERS', 4),
+            timeout=collection.get('SOURCE_TIMEOUT', 30),
+            source_timeouts=collection.get('SOURCE_TIMEOUTS')
+        )
+    return SequentialCollector()
+
+
+def get_apps() -> list:
+    """
+    Returns the monitored applications: every app having an ES definition.
+    """
+    return list(settings.ES)
+
+
+def get_google_handler(app) -> service_handler.GoogleHandler:
+    return service_handler.GoogleHandler(
+        api_name=settings.GOOGLE_API[app]['API_NAME'],
+        api_version=settings.GOOGLE_API[app]['API_VERSION'],
+        scopes=settings.GOOGLE_API[app]['SCOPES'],
+        key_file_location=settings.GOOGLE_API[app]['KEY_FILE_LOCATION'],
+        cache_ttl=settings.GOOGLE_API[app].get('CACHE_TTL', service_handler.GoogleHandler.CACHE_TTL),
+        totals_ttl=settings.GOOGLE_API[app].get('TOTALS_TTL', service_handler.GoogleHandler.TOTALS_TTL),
+        profile=settings.GOOGLE_API[app].get('PROFILE'),
+        batch_size=settings.GOOGLE_API[app].get('BATCH_SIZE', service_handler.GoogleHandler.BATCH_SIZE),
+        max_concurrency=settings.GOOGLE_API[app].get('MAX_CONCURRENCY', service_handler.GoogleHandler.MAX_CONCURRENCY)
+    )
+
+
+def get_cpanel_handler(app) -> service_handler.CPanelHandler:
+    return service_handler.CPanelHandler(
+        host=settings.CPANEL[app]['HOST'],
+        username=settings.CPANEL[app]['USERNAME'],
+        password=settings.CPANEL[app]['PASSWORD'],
+        use_ssl=settings.CPANEL[app]['USE_SSL'],
+        timeout=settings.CPANEL[app].get('TIMEOUT', cpanel_client.DEFAULT_TIMEOUT),
+        pool_size=settings.CPANEL[app].get('POOL_SIZE', cpanel_client.DEFAULT_POOL_SIZE),
+        max_retries=settings.CPANEL[app].get('MAX_RETRIES', cpanel_client.DEFAULT_MAX_RETRIES),
+        extended=settings.CPANEL[app].get('EXTENDED', False)
+    )
+
+
+def get_static_resource_handler(app) -> service_handler.StaticResourceHandler:
+    return service_handler.StaticResourceHandler(
+        free_ep=settings.STATIC_RESOURCE[app]['FREE_EP'],
+        logs_ep=settings.STATIC_RESOURCE[app]['LOGS_EP'],
+        stream_logs=settings.STATIC_RESOURCE[app].get('STREAM_LOGS', False)
+    )
+
+
+def is_proc_backend(app) -> bool:
+    return settings.STATIC_RESOURCE[app].get('BACKEND', constants.BACKEND_HTTP) == constants.BACKEND_PROC
+
+
+def prefetched(future: futures.Future, profile):
+    """
+    Returns a data source serving the data of the view `profile` out of
+    `future`, the pending GoogleHandler.get_profiles_data of many views.
+    """
+    def get_google_data():
+        google_data = future.result()[profile]
+        if isinstance(google_data, Exception):
+            raise google_data
+        return google_data
+    return get_google_data
+
+
+def prefetched_async(task: asyncio.Future, profile):
+    """
+    Same as prefetched(), out of `task`, for the async sources.
+    """
+    async def get_google_data():
+        google_data = (await task)[profile]
+        if isinstance(google_data, Exception):
+            raise google_data
+        return google_data
+    return get_google_data
+
+
+def build_sources(app, google_source=None) -> dict:
+    """
+    Returns the data sources configured for `app`, by source name.
+    Sources whose settings block does not define the app are skipped.
+    `google_source` takes the place of the app own Google Analytics queries,
+    e.g. when they are prefetched along with the ones of other apps.
+    """
+    sources = {}
+    if app in settings.GOOGLE_API:
+        sources[constants.SOURCE_GOOGLE] = google_source or get_google_handler(app).get_google_data
+
+    if app in settings.CPANEL:
+        sources[constants.SOURCE_CPANEL] = get_cpanel_handler(app).get_cpanel_data
+
+    if app in settings.STATIC_RESOURCE:
+        static_resource_handler = get_static_resource_handler(app)
+        if is_proc_backend(app):
+            proc_resource_handler = service_handler.ProcResourceHandler(
+                proc_root=settings.STATIC_RESOURCE[app].get('PROC_ROOT', procfs_client.DEFAULT_ROOT)
+            )
+            sources[constants.SOURCE_MEMORY] = proc_resource_handler.get_memory_data
+        else:
+            sources[constants.SOURCE_MEMORY] = static_resource_handler.get_memory_data
+        sources[constants.SOURCE_LOGS] = lambda: {'logs_data': static_resource_handler.get_logs_data()}
+        if settings.STATIC_RESOURCE[app].get('INCREMENTAL_LOGS'):
+            ingester = access_logs.get_ingester(
+                settings.STATIC_RESOURCE[app]['INCREMENTAL_LOGS'],
+                settings.STATIC_RESOURCE[app].get('RESPONSE_TIME_FIELD')
+            )
+            sources[constants.SOURCE_LOGS_DELTA] = ingester.ingest
+    return sources
+
+
+def build_async_sources(app, google_source=None) -> dict:
+    """
+    Same as build_sources(), as coroutine functions: WHM and the static
+    endpoints are called through the async HTTP clients, while Google
+    Analytics, procfs and the access log files, having no async client, are
+    read in threads of the event loop executor.
+    `google_source` is a coroutine function as well, see prefetched_async.
+    """
+    sources = {
+        name: sync_to_async(source, thread_sensitive=False)
+        for name, source in build_sources(app).items()
+    }
+    if google_source is not None and constants.SOURCE_GOOGLE in sources:
+        sources[constants.SOURCE_GOOGLE] = google_source
+
+    if app in settings.CPANEL:
+        sources[constants.SOURCE_CPANEL] = get_cpanel_handler(app).get_cpanel_data_async
+
+    if app in settings.STATIC_RESOURCE:
+        static_resource_handler = get_static_resource_handler(app)
+        if not is_proc_backend(app):
+            sources[constants.SOURCE_MEMORY] = static_resource_handler.get_memory_data_async
+
+        async def get_logs_data():
+            return {'logs_data': await static_resource_handler.get_logs_data_async()}
+        sources[constants.SOURCE_LOGS] = get_logs_data
+    return sources
+
+
+def collect_app(app, app_collector=None, google_source=None) -> dict:
+    """
+    Collects the document of `app` and observes it (see observe).
+    """
+    app_collector = app_collector or get_collector()
+    data = app_collector.collect(build_sources(app, google_source))
+    observe(app, data)
+    return data
+
+
+async def collect_app_async(app, app_collector=None, google_source=None) -> dict:
+    """
+    Same as collect_app(), through the async sources (see build_async_sources).
+    """
+    app_collector = app_collector or get_collector()
+    data = await app_collector.collect_async(build_async_sources(app, google_source))
+    await sync_to_async(observe, thread_sensitive=False)(app, data)
+    return data
+
+
+def observe(app, data: dict, timestamp: float = None):
+    """
+    Records a document of `app` in the local time series store, evaluates the
+    alerting rules against it and adds it to the rollups, when enabled.
+    """
+    timeseries.get_store().record(app, data, timestamp)
+    alerting.get_alert_engine().evaluate(app, data, timestamp)
+    if rollup.is_enabled():
+        rollup.get_rollup_stage().add(app, data, timestamp)
+
+
+def write_documents(es_service, documents: list) -> list:
+    """
+    Persists the (app, data) `documents` into the index of their app and time
+    (see indices.get_index and persistence.write) and returns their results,
+    in the same order.
+    """
+    return persistence.write(es_service, get_actions(documents))
+
+
+async def write_documents_async(es_service, documents: list) -> list:
+    """
+    Same as write_documents(), see persistence.write_async.
+    """
+    return await persistence.write_async(es_service, get_actions(documents))
+
+
+def get_actions(documents: list) -> list:
+    return [
+        (indices.get_index(app, data.setdefault('timestamp', now())), settings.ES[app]['DOC_TYPE'], data)
+        for app, data in documents
+    ]
+
+
+class CollectionEngine(object):
+    """
+    Collects every monitored application in a single pass, at most `max_workers`
+    applications at a time, and indexes the resulting documents through one
+    bulk request.
+    """
+
+    def __init__(self, max_workers, es_service):
+        self.max_workers = max_workers
+        self.es_service = es_service
+
+    def collect(self, apps) -> dict:
+        """
+        Returns the collected document of every app, by app.
+        Apps whose collection failed are left out.
+        """
+        app_collector = get_collector()
+        documents = {}
+        with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            google_sources = self.prefetch_google_data(apps, executor)
+            pending = {
+                app: executor.submit(collect_app, app, app_collector, google_sources.get(app))
+                for app in apps
+            }
+            for app, future in pending.items():
+                try:
+                    documents[app] = future.result()
+                except Exception:
+                    logger.exception('collection of ' + app + ' failed')
+        return documents
+
+    async def collect_async(self, apps) -> dict:
+        """
+        Same as collect(), through the async sources (see collect_app_async).
+        """
+        app_collector = get_collector()
+        semaphore = asyncio.Semaphore(self.max_workers)
+        google_sources = self.prefetch_google_data_async(apps)
+
+        async def collect(app):
+            async with semaphore:
+                return await collect_app_async(app, app_collector, google_sources.get(app))
+
+        documents = {}
+        results = await asyncio.gather(*(collect(app) for app in apps), return_exceptions=True)
+        for app, result in zip(apps, results):
+            if isinstance(result, Exception):
+                logger.error('collection of ' + app + ' failed', exc_info=result)
+            else:
+                documents[app] = result
+        return documents
+
+    def prefetch_google_data(self, apps, executor) -> dict:
+        """
+        Starts fetching at once the Google Analytics views of the apps sharing
+        the same key file (see GoogleHandler.get_profiles_data), returning their
+        data sources by app.
+        """
+        google_sources = {}
+        for group, profiles in self.group_google_profiles(apps):
+            future = executor.submit(get_google_handler(group[0]).get_profiles_data, list(dict.fromkeys(profiles)))
+            for app, profile in zip(group, profiles):
+                google_sources[app] = prefetched(future, profile)
+        return google_sources
+
+    def prefetch_google_data_async(self, apps) -> dict:
+        """
+        Same as prefetch_google_data(), the views being fetched in a thread of
+        the running event loop executor.
+        """
+        google_sources = {}
+        for group, profiles in self.group_google_profiles(apps):
+            get_profiles_data = sync_to_async(get_google_handler(group[0]).get_profiles_data, thread_sensitive=False)
+            task = asyncio.ensure_future(get_profiles_data(list(dict.fromkeys(profiles))))
+            for app, profile in zip(group, profiles):
+                google_sources[app] = prefetched_async(task, profile)
+        return google_sources
+
+    @staticmethod
+    def group_google_profiles(apps) -> list:
+        """
+        Returns the (apps, their views) groups of the `apps` sharing the same
+        key file, when more than one does.
+        """
+        groups = {}
+        for app in apps:
+            if app in settings.GOOGLE_API:
+                options = settings.GOOGLE_API[app]
+                groups.setdefault((
+                    options['API_NAME'], options['API_VERSION'], str(options['SCOPES']), options['KEY_FILE_LOCATION']
+                ), []).append(app)
+        return [
+            (group, [settings.GOOGLE_API[app].get('PROFILE') for app in group])
+            for group in groups.values() if len(group) > 1
+        ]
+
+    def write(self, documents: dict) -> dict:
+        """
+        Persists every document (see write_documents) and returns their results by app.
+        """
+        results = write_documents(self.es_service, list(documents.items()))
+        return dict(zip(documents, results))
+
+    async def write_async(self, documents: dict) -> dict:
+        """
+        Same as write(), see write_documents_async.
+        """
+        results = await write_documents_async(self.es_service, list(documents.items()))
+        return dict(zip(documents, results))
+
+    def run(self, apps=None) -> dict:
+        """
+        Collects and persists `apps` (all the monitored ones by default),
+        returning the persistence result of every app.
+        """
+        apps = get_apps() if apps is None else apps
+        started = time.perf_counter()
+        results = self.write(self.collect(apps))
+        return self.complete(apps, results, started)
+
+    async def run_async(self, apps=None) -> dict:
+        """
+        Same as run(), for the async views, see collect_async and write_async.
+        """
+        apps = get_apps() if apps is None else apps
+        started = time.perf_counter()
+        results = await self.write_async(await self.collect_async(apps))
+        return self.complete(apps, results, started)
+
+    @staticmethod
+    def complete(apps, results: dict, started: float) -> dict:
+        """
+        Records the duration of a tick started at `started` and adds the apps
+        whose collection failed to its `results`.
+        """
+        instrumentation.registry.observe('hostinguard_tick_duration_seconds', time.perf_counter() - started)
+        for app in apps:
+            if app not in results:
+                results[app] = {'result': 'error', 'error': 'collection failed'}
+        return results
+
+
+def get_engine() -> CollectionEngine:
+    """
+    Returns the collection engine configured through the COLLECTION settings.
+    """
+    return CollectionEngine(
+        max_workers=getattr(settings, 'COLLECTION', {}).get('MAX_APP_WORKERS', 8),
+        es_service=settings.ES_SERVICE
+    )
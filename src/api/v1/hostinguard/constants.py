@@ -7,3 +7,19 @@ REAL_TIME_USERS = 'rt:activeUsers'
 SESSIONS = 'ga:sessions'
 UNIQUE_USERS = 'ga:users'
 NEW_USERS = 'ga:newUsers'
+# today's totals, queried at once
+TOTALS = ','.join((SESSIONS, UNIQUE_USERS, NEW_USERS))
+
+# Data sources collected on every tick
+SOURCE_GOOGLE = 'google'
+SOURCE_CPANEL = 'cpanel'
+SOURCE_MEMORY = 'memory'
+SOURCE_LOGS = 'logs'
+SOURCE_LOGS_DELTA = 'logs_delta'
+
+# Document field listing the sources missing from a partial result
+PARTIAL_SOURCES = 'partial_sources'
+
+# Memory data backends: the "free -m" endpoint or the local procfs
+BACKEND_HTTP = 'http'
+BACKEND_PROC = 'proc'
@@ -0,0 +1,321 @@
+import atexit
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+from django.utils.timezone import now
+
+from api.v1.hostinguard import async_http, instrumentation
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+# timeout (seconds) of the ES requests sent by the coroutines, that of the ES client
+ASYNC_TIMEOUT = 10
+
+# long-lived clients and bulk writers, one per ES service
+_clients = {}
+_writers = {}
+_lock = threading.Lock()
+
+
+def get_es_client(es_service):
+    """
+    Returns the Elasticsearch client shared by every writer of `es_service`.
+    """
+    # the client is only imported once used, not to slow down the start of
+    # every process
+    from elasticsearch import Elasticsearch
+
+    with _lock:
+        if es_service not in _clients:
+            _clients[es_service] = Elasticsearch([es_service, ])
+        return _clients[es_service]
+
+
+def streaming_bulk(client, actions, **kwargs):
+    from elasticsearch.helpers import streaming_bulk as bulk
+
+    return bulk(client, actions, **kwargs)
+
+
+def get_result(action: dict, ok: bool, info: dict) -> dict:
+    """
+    Returns the result of the bulk `action`, from the `info` ES answered for it.
+    """
+    if ok:
+        return {'_id': action['_id'], 'result': info.get('result', 'created')}
+    logger.error('es bulk persistence failed for ' + action['_index'] + ': ' + str(info.get('error')))
+    return {'_id': action['_id'], 'result': 'error', 'error': str(info.get('error')), 'status': info.get('status')}
+
+
+def get_base_url(es_service) -> str:
+    """
+    Returns the URL of the REST API of `es_service`, a host[:port] or an URL as
+    given to the ES client.
+    """
+    url = urlsplit(es_service if '://' in es_service else 'http://' + es_service)
+    if url.port is None:
+        url = url._replace(netloc=url.netloc + ':9200')
+    return url.geturl().rstrip('/')
+
+
+async def index_async(es_service, index, doc_type, data: dict) -> dict:
+    """
+    Same as the index() method of the ES client, through the REST API and the
+    async HTTP client of the running event loop (see async_http), raising the
+    same exceptions.
+    """
+    from elasticsearch.serializer import JSONSerializer
+
+    response = await _post_async(
+        '%s/%s/%s' % (get_base_url(es_service), index, doc_type),
+        JSONSerializer().dumps(data),
+        'application/json'
+    )
+    return response.json()
+
+
+async def bulk_async(es_service, actions: list) -> list:
+    """
+    Indexes the (index, doc_type, data) `actions` in one _bulk request sent by
+    the async HTTP client of the running event loop, returning their results
+    in the same order, see BulkWriter.flush.
+    """
+    from elasticsearch import TransportError
+    from elasticsearch.serializer import JSONSerializer
+
+    if not actions:
+        return []
+    serializer = JSONSerializer()
+    started = time.perf_counter()
+    bulk_actions = []
+    lines = []
+    for index, doc_type, data in actions:
+        data.setdefault('timestamp', now())
+        bulk_actions.append({'_index': index, '_type': doc_type, '_id': uuid.uuid4().hex, '_source': data})
+        lines.append(serializer.dumps({'index': {
+            '_index': index, '_type': doc_type, '_id': bulk_actions[-1]['_id']}}))
+        lines.append(serializer.dumps(data))
+    try:
+        response = await _post_async(
+            get_base_url(es_service) + '/_bulk',
+            '\n'.join(lines) + '\n',
+            'application/x-ndjson'
+        )
+    except TransportError as e:
+        # every document failed, as reported by streaming_bulk
+        outcomes = [(False, {'error': str(e), 'status': e.status_code}) for _ in bulk_actions]
+    else:
+        items = [item.get('index', {}) for item in response.json()['items']]
+        outcomes = [(200 <= info.get('status', 500) < 300, info) for info in items]
+
+    results = [get_result(action, ok, info) for action, (ok, info) in zip(bulk_actions, outcomes)]
+    for result in results:
+        instrumentation.registry.inc('hostinguard_es_documents_total', {'result': result['result']})
+    instrumentation.registry.observe('hostinguard_es_bulk_duration_seconds', time.perf_counter() - started)
+    logger.debug('es bulk persistence: ' + str(len(actions)) + ' documents')
+    return results
+
+
+async def _post_async(url, body: str, content_type):
+    import httpx
+    from elasticsearch.exceptions import (HTTP_EXCEPTIONS, ConnectionError,
+                                          TransportError)
+
+    try:
+        response = await async_http.get_client().post(
+            url, content=body.encode('utf-8'), headers={'Content-Type': content_type}, timeout=ASYNC_TIMEOUT)
+    except httpx.TransportError as e:
+        raise ConnectionError('N/A', str(e), e)
+    if not 200 <= response.status_code < 300:
+        try:
+            info = response.json()
+            error = info.get('error', info)
+        except ValueError:
+            info = error = response.text
+        raise HTTP_EXCEPTIONS.get(response.status_code, TransportError)(response.status_code, error, info)
+    return response
+
+
+def get_bulk_writer(es_service, max_docs, flush_interval) -> 'BulkWriter':
+    """
+    Returns the process-wide bulk writer of `es_service`, flushed on exit.
+    """
+    with _lock:
+        if es_service not in _writers:
+            _writers[es_service] = BulkWriter(
+                es_service=es_service,
+                max_docs=max_docs,
+                flush_interval=flush_interval
+            )
+        return _writers[es_service]
+
+
+@atexit.register
+def flush_all():
+    """
+    Stops the background flush of every bulk writer and flushes the documents
+    they still buffer.
+    """
+    with _lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.stop()
+        writer.flush()
+
+
+def reset():
+    """
+    Drops every cached client and writer, pending documents included.
+    """
+    with _lock:
+        writers = list(_writers.values())
+        _clients.clear()
+        _writers.clear()
+    for writer in writers:
+        writer.stop()
+        writer.discard()
+
+
+class BulkWriter(object):
+    """
+    Buffers documents coming from many apps and ticks, and indexes them through
+    the _bulk API once `max_docs` documents are waiting or `flush_interval`
+    seconds elapsed since the last flush. The documents given to write() are
+    flushed by a background thread, so that those of a quiet app do not wait
+    for the next write.
+    """
+
+    def __init__(self, es_service, max_docs, flush_interval):
+        self.es_service = es_service
+        self.max_docs = max_docs
+        self.flush_interval = flush_interval
+        self._actions = []
+        # futures of the documents given to write(), by document id
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+    def write(self, index, doc_type, data: dict) -> Future:
+        """
+        Buffers `data`, returning the future of its per-document result (see
+        flush()), set by the background flush sending it.
+        """
+        future = Future()
+        self.add(index, doc_type, data, future=future)
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._flush_when_due, name='hostinguard-bulk-writer',
+                                                daemon=True)
+                self._thread.start()
+        # the flushing thread waits for the first document, or for the threshold reached
+        self._wakeup.set()
+        return future
+
+    def add(self, index, doc_type, data: dict, doc_id=None, future=None) -> str:
+        # documents queued before being written keep their collection time
+        data.setdefault('timestamp', now())
+        doc_id = doc_id or uuid.uuid4().hex
+        with self._lock:
+            self._actions.append({
+                '_index': index,
+                '_type': doc_type,
+                '_id': doc_id,
+                '_source': data
+            })
+            if future is not None:
+                self._futures[doc_id] = future
+        return doc_id
+
+    def is_due(self) -> bool:
+        with self._lock:
+            return len(self._actions) >= self.max_docs or (
+                self._actions and time.monotonic() - self._last_flush >= self.flush_interval)
+
+    def stop(self):
+        """
+        Stops the background flush, leaving the buffered documents in place.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            self._wakeup.set()
+            thread.join()
+
+    def discard(self):
+        """
+        Drops the buffered documents, cancelling their futures.
+        """
+        with self._lock:
+            self._actions = []
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.cancel()
+
+    def flush(self) -> dict:
+        """
+        Sends every buffered document and returns their results by document id,
+        e.g. {'<id>': {'_id': '<id>', 'result': 'created'}} or
+        {'<id>': {'_id': '<id>', 'result': 'error', 'error': '...', 'status': 400}}, the status
+        being the HTTP status of the document, or 'N/A' when ES could not be reached.
+        The futures of the documents given to write() are set to the same results.
+        """
+        with self._lock:
+            actions, self._actions = self._actions, []
+            futures = {action['_id']: self._futures.pop(action['_id'], None) for action in actions}
+            self._last_flush = time.monotonic()
+        if not actions:
+            return {}
+
+        started = time.perf_counter()
+        results = {}
+        try:
+            bulk_results = streaming_bulk(
+                get_es_client(self.es_service),
+                actions,
+                chunk_size=self.max_docs,
+                raise_on_error=False,
+                raise_on_exception=False
+            )
+            for action, (ok, item) in zip(actions, bulk_results):
+                results[action['_id']] = get_result(action, ok, item.get('index', {}))
+            for action in actions:
+                if action['_id'] not in results:
+                    # ES answered fewer items than the documents sent
+                    results[action['_id']] = get_result(action, False, {'error': 'no bulk result', 'status': 'N/A'})
+        except Exception as e:
+            for future in futures.values():
+                if future is not None:
+                    future.set_exception(e)
+            raise
+        for doc_id, future in futures.items():
+            if future is not None:
+                future.set_result(results.get(doc_id))
+        for result in results.values():
+            instrumentation.registry.inc('hostinguard_es_documents_total', {'result': result['result']})
+        instrumentation.registry.observe('hostinguard_es_bulk_duration_seconds', time.perf_counter() - started)
+        logger.debug('es bulk persistence: ' + str(len(actions)) + ' documents')
+        return results
+
+    def _flush_when_due(self):
+        while not self._stop.is_set():
+            with self._lock:
+                # an empty buffer waits for the next write() to wake it up
+                timeout = self._last_flush + self.flush_interval - time.monotonic() if self._actions else None
+            self._wakeup.wait(None if timeout is None else max(timeout, 0))
+            self._wakeup.clear()
+            if self.is_due():
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('es bulk persistence failed')
@@ -0,0 +1,14 @@
+class HostinGuardException(Exception):
+    def __init__(self, reason):
+        self.reason = reason
+
+    def __str__(self):
+        return repr(self.reason)
+
+
+class ResourceUnavailable(HostinGuardException):
+    pass
+
+
+class RateLimited(ResourceUnavailable):
+    pass
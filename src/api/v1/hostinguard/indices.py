@@ -0,0 +1,156 @@
+import logging
+import threading
+from datetime import date, datetime, timedelta, timezone
+
+from django.utils.timezone import now
+
+from api.v1.hostinguard import es_writer
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+DAILY = 'daily'
+MONTHLY = 'monthly'
+PARTITION_FORMATS = {
+    DAILY: '%Y.%m.%d',
+    MONTHLY: '%Y.%m',
+}
+
+TEMPLATE_PREFIX = 'hostinguard-'
+# "free -m" fields, in MB
+MEMORY_FIELDS = (
+    'total_mem', 'used_mem', 'free_mem', 'shared', 'buffers_cache', 'available',
+    'total_swap', 'used_swap', 'free_swap',
+)
+
+# templates already installed by this process, by (ES service, template name)
+_installed = set()
+_installed_lock = threading.Lock()
+
+
+def partitioned_index(base, timestamp: float, partition=DAILY) -> str:
+    """
+    Returns the index of `base` holding the documents of `timestamp` (UTC),
+    e.g. hostinguard-app1-2026.10.18 (DAILY) or hostinguard-app1-2026.10 (MONTHLY).
+    """
+    return base + '-' + datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime(PARTITION_FORMATS[partition])
+
+
+def ensure_template(es_service, name, body: dict) -> bool:
+    """
+    Installs the index template `name` once per process, returns False when
+    ES could not take it (it is then tried again on the next call).
+    """
+    with _installed_lock:
+        if (es_service, name) in _installed:
+            return True
+    try:
+        es_writer.get_es_client(es_service).indices.put_template(name=name, body=body)
+    except Exception:
+        logger.exception('installation of the index template ' + name + ' failed')
+        return False
+    with _installed_lock:
+        _installed.add((es_service, name))
+    return True
+
+
+def get_index(app, timestamp: datetime = None) -> str:
+    """
+    Returns the index the documents of `app` taken at `timestamp` (now by
+    default) are written to: ES[app]['INDEX'] itself, or its partition when
+    ES[app]['PARTITION'] is set, whose template is then installed first.
+    """
+    options = settings.ES[app]
+    partition = options.get('PARTITION')
+    if not partition:
+        return options['INDEX']
+    ensure_template(settings.ES_SERVICE, TEMPLATE_PREFIX + app, get_template(options['INDEX'], options['DOC_TYPE']))
+    timestamp = timestamp or now()
+    return partitioned_index(options['INDEX'], timestamp.timestamp(), partition)
+
+
+def get_template(base, doc_type) -> dict:
+    """
+    Returns the index template of the partitions of `base`, mapping every
+    known field explicitly: numeric types for cpu_*, proc_load_*, memory,
+    logs_data.* and response_time_* fields, keywords (no text analysis) for any string.
+    """
+    properties = {
+        'timestamp': {'type': 'date'},
+        'partial_sources': {'type': 'keyword'},
+    }
+    properties.update({field: {'type': 'long'} for field in MEMORY_FIELDS})
+    return {
+        'index_patterns': [base + '-*'],
+        # rollup templates (see rollup.RollupStage) take precedence on their indices
+        'order': 0,
+        'mappings': {
+            doc_type: {
+                'dynamic_templates': [
+                    # typed, not to match the objects of the rollup documents
+                    {'cpu': {'match': 'cpu_*', 'match_mapping_type': 'long', 'mapping': {'type': 'float'}}},
+                    {'cpu_decimals': {'match': 'cpu_*', 'match_mapping_type': 'double',
+                                      'mapping': {'type': 'float'}}},
+                    {'proc_loads': {'match': 'proc_load_*', 'match_mapping_type': 'long',
+                                    'mapping': {'type': 'float'}}},
+                    {'proc_loads_decimals': {'match': 'proc_load_*', 'match_mapping_type': 'double',
+                                             'mapping': {'type': 'float'}}},
+                    {'response_times': {'match': 'response_time_*', 'match_mapping_type': 'long',
+                                        'mapping': {'type': 'float'}}},
+                    {'response_times_decimals': {'match': 'response_time_*', 'match_mapping_type': 'double',
+                                                 'mapping': {'type': 'float'}}},
+                    {'statuses': {'path_match': 'logs_*.*', 'match_mapping_type': 'long',
+                                  'mapping': {'type': 'long'}}},
+                    {'integers': {'match_mapping_type': 'long', 'mapping': {'type': 'long'}}},
+                    {'decimals': {'match_mapping_type': 'double', 'mapping': {'type': 'double'}}},
+                    {'strings': {'match_mapping_type': 'string',
+                                 'mapping': {'type': 'keyword', 'ignore_above': 256}}},
+                ],
+                'properties': properties,
+            },
+        },
+    }
+
+
+def expired_indices(names, prefix, retention_days, today: date = None) -> list:
+    """
+    Returns the partitions of `prefix` among `names` (e.g. prefix-2026.10.18
+    or prefix-2026.10) holding only documents older than `retention_days`.
+    Names not made of `prefix` and a partition date are ignored.
+    """
+    today = today or now().date()
+    oldest_kept = today - timedelta(days=retention_days)
+    expired = []
+    for name in names:
+        if not name.startswith(prefix + '-'):
+            continue
+        suffix = name[len(prefix) + 1:]
+        for partition, partition_format in PARTITION_FORMATS.items():
+            try:
+                start = datetime.strptime(suffix, partition_format).date()
+            except ValueError:
+                continue
+            if partition == MONTHLY:
+                # the last day of the month
+                end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+            else:
+                end = start
+            if end < oldest_kept:
+                expired.append(name)
+            break
+    return sorted(expired)
+
+
+def drop_expired_indices(es_service, prefix, retention_days, dry_run=False) -> list:
+    """
+    Deletes the partitions of `prefix` older than `retention_days` (see
+    expired_indices) and returns their names.
+    """
+    es = es_writer.get_es_client(es_service)
+    expired = expired_indices(es.indices.get(index=prefix + '-*'), prefix, retention_days)
+    if not dry_run:
+        for name in expired:
+            logger.info('dropping index ' + name)
+            es.indices.delete(index=name)
+    return expired
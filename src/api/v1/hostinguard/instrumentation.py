@@ -0,0 +1,229 @@
+import asyncio
+import functools
+import logging
+import math
+import threading
+import time
+from bisect import bisect_left
+from urllib.parse import urlparse
+
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# upper bounds (seconds) of the duration histograms buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, math.inf)
+
+HELP = {
+    'hostinguard_handler_duration_seconds': 'Duration of the data source and persistence handlers.',
+    'hostinguard_handler_calls_total': 'Calls of the data source and persistence handlers.',
+    'hostinguard_handler_failures_total': 'Calls of the data source and persistence handlers raising an error.',
+    'hostinguard_outbound_duration_seconds': 'Duration of the outbound calls, retries included.',
+    'hostinguard_outbound_calls_total': 'Outbound calls.',
+    'hostinguard_outbound_retries_total': 'Outbound call attempts beyond the first one.',
+    'hostinguard_outbound_failures_total': 'Outbound calls given up.',
+    'hostinguard_http_response_bytes_total': 'Bytes received by the outbound HTTP calls.',
+    'hostinguard_es_documents_total': 'Documents sent to Elasticsearch through the bulk API, by result.',
+    'hostinguard_es_bulk_duration_seconds': 'Duration of the Elasticsearch bulk requests.',
+    'hostinguard_tick_duration_seconds': 'Duration of the collection passes.',
+    'hostinguard_partial_sources_total': 'Data sources missing their deadline or failing.',
+    'hostinguard_ratelimit_wait_seconds': 'Time the rate limited outbound calls waited for their turn.',
+    'hostinguard_ratelimit_delayed_total': 'Rate limited outbound calls which had to wait for their turn.',
+}
+
+
+class Histogram(object):
+    """
+    Cumulative histogram over fixed `buckets`, along with the sum and count of
+    the observations.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry(object):
+    """
+    Counters and histograms by (name, labels), plus gauges read through
+    callbacks only when the metrics are rendered.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._gauge_callbacks = []
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value: float, labels=None):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def register_gauges(self, callback):
+        """
+        Registers `callback`, returning a list of (name, labels, value) gauges.
+        """
+        with self._lock:
+            self._gauge_callbacks.append(callback)
+
+    def counter(self, name, labels=None):
+        with self._lock:
+            return self._counters.get((name, _labels_key(labels)), 0)
+
+    def histogram(self, name, labels=None):
+        with self._lock:
+            return self._histograms.get((name, _labels_key(labels)))
+
+    def render(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            samples = {}
+            for (name, labels), value in self._counters.items():
+                samples.setdefault((name, COUNTER), []).append((name, labels, value))
+            for (name, labels), histogram in self._histograms.items():
+                rendered = samples.setdefault((name, HISTOGRAM), [])
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    rendered.append((name + '_bucket', labels + (('le', _format_value(bound)),), cumulative))
+                rendered.append((name + '_sum', labels, histogram.sum))
+                rendered.append((name + '_count', labels, histogram.count))
+            callbacks = list(self._gauge_callbacks)
+        for callback in callbacks:
+            try:
+                gauges = callback()
+            except Exception:
+                logger.exception('gauges callback failed')
+                continue
+            for name, labels, value in gauges:
+                samples.setdefault((name, GAUGE), []).append((name, _labels_key(labels), value))
+
+        lines = []
+        for (name, metric_type), rendered in sorted(samples.items()):
+            if name in HELP:
+                lines.append('# HELP %s %s' % (name, HELP[name]))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            for sample_name, labels, value in rendered:
+                lines.append(sample_name + _format_labels(labels) + ' ' + _format_value(value))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+def timed(handler):
+    """
+    Decorates a handler method (or coroutine function), timing its calls and
+    counting its failures under the `handler` label.
+    """
+    labels = {'handler': handler}
+
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                registry.inc('hostinguard_handler_calls_total', labels)
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    registry.inc('hostinguard_handler_failures_total', labels)
+                    raise
+                finally:
+                    registry.observe('hostinguard_handler_duration_seconds', time.perf_counter() - started, labels)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            registry.inc('hostinguard_handler_calls_total', labels)
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                registry.inc('hostinguard_handler_failures_total', labels)
+                raise
+            finally:
+                registry.observe('hostinguard_handler_duration_seconds', time.perf_counter() - started, labels)
+        return wrapper
+    return decorator
+
+
+def record_outbound(endpoint, attempts, duration, failed):
+    labels = {'endpoint': endpoint}
+    registry.inc('hostinguard_outbound_calls_total', labels)
+    if attempts > 1:
+        registry.inc('hostinguard_outbound_retries_total', labels, attempts - 1)
+    if failed:
+        registry.inc('hostinguard_outbound_failures_total', labels)
+    registry.observe('hostinguard_outbound_duration_seconds', duration, labels)
+
+
+def count_bytes(url, size):
+    registry.inc('hostinguard_http_response_bytes_total', {'host': urlparse(str(url)).hostname or ''}, size)
+
+
+def count_response_bytes(response, *args, **kwargs):
+    """
+    requests response hook counting the bytes received, by host, also fit for
+    the httpx responses whose body was read.
+    Streamed responses, whose content it would read upfront, are counted
+    through counted_lines() instead.
+    """
+    if not kwargs.get('stream'):
+        count_bytes(response.url, len(response.content or b''))
+
+
+def counted_lines(url, lines):
+    """
+    Yields the `lines` of a streamed response, counting their bytes.
+    """
+    for line in lines:
+        count_bytes(url, len(line) + 1)
+        yield line
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for name, value in labels
+    ) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
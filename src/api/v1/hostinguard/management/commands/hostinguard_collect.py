@@ -0,0 +1,42 @@
+
+from django.core.management.base import BaseCommand
+
+from api.v1.hostinguard import alerting, collector
+from api.v1.hostinguard.scheduler import Scheduler
+from main import conf
+
+settings = conf.get_settings()
+
+
+class Command(BaseCommand):
+    help = 'Collects the measurements of the monitored apps on a fixed schedule.'
+
+    def add_arguments(self, parser):
+        scheduler_settings = getattr(settings, 'SCHEDULER', {})
+        parser.add_argument('--interval', type=float, default=scheduler_settings.get('INTERVAL', 60),
+                            help='seconds between two collection passes')
+        parser.add_argument('--jitter', type=float, default=scheduler_settings.get('JITTER', 0),
+                            help='max random delay (seconds) before every pass')
+        parser.add_argument('--apps', nargs='+', help='apps to collect, all the monitored ones by default')
+        parser.add_argument('--once', action='store_true', help='run a single pass and exit')
+
+    def handle(self, *args, **options):
+        # the alerting rules are checked before the first pass, not on every tick
+        alerting.get_alert_engine()
+        scheduler = Scheduler(
+            engine=collector.get_engine(),
+            interval=options['interval'],
+            jitter=options['jitter'],
+            apps=options['apps']
+        )
+        if options['once']:
+            scheduler.tick()
+            scheduler.wait()
+            return
+
+        self.stdout.write('collecting every %s seconds, press CTRL-C to stop' % options['interval'])
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            scheduler.stop()
+            scheduler.wait()
@@ -0,0 +1,33 @@
+
+from django.core.management.base import BaseCommand
+
+from api.v1.hostinguard import indices
+from main import conf
+
+settings = conf.get_settings()
+
+
+class Command(BaseCommand):
+    help = 'Drops the index partitions older than their retention (ES and ROLLUP RETENTION_DAYS settings).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='list the expired indices without dropping them')
+
+    def handle(self, *args, **options):
+        prefixes = []
+        for es_settings in settings.ES.values():
+            if es_settings.get('RETENTION_DAYS'):
+                prefixes.append((es_settings['INDEX'], es_settings['RETENTION_DAYS']))
+            for resolution in getattr(settings, 'ROLLUP', {}).get('RESOLUTIONS', []):
+                if resolution.get('RETENTION_DAYS'):
+                    prefixes.append((es_settings['INDEX'] + '-' + resolution['NAME'], resolution['RETENTION_DAYS']))
+
+        for prefix, retention_days in prefixes:
+            expired = indices.drop_expired_indices(
+                es_service=settings.ES_SERVICE,
+                prefix=prefix,
+                retention_days=retention_days,
+                dry_run=options['dry_run']
+            )
+            for name in expired:
+                self.stdout.write(('expired: ' if options['dry_run'] else 'dropped: ') + name)
@@ -0,0 +1,49 @@
+import logging
+
+from asgiref.sync import sync_to_async
+
+from api.v1.hostinguard import es_writer, pipeline, spool
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+
+def write(es_service, actions: list) -> list:
+    """
+    Indexes the (index, doc_type, data) `actions` in one bulk pass and returns
+    their results, in the same order.
+    When the ingestion pipeline is enabled, documents are queued, the ones
+    overflowing the queue going to the spool when it is enabled too (see
+    pipeline.get_pipeline); when only the spool is, they are appended to it.
+    Both write to ES in the background.
+    """
+    if pipeline.is_enabled():
+        ingestion_pipeline = pipeline.get_pipeline()
+        return [ingestion_pipeline.write(index, doc_type, data) for index, doc_type, data in actions]
+
+    if spool.is_enabled():
+        write_ahead_spool = spool.get_spool()
+        for index, doc_type, data in actions:
+            write_ahead_spool.append({'index': index, 'doc_type': doc_type, 'data': data})
+        return [{'result': 'spooled'} for _ in actions]
+
+    writer = es_writer.BulkWriter(
+        es_service=es_service,
+        max_docs=max(len(actions), 1),
+        flush_interval=0
+    )
+    doc_ids = [writer.add(index=index, doc_type=doc_type, data=data) for index, doc_type, data in actions]
+    results = writer.flush()
+    return [results[doc_id] for doc_id in doc_ids]
+
+
+async def write_async(es_service, actions: list) -> list:
+    """
+    Same as write(), ES being called through the async HTTP client (see
+    es_writer.bulk_async). Appending to the spool and queueing into the
+    pipeline run in a thread of the event loop executor.
+    """
+    if spool.is_enabled() or pipeline.is_enabled():
+        return await sync_to_async(write, thread_sensitive=False)(es_service, actions)
+    return await es_writer.bulk_async(es_service, actions)
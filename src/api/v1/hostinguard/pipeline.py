@@ -0,0 +1,228 @@
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.timezone import now
+
+from api.v1.hostinguard import es_writer, instrumentation, spool
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+# what to do with a document submitted while the queue is full
+BLOCK = 'block'
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+SPILL = 'spill'
+
+# outcomes of a submitted document
+QUEUED = 'queued'
+SPILLED = 'spilled'
+DROPPED = 'dropped'
+
+
+class JsonLinesSpill(object):
+    """
+    Appends the documents that could not be queued or written to `path`,
+    one JSON document per line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, document: dict):
+        with self._lock, open(self.path, 'a') as spill:
+            spill.write(json.dumps(document, cls=DjangoJSONEncoder) + '\n')
+
+
+class IngestionPipeline(object):
+    """
+    Decouples collection from persistence: collectors submit documents to a
+    bounded queue, drained by `workers` writer threads indexing up to
+    `batch_size` documents per bulk request.
+
+    When the queue is full, a submitted document is handled according to
+    `policy`: BLOCK waits up to `put_timeout` seconds and then drops it,
+    DROP_NEWEST drops it, DROP_OLDEST drops the oldest queued one instead and
+    SPILL hands it to `spill`, which receives the documents ES rejected too.
+    """
+
+    def __init__(self, es_service, maxsize, workers, batch_size, policy=DROP_OLDEST, put_timeout=1, spill=None):
+        self.es_service = es_service
+        self.workers = workers
+        self.batch_size = batch_size
+        self.policy = policy
+        self.put_timeout = put_timeout
+        self.spill = spill
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'submitted': 0, 'written': 0, 'failed': 0, 'dropped': 0, 'spilled': 0, 'lag': 0.0}
+
+    def start(self):
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._drain, name='hostinguard-writer-%d' % i, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+        Stops the writers once the queued documents are written.
+        """
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, index, doc_type, data: dict) -> bool:
+        """
+        Queues `data` for persistence, returns False when it was not queued.
+        """
+        return self._submit(index, doc_type, data) == QUEUED
+
+    def write(self, index, doc_type, data: dict) -> dict:
+        """
+        Submits `data`, returning its persistence result: queued, spooled when
+        spilled to the write-ahead spool (which replays it to ES), an error
+        when dropped or spilled anywhere else.
+        """
+        outcome = self._submit(index, doc_type, data)
+        if outcome == QUEUED:
+            return {'result': 'queued'}
+        if outcome == SPILLED and isinstance(self.spill, spool.Spool):
+            return {'result': 'spooled'}
+        return {'result': 'error', 'error': 'ingestion queue full'}
+
+    def _submit(self, index, doc_type, data: dict) -> str:
+        data.setdefault('timestamp', now())
+        item = (time.monotonic(), index, doc_type, data)
+        self._count('submitted')
+        try:
+            if self.policy == BLOCK:
+                self._queue.put(item, timeout=self.put_timeout)
+            else:
+                self._queue.put_nowait(item)
+            return QUEUED
+        except queue.Full:
+            pass
+
+        if self.policy == DROP_OLDEST:
+            try:
+                self._queue.get_nowait()
+                self._count('dropped')
+                self._queue.put_nowait(item)
+                return QUEUED
+            except (queue.Empty, queue.Full):
+                pass
+        if self.policy == SPILL and self.spill is not None:
+            self._spill([item])
+            return SPILLED
+        logger.warning('ingestion queue full, document for ' + index + ' dropped')
+        self._count('dropped')
+        return DROPPED
+
+    def stats(self) -> dict:
+        """
+        Returns the queue depth, the documents counters and the lag (seconds
+        between submission and persistence) of the last written batch.
+        """
+        with self._lock:
+            return dict(self._stats, depth=self._queue.qsize())
+
+    def gauges(self) -> list:
+        """
+        Returns the stats as instrumentation gauges.
+        """
+        stats = self.stats()
+        return [
+            ('hostinguard_pipeline_depth', None, stats.pop('depth')),
+            ('hostinguard_pipeline_lag_seconds', None, stats.pop('lag')),
+        ] + [('hostinguard_pipeline_documents', {'state': state}, value) for state, value in sorted(stats.items())]
+
+    def _drain(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        writer = es_writer.BulkWriter(es_service=self.es_service, max_docs=self.batch_size, flush_interval=0)
+        doc_ids = [writer.add(index=index, doc_type=doc_type, data=data) for _, index, doc_type, data in batch]
+        try:
+            results = writer.flush()
+        except Exception:
+            logger.exception('ingestion batch failed')
+            results = {}
+
+        failed = [item for item, doc_id in zip(batch, doc_ids)
+                  if results.get(doc_id, {}).get('result') in (None, 'error')]
+        with self._lock:
+            self._stats['written'] += len(batch) - len(failed)
+            self._stats['lag'] = time.monotonic() - min(item[0] for item in batch)
+        if failed and self.spill is not None:
+            self._spill(failed)
+        elif failed:
+            self._count('failed', len(failed))
+
+    def _spill(self, items):
+        for _, index, doc_type, data in items:
+            self.spill.append({'index': index, 'doc_type': doc_type, 'data': data})
+        self._count('spilled', len(items))
+
+    def _count(self, counter, value=1):
+        with self._lock:
+            self._stats[counter] += value
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline() -> IngestionPipeline:
+    """
+    Returns the started pipeline of this process, built out of the PIPELINE settings.
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            options = settings.PIPELINE
+            spill_path = options.get('SPILL_PATH')
+            policy = options.get('POLICY', DROP_OLDEST)
+            if spool.is_enabled():
+                # the documents overflowing the queue, or rejected by ES, are spooled and
+                # replayed once ES is back, none being dropped
+                spill, policy = spool.get_spool(), SPILL
+            else:
+                spill = JsonLinesSpill(spill_path) if spill_path else None
+            _pipeline = IngestionPipeline(
+                es_service=settings.ES_SERVICE,
+                maxsize=options.get('MAX_SIZE', 10000),
+                workers=options.get('WORKERS', 1),
+                batch_size=options.get('BATCH_SIZE', 500),
+                policy=policy,
+                put_timeout=options.get('PUT_TIMEOUT', 1),
+                spill=spill
+            )
+            _pipeline.start()
+            atexit.register(_pipeline.stop, 5)
+            instrumentation.registry.register_gauges(_pipeline.gauges)
+        return _pipeline
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'PIPELINE', {}).get('ENABLED', False)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+from api.v1.hostinguard import exceptions, instrumentation
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+# rate limited backends
+GOOGLE = 'google'
+CPANEL = 'cpanel'
+STATIC = 'static'
+
+# default seconds a call may wait for its turn, beyond which it fails straight away
+MAX_WAIT = 30
+
+
+class TokenBucket(object):
+    """
+    Lets `rate` tokens per second through, up to `burst` at once.
+
+    reserve() takes the tokens straight away, possibly running the bucket into
+    debt, and returns how long to wait for them, so that the calls beyond the
+    rate are scheduled first come first served instead of failing. Only the
+    callers whose turn would come after `max_wait` seconds are turned down,
+    which bounds the debt. The lock is never held while waiting, which makes
+    the bucket safe for threads and coroutines alike.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1, max_wait: float = math.inf) -> Optional[float]:
+        """
+        Takes `tokens` and returns the seconds to wait before using them, or
+        returns None without taking them when that would be over `max_wait`.
+        """
+        with self._lock:
+            current = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (current - self._updated) * self.rate)
+            self._updated = current
+            delay = max(0.0, (tokens - self._tokens) / self.rate)
+            if delay > max_wait:
+                return None
+            self._tokens -= tokens
+            return delay
+
+    def refund(self, tokens: float = 1):
+        """
+        Gives back `tokens` reserved but not used.
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + tokens)
+
+
+class Limit(object):
+    """
+    A call of `tokens` queries to `backend` on behalf of `credential` (e.g. a
+    key file or a host and user), held back by both the backend bucket and the
+    bucket of the credential, when they are configured.
+    A call whose turn would come after the MAX_WAIT setting, or after the
+    `max_wait` of its caller, raises RateLimited instead of waiting.
+    """
+
+    def __init__(self, backend, credential=None, tokens=1):
+        self.backend = backend
+        self.credential = credential
+        self.tokens = tokens
+
+    def reserve(self, max_wait: float = math.inf) -> float:
+        """
+        Returns the seconds to wait before calling.
+        """
+        buckets = get_buckets(self.backend, self.credential)
+        if not buckets:
+            return 0.0
+        labels = {'backend': self.backend}
+        max_wait = min(max_wait, settings.RATE_LIMIT.get('MAX_WAIT', MAX_WAIT))
+        delays = []
+        for bucket in buckets:
+            delay = bucket.reserve(self.tokens, max_wait)
+            if delay is None:
+                for reserved in buckets[:len(delays)]:
+                    reserved.refund(self.tokens)
+                instrumentation.registry.inc('hostinguard_ratelimit_rejected_total', labels)
+                raise exceptions.RateLimited(
+                    self.backend + ': no turn to call within ' + '%.2f' % max(0, max_wait) + 's')
+            delays.append(delay)
+        delay = max(delays)
+        instrumentation.registry.observe('hostinguard_ratelimit_wait_seconds', delay, labels)
+        if delay:
+            instrumentation.registry.inc('hostinguard_ratelimit_delayed_total', labels)
+            logger.debug(self.backend + ': rate limited, calling in ' + '%.2f' % delay + 's')
+        return delay
+
+    def wait(self, max_wait: float = math.inf):
+        delay = self.reserve(max_wait)
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(self, max_wait: float = math.inf):
+        delay = self.reserve(max_wait)
+        if delay:
+            await asyncio.sleep(delay)
+
+
+# buckets by (backend, None) and (backend, credential), built out of the RATE_LIMIT settings
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_buckets(backend, credential=None) -> list:
+    """
+    Returns the buckets a call to `backend` on behalf of `credential` goes
+    through, none when rate limiting is disabled.
+    """
+    if not is_enabled():
+        return []
+    options = settings.RATE_LIMIT.get('BACKENDS', {}).get(backend, {})
+    keys = [(backend, None, options.get('RATE'), options.get('BURST'))]
+    if credential is not None:
+        keys.append((backend, credential, options.get('CREDENTIAL_RATE'), options.get('CREDENTIAL_BURST')))
+
+    buckets = []
+    with _buckets_lock:
+        for backend, credential, rate, burst in keys:
+            if not rate:
+                continue
+            if (backend, credential) not in _buckets:
+                _buckets[(backend, credential)] = TokenBucket(rate=rate, burst=burst or rate)
+            buckets.append(_buckets[(backend, credential)])
+    return buckets
+
+
+def reset():
+    with _buckets_lock:
+        _buckets.clear()
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'RATE_LIMIT', {}).get('ENABLED', False)
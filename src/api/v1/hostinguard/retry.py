@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+from api.v1.hostinguard import exceptions, instrumentation
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+
+class RetryPolicy(object):
+    """
+    Tells when and how long to wait before calling a flaky endpoint again.
+
+    Delays follow an exponential backoff with full jitter (a random value
+    between 0 and `base_delay` * 2^attempt, capped to `max_delay`) and no
+    attempt is started after `deadline` seconds since the first one.
+    A call is retried when it raises one of `retry_on_exceptions` (a tuple of
+    exception types, or a predicate), or when `retry_on_result` returns True
+    for its result.
+    """
+
+    def __init__(self, max_attempts, deadline, base_delay=1, max_delay=30,
+                 retry_on_exceptions=(), retry_on_result=None):
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on_exceptions = retry_on_exceptions
+        self.retry_on_result = retry_on_result
+
+    def get_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def should_retry_exception(self, error: Exception) -> bool:
+        if callable(self.retry_on_exceptions) and not isinstance(self.retry_on_exceptions, tuple):
+            return self.retry_on_exceptions(error)
+        return isinstance(error, self.retry_on_exceptions)
+
+    def should_retry_result(self, result) -> bool:
+        return self.retry_on_result is not None and self.retry_on_result(result)
+
+
+def call(func, policy: RetryPolicy, endpoint: str, limit=None):
+    """
+    Calls `func` until it succeeds, according to `policy`, every attempt
+    waiting for its turn first when rate limited by `limit` (see ratelimit.Limit).
+    Returns the last result, even when still retryable once attempts or time
+    are over, or raises the last exception, RateLimited when the turn of an
+    attempt would come after the deadline of `policy`.
+    """
+    attempts = Attempts(policy, endpoint)
+    while True:
+        max_wait = attempts.start()
+        if limit is not None:
+            try:
+                limit.wait(max_wait=max_wait)
+            except exceptions.RateLimited:
+                attempts.give_up()
+                raise
+        try:
+            result = func()
+        except Exception as e:
+            delay = attempts.get_delay_after_exception(e)
+            if delay is None:
+                raise
+        else:
+            delay = attempts.get_delay_after_result(result)
+            if delay is None:
+                return result
+        time.sleep(delay)
+
+
+async def call_async(func, policy: RetryPolicy, endpoint: str, limit=None):
+    """
+    Same as call(), for a coroutine function: waiting between attempts (or
+    for a rate limited turn) yields to the event loop instead of blocking the thread.
+    """
+    attempts = Attempts(policy, endpoint)
+    while True:
+        max_wait = attempts.start()
+        if limit is not None:
+            try:
+                await limit.wait_async(max_wait=max_wait)
+            except exceptions.RateLimited:
+                attempts.give_up()
+                raise
+        try:
+            result = await func()
+        except Exception as e:
+            delay = attempts.get_delay_after_exception(e)
+            if delay is None:
+                raise
+        else:
+            delay = attempts.get_delay_after_result(result)
+            if delay is None:
+                return result
+        await asyncio.sleep(delay)
+
+
+class Attempts(object):
+    """
+    The attempts of a call to `endpoint` made by call() or call_async(),
+    telling after each one whether to give up or how long to wait before the
+    next one, according to `policy`, and recording the call once it is over.
+    """
+
+    def __init__(self, policy: RetryPolicy, endpoint: str):
+        self.policy = policy
+        self.endpoint = endpoint
+        self.started = time.monotonic()
+        self.attempt = 0
+
+    def start(self) -> float:
+        """
+        Counts a new attempt and returns the seconds left before the deadline:
+        no rate limited turn coming after it is worth waiting for.
+        """
+        self.attempt += 1
+        return self.policy.deadline - (time.monotonic() - self.started)
+
+    def give_up(self):
+        """
+        Records the call as failed before its current attempt was made.
+        """
+        self._record(self.attempt - 1, failed=True)
+
+    def get_delay_after_exception(self, error: Exception) -> Optional[float]:
+        """
+        Returns the delay before the next attempt, None when `error` is to be raised.
+        """
+        delay = self._next_delay(error) if self.policy.should_retry_exception(error) else None
+        if delay is None:
+            self._record(self.attempt, failed=True)
+        return delay
+
+    def get_delay_after_result(self, result) -> Optional[float]:
+        """
+        Returns the delay before the next attempt, None when `result` is to be returned.
+        """
+        if not self.policy.should_retry_result(result):
+            self._record(self.attempt, failed=False)
+            return None
+        delay = self._next_delay(result)
+        if delay is None:
+            self._record(self.attempt, failed=True)
+        return delay
+
+    def _next_delay(self, outcome) -> Optional[float]:
+        """
+        Returns the delay before the next attempt, None when giving up.
+        """
+        if self.attempt >= self.policy.max_attempts:
+            message = ': giving up after ' + str(self.attempt) + ' attempts, last outcome: '
+            logger.warning(self.endpoint + message + str(outcome))
+            return None
+        delay = self.policy.get_delay(self.attempt - 1)
+        if time.monotonic() + delay - self.started > self.policy.deadline:
+            logger.warning(self.endpoint + ': giving up, deadline of ' + str(self.policy.deadline) + 's reached')
+            return None
+        logger.debug(self.endpoint + ': attempt ' + str(self.attempt) + ' failed, retrying in ' + '%.2f' % delay + 's')
+        return delay
+
+    def _record(self, attempts, failed):
+        # the hostinguard_outbound_* metrics, see instrumentation.record_outbound
+        instrumentation.record_outbound(self.endpoint, attempts, time.monotonic() - self.started, failed)
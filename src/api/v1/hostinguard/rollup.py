@@ -0,0 +1,225 @@
+import atexit
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+
+from api.v1.hostinguard import indices, persistence
+from api.v1.hostinguard.timeseries import TimeSeriesStore
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+
+class Aggregate(object):
+    """
+    Streaming min/max/sum/count of a metric, avg being derived from them, along
+    with its most recent value (the one of the latest timestamp).
+    """
+    __slots__ = ('min', 'max', 'sum', 'count', 'last', 'last_timestamp')
+
+    def __init__(self, value=None, timestamp=0.0):
+        self.min = math.inf
+        self.max = -math.inf
+        self.sum = 0.0
+        self.count = 0
+        self.last = None
+        self.last_timestamp = -math.inf
+        if value is not None:
+            self.add(value, timestamp)
+
+    def add(self, value: float, timestamp=0.0):
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self.sum += value
+        self.count += 1
+        if timestamp >= self.last_timestamp:
+            self.last, self.last_timestamp = value, timestamp
+
+    def merge(self, other: 'Aggregate'):
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sum += other.sum
+        self.count += other.count
+        if other.count and other.last_timestamp >= self.last_timestamp:
+            self.last, self.last_timestamp = other.last, other.last_timestamp
+
+    def to_dict(self) -> dict:
+        return {'min': self.min, 'max': self.max, 'avg': self.sum / self.count, 'sum': self.sum, 'count': self.count}
+
+
+class Resolution(object):
+
+    def __init__(self, name, seconds, partition=indices.DAILY):
+        self.name = name
+        self.seconds = seconds
+        self.partition = partition
+
+
+class RollupStage(object):
+    """
+    Pre-aggregates the collected documents of every app at several
+    `resolutions` (e.g. 1m, 5m, 1h and 1d), each one written to its own
+    time-partitioned indices, e.g. <INDEX>-5m-2026.10.18.
+
+    Samples only update the finest resolution: once over, its buckets are
+    written and merged into the next resolution, and so on, so every
+    resolution costs one merge per bucket of the previous one. A rollup
+    document holds the min/max/avg/sum/count of every numeric metric (under
+    "metrics"), the last logs_data status histogram of the bucket (a daily
+    cumulative snapshot) and the logs_delta one (per tick counts) summed over it.
+    Documents are indexed with their bucket start as timestamp; sum and count
+    let partial buckets (e.g. around a restart) be combined at query time.
+
+    A sample older than the open bucket of a resolution is written right away
+    as a partial bucket of its own, and merged into the coarser resolutions.
+    """
+    TEMPLATE_NAME = 'hostinguard-rollup-'
+
+    def __init__(self, resolutions, es_service):
+        self.resolutions = sorted(resolutions, key=lambda resolution: resolution.seconds)
+        self.es_service = es_service
+        # (app, level) -> [bucket start, {metric: Aggregate}]
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def add(self, app, data: dict, timestamp: float = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        aggregates = {metric: Aggregate(value, timestamp) for metric, value in TimeSeriesStore.flatten(data)}
+        closed = []
+        with self._lock:
+            self._add(app, 0, timestamp, aggregates, closed)
+        self._write(closed)
+
+    def flush(self):
+        """
+        Writes the buckets still open, from the finest resolution up.
+        """
+        closed = []
+        with self._lock:
+            apps = {app for app, _ in self._buckets}
+            for app in apps:
+                for level, resolution in enumerate(self.resolutions):
+                    bucket = self._buckets.pop((app, level), None)
+                    if bucket is None:
+                        continue
+                    closed.append((app, resolution, bucket))
+                    if level + 1 < len(self.resolutions):
+                        self._add(app, level + 1, bucket[0], bucket[1], closed)
+        self._write(closed)
+
+    def _add(self, app, level, timestamp, aggregates, closed):
+        resolution = self.resolutions[level]
+        bucket = self._buckets.get((app, level))
+        start = timestamp - timestamp % resolution.seconds
+        if bucket is not None and start < bucket[0]:
+            # late sample, its bucket is over already
+            closed.append((app, resolution, [start, aggregates]))
+            if level + 1 < len(self.resolutions):
+                self._add(app, level + 1, start, aggregates, closed)
+            return
+        if bucket is not None and start > bucket[0]:
+            closed.append((app, resolution, bucket))
+            del self._buckets[(app, level)]
+            if level + 1 < len(self.resolutions):
+                self._add(app, level + 1, bucket[0], bucket[1], closed)
+        self._merge(app, level, start, aggregates)
+
+    def _merge(self, app, level, timestamp, aggregates):
+        resolution = self.resolutions[level]
+        bucket = self._buckets.setdefault((app, level), [timestamp - timestamp % resolution.seconds, {}])
+        for metric, aggregate in aggregates.items():
+            current = bucket[1].get(metric)
+            if current is None:
+                current = bucket[1][metric] = Aggregate()
+            current.merge(aggregate)
+
+    def _write(self, closed):
+        if not closed:
+            return
+        actions = []
+        for app, resolution, (start, aggregates) in closed:
+            base = settings.ES[app]['INDEX']
+            doc_type = settings.ES[app]['DOC_TYPE']
+            indices.ensure_template(self.es_service, self.TEMPLATE_NAME + app, self.template(base, doc_type))
+            document = {
+                'app': app,
+                'resolution': resolution.name,
+                'timestamp': datetime.fromtimestamp(start, tz=timezone.utc),
+                'metrics': {metric: aggregate.to_dict() for metric, aggregate in aggregates.items()},
+                'logs_data': {
+                    metric[len('logs_data.'):]: int(aggregate.last)
+                    for metric, aggregate in aggregates.items() if metric.startswith('logs_data.')
+                },
+                'logs_delta': {
+                    metric[len('logs_delta.'):]: int(aggregate.sum)
+                    for metric, aggregate in aggregates.items() if metric.startswith('logs_delta.')
+                },
+            }
+            index = indices.partitioned_index(base + '-' + resolution.name, start, resolution.partition)
+            actions.append((index, doc_type, document))
+        for result in persistence.write(self.es_service, actions):
+            if result['result'] == 'error':
+                logger.error('rollup persistence failed: ' + str(result.get('error')))
+
+    def template(self, base, doc_type) -> dict:
+        """
+        Returns the index template of the rollup indices of `base`: aggregates
+        are doubles (counts longs), without any text analysis.
+        """
+        return {
+            'index_patterns': [base + '-' + resolution.name + '-*' for resolution in self.resolutions],
+            # over the template of the raw partitions (see indices.get_template)
+            'order': 1,
+            'mappings': {
+                doc_type: {
+                    'dynamic_templates': [
+                        {'counts': {'path_match': 'metrics.*.count', 'mapping': {'type': 'long'}}},
+                        {'aggregates': {'path_match': 'metrics.*', 'match_mapping_type': 'double',
+                                        'mapping': {'type': 'double'}}},
+                        {'integral_aggregates': {'path_match': 'metrics.*', 'match_mapping_type': 'long',
+                                                 'mapping': {'type': 'double'}}},
+                        {'statuses': {'path_match': 'logs_data.*', 'mapping': {'type': 'long'}}},
+                        {'status_deltas': {'path_match': 'logs_delta.*', 'mapping': {'type': 'long'}}},
+                    ],
+                    'properties': {
+                        'app': {'type': 'keyword'},
+                        'resolution': {'type': 'keyword'},
+                        'timestamp': {'type': 'date'},
+                    },
+                },
+            },
+        }
+
+
+_stage = None
+_stage_lock = threading.Lock()
+
+
+def get_rollup_stage() -> RollupStage:
+    """
+    Returns the rollup stage of this process, built out of the ROLLUP settings
+    and flushed on exit.
+    """
+    global _stage
+    with _stage_lock:
+        if _stage is None:
+            _stage = RollupStage(
+                resolutions=[
+                    Resolution(
+                        name=resolution['NAME'],
+                        seconds=resolution['SECONDS'],
+                        partition=resolution.get('PARTITION', indices.DAILY)
+                    )
+                    for resolution in settings.ROLLUP['RESOLUTIONS']
+                ],
+                es_service=settings.ES_SERVICE
+            )
+            atexit.register(_stage.flush)
+        return _stage
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'ROLLUP', {}).get('ENABLED', False)
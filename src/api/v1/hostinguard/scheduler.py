@@ -0,0 +1,92 @@
+import logging
+import random
+import threading
+import time
+
+from api.v1.hostinguard import collector
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+
+class Scheduler(object):
+    """
+    Runs a collection pass every `interval` seconds in a long-lived process,
+    so that clients, sessions and caches stay warm between ticks.
+
+    Ticks are aligned on the start time (no drift), missed ticks are skipped,
+    and apps still being collected by a previous pass are left out of the
+    following ones. Every pass starts after a random delay of up to `jitter`
+    seconds, spreading the load of several collector processes.
+    """
+
+    def __init__(self, engine, interval, jitter=0, apps=None):
+        self.engine = engine
+        self.interval = interval
+        self.jitter = jitter
+        self.apps = apps
+        self._running = set()
+        self._passes = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def next_tick(self, previous_tick: float, current_time: float) -> float:
+        """
+        Returns the first tick after `current_time` aligned on `previous_tick`.
+        """
+        missed = max(0, int((current_time - previous_tick) // self.interval))
+        if missed:
+            logger.warning('collection overrun, skipping ' + str(missed) + ' tick(s)')
+        return previous_tick + (missed + 1) * self.interval
+
+    def tick(self) -> list:
+        """
+        Starts a collection pass over the apps not already being collected,
+        returning them.
+        """
+        apps = collector.get_apps() if self.apps is None else self.apps
+        with self._lock:
+            skipped = [app for app in apps if app in self._running]
+            apps = [app for app in apps if app not in self._running]
+            self._running.update(apps)
+            self._passes = [p for p in self._passes if p.is_alive()]
+        if skipped:
+            logger.warning('still collecting, skipping: ' + ', '.join(skipped))
+        if apps:
+            collection_pass = threading.Thread(target=self._run_pass, args=(apps,), daemon=True)
+            with self._lock:
+                self._passes.append(collection_pass)
+            collection_pass.start()
+        return apps
+
+    def run_forever(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self.tick()
+            next_tick = self.next_tick(next_tick, time.monotonic())
+            self._stop.wait(max(0, next_tick - time.monotonic()))
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self):
+        """
+        Waits for the passes still running.
+        """
+        with self._lock:
+            passes = list(self._passes)
+        for collection_pass in passes:
+            collection_pass.join()
+
+    def _run_pass(self, apps):
+        try:
+            if self.jitter:
+                time.sleep(random.uniform(0, self.jitter))
+            results = self.engine.run(apps)
+            logger.info('collection pass: ' + str({app: result['result'] for app, result in results.items()}))
+        except Exception:
+            logger.exception('collection pass failed')
+        finally:
+            with self._lock:
+                self._running.difference_update(apps)
@@ -1,111 +1,545 @@
-import importlib
 import logging
-import os
 import re
+import threading
 import time
-from typing import Optional
+from concurrent import futures
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import urlparse
 
-import requests
 from django.utils.timezone import now
-from elasticsearch import Elasticsearch
 from rest_framework import status
 
-from api.v1.hostinguard import constants
+from api.v1.hostinguard import (access_logs, async_http, constants, es_writer,
+                                exceptions, instrumentation, ratelimit, retry)
+from main import conf
 from services.cpanelapi import client as cpanel_client
 from services.googleapi import client as google_client
+from services.procfs import client as procfs_client
 
-settings = importlib.import_module(os.environ['DJANGO_SETTINGS_MODULE'])
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+settings = conf.get_settings()
 logger = logging.getLogger(settings.LOGGER)
 
 
+def is_network_error(error) -> bool:
+    # the HTTP clients are only imported once used, not to slow down the start of every process
+    import httpx
+    import requests
+
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError))
+
+
+def is_transient_failure(response) -> bool:
+    """
+    Tells whether the `response` of a batched GA query is an error worth retrying.
+    """
+    return isinstance(response, Exception) and google_client.is_transient_error(response)
+
+
 class GoogleHandler(object):
+    """
+    Fetches the realtime users and today's totals of Google Analytics views
+    (profiles), many views readable with the same key file at once: their
+    queries are sent through batched requests (up to `batch_size` queries each),
+    up to `max_concurrency` batches at a time.
+    A view is referred to by its id, the URL of its website or None, standing
+    for the first view readable with the key file.
+    """
+    CACHE_TTL = 3600
+    TOTALS_TTL = 900
+    BATCH_SIZE = 10
+    MAX_CONCURRENCY = 2
+    # min seconds between two discoveries of the views triggered by an unknown one
+    PROFILES_REFRESH_INTERVAL = 300
+    RETRY_POLICY = retry.RetryPolicy(
+        max_attempts=3,
+        deadline=20,
+        retry_on_exceptions=google_client.is_transient_error,
+        # queries failing for a transient reason are sent again, see _execute_batch
+        retry_on_result=lambda responses: any(is_transient_failure(response) for response in responses.values())
+    )
+
+    # process-wide cache of today's totals (sessions, users and new users), refreshed
+    # by GA far less often than every tick: (key_file_location, profile_id) -> (expiry, day, totals),
+    # and last discovery of the views triggered by an unknown one, by key_file_location
+    _totals = {}
+    _profiles_refreshed = {}
+    _cache_lock = threading.Lock()
 
-    def __init__(self, api_name, api_version, scopes, key_file_location):
+    # batches executors, by max concurrency: their threads keep their own HTTP objects
+    _executors = {}
+
+    def __init__(self, api_name, api_version, scopes, key_file_location, cache_ttl=CACHE_TTL,
+                 totals_ttl=TOTALS_TTL, profile=None, batch_size=BATCH_SIZE, max_concurrency=MAX_CONCURRENCY):
         self.api_name = api_name
         self.api_version = api_version
         self.scopes = scopes
         self.key_file_location = key_file_location
+        self.cache_ttl = cache_ttl
+        self.totals_ttl = totals_ttl
+        self.profile = profile
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
 
     def get_google_data(self) -> dict:
+        google_data = self.get_profiles_data([self.profile])[self.profile]
+        if isinstance(google_data, Exception):
+            raise google_data
+        return google_data
+
+    @instrumentation.timed('google')
+    def get_profiles_data(self, profiles: list) -> dict:
+        """
+        Returns the data of every view of `profiles`, by view reference, the
+        error of the views whose queries failed taking the place of their data.
+        """
         client = google_client.Client()
-        service = client.get_service(
+        try:
+            return self._get_profiles_data(client, profiles)
+        except Exception as e:
+            if not google_client.is_auth_error(e):
+                raise
+            # cached credentials are no longer valid, rebuilding the service once
+            logger.warning('Google API authentication error: ' + str(e))
+            client.invalidate(
+                api_name=self.api_name,
+                api_version=self.api_version,
+                scopes=self.scopes,
+                key_file_location=self.key_file_location
+            )
+            return self._get_profiles_data(client, profiles)
+
+    def _get_profiles_data(self, client, profiles: list) -> dict:
+        service, readable = client.get_cached_service(
             api_name=self.api_name,
             api_version=self.api_version,
             scopes=self.scopes,
-            key_file_location=self.key_file_location
+            key_file_location=self.key_file_location,
+            ttl=self.cache_ttl
         )
-        profile = client.get_first_profile_id(service)
-
-        result = service.data().realtime().get(
-            ids='ga:' + profile,
-            metrics=constants.REAL_TIME_USERS
-        ).execute()
-        active_users = int(result['totalsForAllResults'][constants.REAL_TIME_USERS])
-        result = service.data().ga().get(
-            ids='ga:' + profile,
-            start_date='today',
-            end_date='today',
-            metrics='ga:sessions,ga:users,ga:newUsers').execute()
-        users_cnt = int(result['totalsForAllResults'][constants.SESSIONS])
-        unique_users_cnt = int(result['totalsForAllResults'][constants.UNIQUE_USERS])
-        new_users_cnt = int(result['totalsForAllResults'][constants.NEW_USERS])
-
-        google_data = {
-            'active_users': active_users,
-            'users_cnt': users_cnt,
-            'unique_users_cnt': unique_users_cnt,
-            'new_users_cnt': new_users_cnt
-        }
-        return google_data
+        if any(self.find_profile(readable, profile) is None for profile in profiles) and self._may_refresh_profiles():
+            # views added since their last discovery
+            readable = client.refresh_profiles(
+                api_name=self.api_name,
+                api_version=self.api_version,
+                scopes=self.scopes,
+                key_file_location=self.key_file_location
+            )
+        profile_ids = {profile: self.find_profile(readable, profile) for profile in profiles}
+
+        # the realtime users are queried on every tick, today's totals only once
+        # their cached value is stale
+        totals = {}
+        queries = []
+        for profile_id in sorted(set(profile_ids.values()) - {None}):
+            queries.append(('realtime:' + profile_id, service.data().realtime().get(
+                ids='ga:' + profile_id,
+                metrics=constants.REAL_TIME_USERS
+            )))
+            totals[profile_id] = self.get_cached_totals(profile_id)
+            if totals[profile_id] is None:
+                queries.append(('totals:' + profile_id, service.data().ga().get(
+                    ids='ga:' + profile_id,
+                    start_date='today',
+                    end_date='today',
+                    metrics=constants.TOTALS
+                )))
+        responses = self._execute(client, service, queries)
+        errors = [response for response in responses.values() if isinstance(response, Exception)]
+        for error in errors:
+            if google_client.is_auth_error(error):
+                raise error
+
+        profiles_data = {}
+        for profile, profile_id in profile_ids.items():
+            if profile_id is None:
+                profiles_data[profile] = exceptions.ResourceUnavailable(
+                    'no Google Analytics view ' + str(profile) + ' readable with ' + str(self.key_file_location))
+                continue
+            realtime = responses['realtime:' + profile_id]
+            if totals[profile_id] is None:
+                totals[profile_id] = responses['totals:' + profile_id]
+                if not isinstance(totals[profile_id], Exception):
+                    totals[profile_id] = totals[profile_id]['totalsForAllResults']
+                    self.set_cached_totals(profile_id, totals[profile_id])
+            for response in (realtime, totals[profile_id]):
+                if isinstance(response, Exception):
+                    profiles_data[profile] = response
+                    break
+            else:
+                profiles_data[profile] = {
+                    'active_users': int(realtime['totalsForAllResults'][constants.REAL_TIME_USERS]),
+                    'users_cnt': int(totals[profile_id][constants.SESSIONS]),
+                    'unique_users_cnt': int(totals[profile_id][constants.UNIQUE_USERS]),
+                    'new_users_cnt': int(totals[profile_id][constants.NEW_USERS])
+                }
+        return profiles_data
+
+    def _execute(self, client, service, queries: list) -> dict:
+        """
+        Sends the (name, query) `queries` in batches of `batch_size`, returning
+        their responses (or errors) by name.
+        """
+        batches = [queries[i:i + self.batch_size] for i in range(0, len(queries), self.batch_size)]
+
+        def execute_batch(batch):
+            # the service HTTP object must not be shared between threads
+            http = client.get_thread_http(
+                api_name=self.api_name,
+                api_version=self.api_version,
+                scopes=self.scopes,
+                key_file_location=self.key_file_location
+            )
+            return self._execute_batch(client, service, batch, http)
+
+        if len(batches) <= 1:
+            return execute_batch(batches[0]) if batches else {}
+        responses = {}
+        for batch_responses in self._get_executor().map(execute_batch, batches):
+            responses.update(batch_responses)
+        return responses
+
+    def _execute_batch(self, client, service, batch: list, http) -> dict:
+        responses = {}
+        # every query of a batch counts against the quotas
+        limit = ratelimit.Limit(ratelimit.GOOGLE, self.key_file_location, tokens=len(batch))
+
+        def execute_pending():
+            # the queries already answered, or failed for good, are not sent again
+            pending = [
+                (name, query) for name, query in batch
+                if name not in responses or is_transient_failure(responses[name])
+            ]
+            responses.update(client.execute_batch(service, pending, http=http, raise_on_error=False))
+            limit.tokens = sum(1 for response in responses.values() if is_transient_failure(response))
+            return responses
+
+        return retry.call(
+            execute_pending,
+            policy=self.RETRY_POLICY,
+            endpoint='google:' + ('batch' if len(batch) > 1 else batch[0][0].split(':')[0]),
+            limit=limit
+        )
+
+    def _get_executor(self) -> futures.ThreadPoolExecutor:
+        with self._cache_lock:
+            if self.max_concurrency not in self._executors:
+                self._executors[self.max_concurrency] = futures.ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix='google')
+            return self._executors[self.max_concurrency]
+
+    def _may_refresh_profiles(self) -> bool:
+        with self._cache_lock:
+            refreshed = self._profiles_refreshed.get(self.key_file_location)
+            if refreshed is not None and time.monotonic() - refreshed < self.PROFILES_REFRESH_INTERVAL:
+                return False
+            self._profiles_refreshed[self.key_file_location] = time.monotonic()
+            return True
+
+    @staticmethod
+    def find_profile(profiles: list, profile) -> Optional[str]:
+        """
+        Returns the id of the view `profile` refers to among `profiles`, None when
+        it is not there.
+        """
+        if profile is None:
+            return profiles[0]['id'] if profiles else None
+        # ids may be configured as numbers
+        profile = str(profile)
+        for candidate in profiles:
+            if profile == candidate['id'] or (
+                    candidate['website_url'] and profile.rstrip('/') == candidate['website_url'].rstrip('/')):
+                return candidate['id']
+        return None
+
+    def get_cached_totals(self, profile) -> Optional[dict]:
+        """
+        Returns today's totals of `profile` queried less than `totals_ttl`
+        seconds ago, None when they are stale or were queried another day.
+        """
+        with self._cache_lock:
+            entry = self._totals.get((self.key_file_location, profile))
+        if entry and entry[0] > time.monotonic() and entry[1] == now().date():
+            return entry[2]
+        return None
+
+    def set_cached_totals(self, profile, totals: dict):
+        with self._cache_lock:
+            self._totals[(self.key_file_location, profile)] = (
+                time.monotonic() + self.totals_ttl, now().date(), totals)
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._totals.clear()
+            cls._profiles_refreshed.clear()
 
 
 class CPanelHandler(object):
+    # measurements of the extended mode, see get_extended_cpanel_data
+    EXTENDED_COMMANDS = (
+        ('systemloadavg', {}),
+        ('getdiskusage', {}),
+        ('showbw', {}),
+        ('servicestatus', {'service': 'mysql'}),
+        ('servicestatus', {'service': 'httpd'}),
+    )
+    RETRY_DEADLINE = 15
 
-    def __init__(self, host, username, password, use_ssl):
+    def __init__(self, host, username, password, use_ssl, timeout=cpanel_client.DEFAULT_TIMEOUT,
+                 pool_size=cpanel_client.DEFAULT_POOL_SIZE, max_retries=cpanel_client.DEFAULT_MAX_RETRIES,
+                 extended=False):
         self.host = host
         self.username = username
         self.password = password
         self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.extended = extended
+        # the only retries of WHM calls: the session of the client does not retry (see get_client)
+        self.retry_policy = retry.RetryPolicy(
+            max_attempts=max_retries + 1,
+            deadline=self.RETRY_DEADLINE,
+            # ValueError: not a JSON body, e.g. an error page
+            retry_on_exceptions=lambda e: is_network_error(e) or isinstance(e, ValueError)
+        )
 
-    def get_cpanel_data(self) -> dict:
-        cpanel_data = {}
-        whm = cpanel_client.Client(
+    def get_client(self):
+        # cheap to build, connections are pooled per host by the client module
+        return cpanel_client.Client(
             username=self.username,
             host=self.host,
             password=self.password,
-            ssl=self.use_ssl
+            ssl=self.use_ssl,
+            timeout=self.timeout,
+            pool_size=self.pool_size,
+            max_retries=0,
+            response_hooks=(instrumentation.count_response_bytes,)
+        )
+
+    def get_limit(self) -> ratelimit.Limit:
+        return ratelimit.Limit(ratelimit.CPANEL, self.username + '@' + self.host)
+
+    @instrumentation.timed('cpanel')
+    def get_cpanel_data(self) -> dict:
+        if self.extended:
+            return self.get_extended_cpanel_data()
+        cpanel_data = {}
+        whm = self.get_client()
+        loadavg = retry.call(
+            lambda: whm.call('loadavg'),
+            policy=self.retry_policy,
+            endpoint='cpanel:' + self.host,
+            limit=self.get_limit()
         )
-        loadavg = whm.call('loadavg')
         cpanel_data['cpu_1'] = float(loadavg['one'])
         cpanel_data['cpu_5'] = float(loadavg['five'])
         cpanel_data['cpu_15'] = float(loadavg['fifteen'])
         return cpanel_data
 
+    @instrumentation.timed('cpanel')
+    async def get_cpanel_data_async(self) -> dict:
+        """
+        Same as get_cpanel_data(), WHM being called through the async session
+        of the running event loop.
+        """
+        whm = self.get_client()
+        if self.extended:
+            results = await retry.call_async(
+                lambda: whm.batch_async(*self.EXTENDED_COMMANDS),
+                policy=self.retry_policy,
+                endpoint='cpanel:' + self.host,
+                limit=self.get_limit()
+            )
+            return self.parse_batch_results(results)
+        loadavg = await retry.call_async(
+            lambda: whm.call_async('loadavg'),
+            policy=self.retry_policy,
+            endpoint='cpanel:' + self.host,
+            limit=self.get_limit()
+        )
+        return {'cpu_1': float(loadavg['one']), 'cpu_5': float(loadavg['five']), 'cpu_15': float(loadavg['fifteen'])}
+
+    def get_extended_cpanel_data(self) -> dict:
+        """
+        Fetches load average, disk usage, bandwidth, MySQL and Apache status
+        through a single WHM batch request.
+        Measurements whose command failed are left out of the result.
+        """
+        whm = self.get_client()
+        results = retry.call(
+            lambda: whm.batch(*self.EXTENDED_COMMANDS),
+            policy=self.retry_policy,
+            endpoint='cpanel:' + self.host,
+            limit=self.get_limit()
+        )
+        return self.parse_batch_results(results)
+
+    def parse_batch_results(self, results: list) -> dict:
+        """
+        Returns the measurements of the `results` of EXTENDED_COMMANDS.
+        """
+        cpanel_data = {}
+        for (function, params), result in zip(self.EXTENDED_COMMANDS, results):
+            if not result.get('metadata', {}).get('result'):
+                logger.warning('cPanel batch command ' + function + ' failed: ' + str(result.get('metadata')))
+                continue
+            data = result.get('data', {})
+            if function == 'systemloadavg':
+                cpanel_data['cpu_1'] = float(data['one'])
+                cpanel_data['cpu_5'] = float(data['five'])
+                cpanel_data['cpu_15'] = float(data['fifteen'])
+            elif function == 'getdiskusage':
+                partitions = data.get('partition', [])
+                cpanel_data['disk_used'] = sum(int(p['used']) for p in partitions)
+                cpanel_data['disk_available'] = sum(int(p['available']) for p in partitions)
+                cpanel_data['disk_used_pct'] = max([int(p['percentage']) for p in partitions], default=0)
+            elif function == 'showbw':
+                cpanel_data['bandwidth_bytes'] = sum(int(acct['totalbytes']) for acct in data.get('acct', []))
+            elif function == 'servicestatus':
+                services = data.get('service', [])
+                running = int(services[0]['running']) if services else 0
+                if params['service'] == 'mysql':
+                    cpanel_data['mysql_running'] = running
+                else:
+                    cpanel_data['apache_running'] = running
+        return cpanel_data
+
 
 class StaticResourceHandler(object):
     """
     Fetches and returns measurements not retrievable through APIs
     """
     MAX_RETRIES = 5
-    MUL_FACTOR = 2
     TIMEOUT = 5
+    DEADLINE = 20
+    RETRY_ON_EXCEPTIONS = staticmethod(is_network_error)
+    # lines of a streamed access log counted at once by the coroutines
+    STREAM_CHUNK_LINES = 1000
 
-    def __init__(self, free_ep, logs_ep):
+    def __init__(self, free_ep, logs_ep, stream_logs=False):
         self.free_ep = free_ep
         self.logs_ep = logs_ep
+        self.stream_logs = stream_logs
+
+    def get_policy(self, retry_on_result) -> retry.RetryPolicy:
+        return retry.RetryPolicy(
+            max_attempts=self.MAX_RETRIES,
+            deadline=self.DEADLINE,
+            retry_on_exceptions=self.RETRY_ON_EXCEPTIONS,
+            retry_on_result=retry_on_result
+        )
+
+    @staticmethod
+    def get_limit(url: str) -> ratelimit.Limit:
+        return ratelimit.Limit(ratelimit.STATIC, urlparse(url).hostname)
+
+    @staticmethod
+    def get_endpoint(url: str) -> str:
+        # one label per host, whatever the paths and query strings
+        return 'static:' + (urlparse(url).hostname or '')
+
+    @staticmethod
+    def is_ready(response) -> bool:
+        return response.status_code == status.HTTP_200_OK and bool(response.text)
 
-    # to be probably moved in a helper/utility class
-    def get_data_with_retry(self, url: str) -> Optional['Response']:
-        sleep_offset = 1
-        for i in range(0, self.MAX_RETRIES):
-            response = requests.get(url, timeout=self.TIMEOUT)
-            logger.debug('get_data_with_retry(), status code: ' + str(response.status_code))
-            logger.debug('text: ' + response.text)
-            if response.status_code == status.HTTP_200_OK and response.text:
-                return response
-            time.sleep(sleep_offset)
-            sleep_offset *= self.MUL_FACTOR
+    def get_data_with_retry(self, url: str) -> Optional['requests.Response']:
+        import requests
 
+        # data might not always be ready at server side, retrying until it is
+        hooks = {'response': instrumentation.count_response_bytes}
+        response = retry.call(
+            lambda: requests.get(url, timeout=self.TIMEOUT, hooks=hooks),
+            policy=self.get_policy(lambda r: not self.is_ready(r)),
+            endpoint=self.get_endpoint(url),
+            limit=self.get_limit(url)
+        )
+        logger.debug('get_data_with_retry(), status code: ' + str(response.status_code))
+        logger.debug('text length: ' + str(len(response.text)))
+        return response if self.is_ready(response) else None
+
+    async def get_data_with_retry_async(self, url: str) -> Optional['httpx.Response']:
+        """
+        Same as get_data_with_retry(), through the async HTTP client of the
+        running event loop.
+        """
+        async def get():
+            response = await async_http.get_client().get(url, timeout=self.TIMEOUT)
+            instrumentation.count_bytes(url, len(response.content))
+            return response
+
+        response = await retry.call_async(
+            get,
+            policy=self.get_policy(lambda r: not self.is_ready(r)),
+            endpoint=self.get_endpoint(url),
+            limit=self.get_limit(url)
+        )
+        logger.debug('get_data_with_retry_async(), status code: ' + str(response.status_code))
+        return response if self.is_ready(response) else None
+
+    def get_streamed_status_counts(self, url: str) -> dict:
+        """
+        Streams the access log served at `url` line by line, building its status
+        code histogram without holding the body in memory.
+        An empty histogram is retried like get_data_with_retry().
+        """
+        import requests
+
+        at = now()
+
+        def get_status_counts():
+            with requests.get(url, timeout=self.TIMEOUT, stream=True) as response:
+                logger.debug('get_streamed_status_counts(), status code: ' + str(response.status_code))
+                if response.status_code != status.HTTP_200_OK:
+                    return {}
+                return access_logs.count_statuses(instrumentation.counted_lines(url, response.iter_lines()), at=at)
+
+        return retry.call(
+            get_status_counts,
+            policy=self.get_policy(lambda counts: not counts),
+            endpoint=self.get_endpoint(url),
+            limit=self.get_limit(url)
+        )
+
+    async def get_streamed_status_counts_async(self, url: str) -> dict:
+        """
+        Same as get_streamed_status_counts(), through the async HTTP client of
+        the running event loop, counting STREAM_CHUNK_LINES lines at a time.
+        """
+        at = now()
+
+        def count(lines, counts):
+            instrumentation.count_bytes(url, sum(len(line) + 1 for line in lines))
+            for status_code, status_count in access_logs.count_statuses(lines, at=at).items():
+                counts[status_code] = counts.get(status_code, 0) + status_count
+
+        async def get_status_counts():
+            counts = {}
+            async with async_http.get_client().stream('GET', url, timeout=self.TIMEOUT) as response:
+                logger.debug('get_streamed_status_counts_async(), status code: ' + str(response.status_code))
+                if response.status_code != status.HTTP_200_OK:
+                    return {}
+                lines = []
+                async for line in response.aiter_lines():
+                    lines.append(line)
+                    if len(lines) >= self.STREAM_CHUNK_LINES:
+                        count(lines, counts)
+                        lines = []
+                count(lines, counts)
+            return counts
+
+        return await retry.call_async(
+            get_status_counts,
+            policy=self.get_policy(lambda counts: not counts),
+            endpoint=self.get_endpoint(url),
+            limit=self.get_limit(url)
+        )
+
+    @instrumentation.timed('memory')
     def get_memory_data(self) -> dict:
         """
         Process the output of the "free -m" command, refreshed every 1m
@@ -115,9 +549,20 @@ class StaticResourceHandler(object):
         Mem:          31753        2772       14548          74       14432       28411
         Swap:         20475           0       20475
         """
+        return self.parse_memory_data(self.get_data_with_retry(self.free_ep))
+
+    @instrumentation.timed('memory')
+    async def get_memory_data_async(self) -> dict:
+        """
+        Same as get_memory_data(), through the async HTTP client.
+        """
+        return self.parse_memory_data(await self.get_data_with_retry_async(self.free_ep))
+
+    def parse_memory_data(self, free) -> dict:
         data = {}
         # getting RAM usage
-        free = self.get_data_with_retry(self.free_ep)
+        if free is None:
+            raise exceptions.ResourceUnavailable('no memory data at ' + self.free_ep)
         mem = free.text.split('\n')[1]
         mem_values = re.split(r'\s+', mem)
 
@@ -137,6 +582,7 @@ class StaticResourceHandler(object):
 
         return data
 
+    @instrumentation.timed('logs')
     def get_logs_data(self) -> dict:
         """
         Process the output of the following command:
@@ -157,23 +603,62 @@ class StaticResourceHandler(object):
           1 416
 
         Refreshed every 1m
+        Raw access log lines are accepted as well (see access_logs.count_statuses),
+        streamed when `stream_logs` is set.
         """
         # retrieving logs using retry strategy because data
         # might not always be ready at server side
-        logs = self.get_data_with_retry(self.logs_ep)
-        if logs:
-            requests_codes = logs.text.split('\n')
-            data = {
-                int(requests_code.strip().split()[1]): int(requests_code.strip().split()[0])
-                for requests_code in requests_codes
-                if requests_code != ''
-            }
+        if self.stream_logs:
+            data = self.get_streamed_status_counts(self.logs_ep)
+        else:
+            at = now()
+            logs = self.get_data_with_retry(self.logs_ep)
+            # raw lines are only counted the current day, like the streamed ones
+            data = access_logs.count_statuses(logs.text.splitlines(), at=at) if logs else {}
+        return self.get_logs_result(data)
+
+    @instrumentation.timed('logs')
+    async def get_logs_data_async(self) -> dict:
+        """
+        Same as get_logs_data(), through the async HTTP client.
+        """
+        if self.stream_logs:
+            data = await self.get_streamed_status_counts_async(self.logs_ep)
         else:
+            at = now()
+            logs = await self.get_data_with_retry_async(self.logs_ep)
+            data = access_logs.count_statuses(logs.text.splitlines(), at=at) if logs else {}
+        return self.get_logs_result(data)
+
+    @staticmethod
+    def get_logs_result(data: dict) -> dict:
+        if not data:
             # custom error code notified by backend.
             data = {999: 1}
         return data
 
 
+class ProcResourceHandler(object):
+    """
+    Measures the host HostinGuard runs on straight from procfs, an alternative
+    to the "free -m" endpoint of StaticResourceHandler fitting second-level
+    sampling.
+    """
+
+    def __init__(self, proc_root=procfs_client.DEFAULT_ROOT):
+        self.proc_root = proc_root
+
+    @instrumentation.timed('proc_memory')
+    def get_memory_data(self) -> dict:
+        """
+        Returns the fields of StaticResourceHandler.get_memory_data, in MB and
+        computed as "free -m" does, along with the load averages (proc_load_1/5/15),
+        the CPU utilisation and the disk and network rates (bytes per second)
+        since the previous call, once there is one.
+        """
+        return procfs_client.get_client(self.proc_root).measure()
+
+
 class ElasticSearchHandler(object):
 
     def __init__(self, es_service, index, doc_type):
@@ -181,12 +666,21 @@ class ElasticSearchHandler(object):
         self.index = index
         self.doc_type = doc_type
 
+    @instrumentation.timed('es_write')
     def write_result(self, data: dict) -> dict:
-        es = Elasticsearch([self.es_service, ])
-        data['timestamp'] = now()
+        es = es_writer.get_es_client(self.es_service)
+        data.setdefault('timestamp', now())
         result = es.index(
             index=self.index,
             doc_type=self.doc_type,
             body=data
         )
         return result
+
+    @instrumentation.timed('es_write')
+    async def write_result_async(self, data: dict) -> dict:
+        """
+        Same as write_result(), through the async HTTP client (see es_writer.index_async).
+        """
+        data.setdefault('timestamp', now())
+        return await es_writer.index_async(self.es_service, self.index, self.doc_type, data)
@@ -0,0 +1,428 @@
+import atexit
+import fcntl
+import itertools
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from api.v1.hostinguard import es_writer, exceptions, instrumentation, retry
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+# record header: payload length and CRC32 of the payload
+HEADER = struct.Struct('>II')
+SEGMENT_NAME = 'segment-%012d.log'
+CURSOR_NAME = 'cursor'
+# locked by the process owning the spool directory
+LOCK_NAME = 'lock'
+# JSON lines of the documents ES rejected for good
+DEAD_LETTER_NAME = 'dead-letter.log'
+
+
+class Spool(object):
+    """
+    Append-only, disk-backed log of the documents to be written to ES.
+
+    Documents are stored as length-prefixed, checksummed JSON records in
+    segment files of about `segment_size` bytes, and read back through mmap
+    from the cursor of the last acknowledged record, persisted in the
+    `cursor` file. Segments entirely acknowledged are deleted, and the oldest
+    ones are dropped when the spool exceeds `max_bytes`.
+
+    On start up, a torn or corrupted tail of the last segment (e.g. a crash
+    in the middle of an append) is truncated away.
+
+    A directory belongs to a single process at a time, through an flock on
+    its `lock` file held until close() or the end of the process: opening a
+    directory owned by another process raises ResourceUnavailable.
+    """
+
+    def __init__(self, directory, segment_size, max_bytes, fsync=True):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.dropped = 0
+        self.dead_letters = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = lock_directory(directory)
+        self._recover()
+
+    def append(self, document: dict):
+        """
+        Appends `document` ({'index': ..., 'doc_type': ..., 'data': ...}),
+        giving it the id ES will index it with, so that replays are idempotent.
+        """
+        document.setdefault('id', uuid.uuid4().hex)
+        payload = json.dumps(document, cls=DjangoJSONEncoder).encode('utf-8')
+        record = HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        with self._lock:
+            if self._active_size >= self.segment_size:
+                self._segments.append(self._segments[-1] + 1)
+                self._active_size = 0
+            with open(self._path(self._segments[-1]), 'ab') as segment:
+                segment.write(record)
+                segment.flush()
+                if self.fsync:
+                    os.fsync(segment.fileno())
+            self._active_size += len(record)
+            self._enforce_max_bytes()
+
+    def read(self, max_documents: int) -> list:
+        """
+        Returns up to `max_documents` (document, position) tuples following the
+        cursor, position being the one to acknowledge once the document is written.
+        """
+        documents = []
+        with self._lock:
+            segment_id, offset = self._cursor
+            for candidate in self._segments:
+                if candidate < segment_id:
+                    continue
+                start = offset if candidate == segment_id else 0
+                for payload, end in self._read_segment(candidate, start):
+                    documents.append((json.loads(payload.decode('utf-8')), (candidate, end)))
+                    if len(documents) >= max_documents:
+                        return documents
+        return documents
+
+    def ack(self, position: tuple):
+        """
+        Acknowledges every record up to `position`, deleting the segments left
+        behind.
+        """
+        with self._lock:
+            self._cursor = tuple(position)
+            self._write_cursor()
+            for segment_id in list(self._segments[:-1]):
+                if segment_id < self._cursor[0] or (
+                        segment_id == self._cursor[0] and self._cursor[1] >= self._size(segment_id)):
+                    self._remove_segment(segment_id)
+
+    def dead_letter(self, document: dict, error):
+        """
+        Sets aside `document`, rejected by ES for good (e.g. a mapping conflict),
+        in the dead letter file of the spool, for it not to hold up the ones behind.
+        """
+        line = json.dumps({'document': document, 'error': error}, cls=DjangoJSONEncoder)
+        with self._lock:
+            with open(os.path.join(self.directory, DEAD_LETTER_NAME), 'a') as dead_letter:
+                dead_letter.write(line + '\n')
+        self.dead_letters += 1
+
+    def close(self):
+        """
+        Releases the directory, for another process to take it over.
+        """
+        with self._lock:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(self._size(segment_id) for segment_id in self._segments)
+
+    def gauges(self) -> list:
+        """
+        Returns the disk usage and the dropped documents as instrumentation gauges.
+        """
+        return [
+            ('hostinguard_spool_bytes', None, self.size()),
+            ('hostinguard_spool_dropped_documents', None, self.dropped),
+            ('hostinguard_spool_dead_letter_documents', None, self.dead_letters),
+        ]
+
+    def _recover(self):
+        self._segments = sorted(
+            int(name[len('segment-'):-len('.log')])
+            for name in os.listdir(self.directory)
+            if name.startswith('segment-') and name.endswith('.log')
+        ) or [1]
+        try:
+            with open(os.path.join(self.directory, CURSOR_NAME)) as cursor:
+                self._cursor = tuple(json.load(cursor))
+        except (IOError, ValueError):
+            self._cursor = (self._segments[0], 0)
+
+        # only the segment appended to when the process stopped can be torn
+        last = self._segments[-1]
+        valid_size = 0
+        for _, end in self._read_segment(last, 0):
+            valid_size = end
+        if os.path.exists(self._path(last)) and self._size(last) != valid_size:
+            logger.warning('spool segment ' + str(last) + ' truncated to its last valid record')
+            with open(self._path(last), 'r+b') as segment:
+                segment.truncate(valid_size)
+        self._active_size = valid_size
+        if self._cursor[0] not in self._segments:
+            self._cursor = (self._segments[0], 0)
+        elif self._cursor[0] == last:
+            self._cursor = (last, min(self._cursor[1], valid_size))
+
+    def _read_segment(self, segment_id, offset):
+        """
+        Yields the (payload, end offset) of the valid records of a segment from `offset`.
+        """
+        path = self._path(segment_id)
+        if not os.path.exists(path) or self._size(segment_id) <= offset:
+            return
+        with open(path, 'rb') as segment:
+            with mmap.mmap(segment.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                while offset + HEADER.size <= len(data):
+                    length, crc = HEADER.unpack_from(data, offset)
+                    end = offset + HEADER.size + length
+                    payload = data[offset + HEADER.size:end]
+                    if end > len(data) or zlib.crc32(payload) != crc:
+                        return
+                    yield payload, end
+                    offset = end
+
+    def _enforce_max_bytes(self):
+        total = sum(self._size(segment_id) for segment_id in self._segments)
+        while total > self.max_bytes and len(self._segments) > 1:
+            oldest = self._segments[0]
+            dropped = sum(1 for _ in self._read_segment(oldest, self._cursor[1] if oldest == self._cursor[0] else 0))
+            logger.error('spool full, dropping ' + str(dropped) + ' documents')
+            self.dropped += dropped
+            total -= self._size(oldest)
+            self._remove_segment(oldest)
+            if self._cursor[0] <= oldest:
+                self._cursor = (self._segments[0], 0)
+                self._write_cursor()
+
+    def _remove_segment(self, segment_id):
+        self._segments.remove(segment_id)
+        os.remove(self._path(segment_id))
+
+    def _write_cursor(self):
+        path = os.path.join(self.directory, CURSOR_NAME)
+        with open(path + '.tmp', 'w') as cursor:
+            json.dump(list(self._cursor), cursor)
+            cursor.flush()
+            if self.fsync:
+                os.fsync(cursor.fileno())
+        os.replace(path + '.tmp', path)
+
+    def _size(self, segment_id):
+        try:
+            return os.path.getsize(self._path(segment_id))
+        except OSError:
+            return 0
+
+    def _path(self, segment_id):
+        return os.path.join(self.directory, SEGMENT_NAME % segment_id)
+
+
+class SpoolReplayer(object):
+    """
+    Writes the spooled documents to ES in bulk, `batch_size` at a time, and
+    acknowledges them once indexed.
+    While ES is unreachable, or answers a document with a transient error
+    (e.g. 429), the batch is replayed again with a jittered backoff; documents
+    ES rejects for good (4xx) are set aside in the dead letter file instead.
+
+    Once its spool is drained, the replayer also drains the subdirectories of
+    `orphans_root` left behind by stopped processes (see open_spool), at most
+    every ADOPTION_INTERVAL seconds.
+    """
+    BACKOFF = retry.RetryPolicy(max_attempts=None, deadline=None, base_delay=1, max_delay=60)
+    ADOPTION_INTERVAL = 30
+
+    def __init__(self, spool, es_service, batch_size, interval=1, orphans_root=None):
+        self.spool = spool
+        self.es_service = es_service
+        self.batch_size = batch_size
+        self.interval = interval
+        self.orphans_root = orphans_root
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_adoption = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='hostinguard-spool-replayer', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def replay_batch(self, write_ahead_spool=None) -> int:
+        """
+        Replays one batch of `write_ahead_spool` (the spool of the replayer by
+        default), returns the number of documents acknowledged, or -1 when ES
+        could not take all of them and the batch is to be replayed.
+        """
+        write_ahead_spool = write_ahead_spool or self.spool
+        batch = write_ahead_spool.read(self.batch_size)
+        if not batch:
+            return 0
+        writer = es_writer.BulkWriter(es_service=self.es_service, max_docs=self.batch_size, flush_interval=0)
+        for document, _ in batch:
+            writer.add(document['index'], document['doc_type'], document['data'], doc_id=document['id'])
+        try:
+            results = writer.flush()
+        except Exception:
+            logger.exception('spool replay failed')
+            results = {}
+
+        rejected = []
+        for document, _ in batch:
+            result = results.get(document['id'], {})
+            if result.get('result') not in (None, 'error'):
+                continue
+            if not is_rejected(result):
+                # replayed along with the whole batch, ids keep the replay idempotent
+                return -1
+            rejected.append((document, result))
+        for document, result in rejected:
+            logger.error('spooled document ' + document['id'] + ' rejected: ' + str(result.get('error')))
+            write_ahead_spool.dead_letter(document, result.get('error'))
+        write_ahead_spool.ack(batch[-1][1])
+        return len(batch)
+
+    def replay_orphans(self) -> int:
+        """
+        Replays the subdirectories of `orphans_root` no process owns, releasing
+        each one once drained or when ES cannot take its documents, returns the
+        number of documents acknowledged.
+        """
+        replayed = 0
+        for orphan in open_orphans(self.orphans_root, self.spool):
+            try:
+                while not self._stop.is_set():
+                    count = self.replay_batch(orphan)
+                    if count <= 0:
+                        break
+                    replayed += count
+            finally:
+                orphan.close()
+        return replayed
+
+    def _run(self):
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                replayed = self.replay_batch()
+            except Exception:
+                logger.exception('spool replay failed')
+                replayed = -1
+            if replayed < 0:
+                self._stop.wait(self.BACKOFF.get_delay(failures))
+                failures += 1
+            else:
+                failures = 0
+                if replayed < self.batch_size:
+                    self._adopt_orphans()
+                    self._stop.wait(self.interval)
+
+    def _adopt_orphans(self):
+        if self.orphans_root is None or time.monotonic() < self._next_adoption:
+            return
+        self._next_adoption = time.monotonic() + self.ADOPTION_INTERVAL
+        try:
+            replayed = self.replay_orphans()
+        except Exception:
+            logger.exception('orphaned spool replay failed')
+            return
+        if replayed:
+            logger.info('replayed ' + str(replayed) + ' documents of orphaned spools')
+
+
+def lock_directory(directory):
+    """
+    Locks the spool `directory` for this process, returning the open lock file.
+    """
+    lock_file = open(os.path.join(directory, LOCK_NAME), 'a')
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        raise exceptions.ResourceUnavailable('spool directory ' + directory + ' owned by another process')
+    return lock_file
+
+
+def open_spool(root, **options) -> Spool:
+    """
+    Opens the spool of this process in the first subdirectory of `root` no
+    other process owns: every process (WSGI/ASGI workers, hostinguard_collect)
+    appends to and replays its own segments, and the subdirectory of a stopped
+    process is taken over, pending documents included, by the next one starting
+    (its documents being replayed meanwhile by the others, see open_orphans).
+    """
+    for slot in itertools.count():
+        try:
+            return Spool(directory=os.path.join(root, str(slot)), **options)
+        except exceptions.ResourceUnavailable:
+            continue
+
+
+def open_orphans(root, owned: Spool):
+    """
+    Yields the spools of the subdirectories of `root` no process owns, but
+    `owned`, locked for this process until closed.
+    """
+    for name in sorted(os.listdir(root)):
+        directory = os.path.join(root, name)
+        if not os.path.isdir(directory) or os.path.abspath(directory) == os.path.abspath(owned.directory):
+            continue
+        try:
+            yield Spool(directory, owned.segment_size, owned.max_bytes, owned.fsync)
+        except exceptions.ResourceUnavailable:
+            continue
+
+
+def is_rejected(result: dict) -> bool:
+    """
+    Tells whether ES rejected a document for good, as opposed to a transient
+    error (too many requests, server error or ES unreachable).
+    """
+    status = result.get('status')
+    return isinstance(status, int) and 400 <= status < 500 and status != 429
+
+
+_spool = None
+_spool_lock = threading.Lock()
+
+
+def get_spool() -> Spool:
+    """
+    Returns the spool of this process, built out of the SPOOL settings, along
+    with its started replayer.
+    """
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            options = settings.SPOOL
+            _spool = open_spool(
+                options['DIRECTORY'],
+                segment_size=options.get('SEGMENT_SIZE', 16 * 1024 * 1024),
+                max_bytes=options.get('MAX_BYTES', 1024 * 1024 * 1024),
+                fsync=options.get('FSYNC', True)
+            )
+            replayer = SpoolReplayer(
+                spool=_spool,
+                es_service=settings.ES_SERVICE,
+                batch_size=options.get('BATCH_SIZE', 500),
+                orphans_root=options['DIRECTORY']
+            )
+            replayer.start()
+            atexit.register(replayer.stop, 5)
+            instrumentation.registry.register_gauges(_spool.gauges)
+        return _spool
+
+
+def is_enabled() -> bool:
+    return getattr(settings, 'SPOOL', {}).get('ENABLED', False)
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from agent import protocol
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+
+class RingBuffer(object):
+    """
+    Fixed-size series of (timestamp, value) samples, kept in two array-backed
+    columns: once full, every new sample overwrites the oldest one.
+    Samples are kept in timestamp order: the ones arriving late (e.g. pushed
+    by an agent catching up) are inserted in place, or dropped when older than
+    every sample of a full buffer.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array('d', [0.0]) * capacity
+        self.values = array('d', [0.0]) * capacity
+        self.start = 0
+        self.size = 0
+
+    def append(self, timestamp: float, value: float):
+        if self.size and timestamp < self.latest()[0]:
+            self._insert(timestamp, value)
+            return
+        end = (self.start + self.size) % self.capacity
+        self.timestamps[end] = timestamp
+        self.values[end] = value
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def _insert(self, timestamp: float, value: float):
+        position = bisect_right(_LogicalView(self), timestamp)
+        if self.size == self.capacity:
+            if not position:
+                return
+            # making room by dropping the oldest sample
+            self.start = (self.start + 1) % self.capacity
+            self.size -= 1
+            position -= 1
+        for shifted in range(self.size, position, -1):
+            target = (self.start + shifted) % self.capacity
+            source = (self.start + shifted - 1) % self.capacity
+            self.timestamps[target] = self.timestamps[source]
+            self.values[target] = self.values[source]
+        index = (self.start + position) % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index] = value
+        self.size += 1
+
+    def latest(self):
+        if not self.size:
+            return None
+        last = (self.start + self.size - 1) % self.capacity
+        return self.timestamps[last], self.values[last]
+
+    def since(self, timestamp: float) -> list:
+        """
+        Returns the [timestamp, value] samples taken from `timestamp` on.
+        """
+        # binary search over the logical (oldest first) positions
+        first = bisect_left(_LogicalView(self), timestamp)
+        samples = []
+        for position in range(first, self.size):
+            index = (self.start + position) % self.capacity
+            samples.append([self.timestamps[index], self.values[index]])
+        return samples
+
+
+class _LogicalView(object):
+    """
+    Sequence of the timestamps of a RingBuffer, oldest first.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def __len__(self):
+        return self.ring.size
+
+    def __getitem__(self, position):
+        return self.ring.timestamps[(self.ring.start + position) % self.ring.capacity]
+
+
+class TimeSeriesStore(object):
+    """
+    In-memory store of the last `capacity` samples of every numeric metric of
+    every app, e.g. 6 hours of one minute ticks with a capacity of 360.
+    Nested numeric fields are flattened, e.g. logs_data[404] -> "logs_data.404".
+
+    The store belongs to the process: it only holds the documents collected
+    (or ingested) by the process serving the timeseries EPs, and is empty in
+    the web workers while "manage.py hostinguard_collect" collects in its own.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, app, data: dict, timestamp: float = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            series = self._series.setdefault(app, {})
+            for metric, value in self.flatten(data):
+                if metric not in series:
+                    series[metric] = RingBuffer(self.capacity)
+                series[metric].append(timestamp, value)
+
+    def apps(self) -> list:
+        with self._lock:
+            return list(self._series)
+
+    def latest(self, app) -> dict:
+        """
+        Returns the last {'timestamp': ..., 'value': ...} sample of every metric of `app`.
+        """
+        with self._lock:
+            series = self._series.get(app, {})
+            return {
+                metric: dict(zip(('timestamp', 'value'), ring.latest()))
+                for metric, ring in series.items()
+            }
+
+    def window(self, app, seconds: float, metrics=None) -> dict:
+        """
+        Returns the [timestamp, value] samples of the last `seconds` of every
+        metric of `app`, or only of `metrics` when given.
+        """
+        since = time.time() - seconds
+        with self._lock:
+            series = self._series.get(app, {})
+            return {
+                metric: ring.since(since)
+                for metric, ring in series.items()
+                if metrics is None or metric in metrics
+            }
+
+    flatten = staticmethod(protocol.flatten)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> TimeSeriesStore:
+    """
+    Returns the store of this process, sized through the TIMESERIES settings.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TimeSeriesStore(capacity=getattr(settings, 'TIMESERIES', {}).get('CAPACITY', 360))
+        return _store
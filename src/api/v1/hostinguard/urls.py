@@ -0,0 +1,9 @@
+from django.conf.urls import url
+
+from api.v1.hostinguard.views import (HostinGuardCollectView,
+                                      HostinGuardIngestView)
+
+urlpatterns = [
+    url(r'^hostinguard-collect$', HostinGuardCollectView.as_view(), name='hostinguard-collect'),
+    url(r'^hostinguard-ingest$', HostinGuardIngestView.as_view(), name='hostinguard-ingest'),
+]
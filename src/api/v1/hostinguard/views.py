@@ -0,0 +1,116 @@
+import hmac
+import logging
+from datetime import datetime, timezone
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+from rest_framework.response import Response
+
+from agent import protocol
+from api.v1.async_views import AsyncAPIView
+from api.v1.hostinguard import collector
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+# the persistence results of the documents accepted, by the status answered:
+# written (created), or handed over to the pipeline (queued) or the spool (spooled)
+ACCEPTED_RESULTS = {
+    'created': 'SUCCESS',
+    'queued': 'QUEUED',
+    'spooled': 'SPOOLED',
+}
+
+
+def get_response_status(results) -> tuple:
+    """
+    Returns the (HTTP status, status) answered for the persistence `results`
+    of the documents of a request, the same for every hostinguard view:
+    201 SUCCESS once all of them are written, 202 QUEUED or SPOOLED when they
+    are only handed over to the pipeline or the spool, 400 FAILURE when any
+    of them failed.
+    """
+    results = [result['result'] for result in results]
+    if any(result not in ACCEPTED_RESULTS for result in results):
+        return status.HTTP_400_BAD_REQUEST, 'FAILURE'
+    deferred = [result for result in results if result != 'created']
+    if deferred:
+        return status.HTTP_202_ACCEPTED, ACCEPTED_RESULTS[deferred[0]]
+    return status.HTTP_201_CREATED, ACCEPTED_RESULTS['created']
+
+
+class HostinGuardCollectView(AsyncAPIView):
+
+    async def post(self, request):
+        """
+        Fetches last server measurements of every monitored app and update
+        ElasticSearch accordingly, in a single bulk request.
+        This EP should be triggered automatically through a scheduled job,
+        unless "manage.py hostinguard_collect" is running.
+        """
+        results = await collector.get_engine().run_async()
+        logger.debug('es persistence: ' + str(results))
+
+        http_status, response_status = get_response_status(results.values())
+        return Response(status=http_status, data={'status': response_status, 'apps': results})
+
+
+class HostinGuardIngestView(AsyncAPIView):
+    # frames are read from the raw body
+    parser_classes = ()
+
+    async def post(self, request):
+        """
+        Persists the samples pushed by the agents (see agent.protocol), one or
+        more frames per request, in a single bulk pass.
+        """
+        token = getattr(settings, 'INGEST', {}).get('TOKEN')
+        if not token:
+            # closed until a token is configured
+            return Response(status=status.HTTP_403_FORBIDDEN, data={'status': 'FAILURE', 'error': 'ingest disabled'})
+        sent_token = request.META.get('HTTP_X_HOSTINGUARD_TOKEN', '')
+        if not hmac.compare_digest(sent_token.encode('utf-8'), token.encode('utf-8')):
+            return Response(status=status.HTTP_403_FORBIDDEN, data={'status': 'FAILURE', 'error': 'invalid token'})
+        try:
+            samples = protocol.decode(request.body)
+        except protocol.ProtocolError as e:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'status': 'FAILURE', 'error': str(e)})
+        unknown_apps = {app for app, _, _ in samples if app not in settings.ES}
+        if unknown_apps:
+            return Response(
+                status=status.HTTP_400_BAD_REQUEST,
+                data={'status': 'FAILURE', 'error': 'unknown apps: ' + ', '.join(sorted(unknown_apps))}
+            )
+
+        results = await self.persist(samples)
+        logger.debug('es persistence of ' + str(len(samples)) + ' pushed samples')
+
+        http_status, response_status = get_response_status(results)
+        data = {'status': response_status, 'documents': len(samples)}
+        failures = [result for result in results if result['result'] not in ACCEPTED_RESULTS]
+        if failures:
+            data['failures'] = failures
+        return Response(status=http_status, data=data)
+
+    @classmethod
+    async def persist(cls, samples) -> list:
+        """
+        Observes the (app, timestamp, data) `samples`, in a thread of the event
+        loop executor, and persists them, see collector.observe and
+        collector.write_documents_async.
+        """
+        documents = await sync_to_async(cls.observe, thread_sensitive=False)(samples)
+        return await collector.write_documents_async(settings.ES_SERVICE, documents)
+
+    @staticmethod
+    def observe(samples) -> list:
+        """
+        Observes the (app, timestamp, data) `samples`, returning their (app, data) documents.
+        """
+        documents = []
+        for app, timestamp, data in samples:
+            collector.observe(app, data, timestamp)
+            data['timestamp'] = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+            documents.append((app, data))
+        return documents
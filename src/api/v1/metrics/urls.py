@@ -0,0 +1,7 @@
+from django.conf.urls import url
+
+from api.v1.metrics.views import MetricsView
+
+urlpatterns = [
+    url(r'^metrics$', MetricsView.as_view(), name='metrics'),
+]
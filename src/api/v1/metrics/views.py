@@ -0,0 +1,28 @@
+import logging
+
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.views import APIView
+
+from api.v1.hostinguard import instrumentation
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsView(APIView):
+    """
+    Serves the collector instrumentation (handlers and outbound calls timings,
+    retries, failures, bytes received, ES bulk results, pipeline and spool
+    state) in the Prometheus text exposition format.
+    """
+
+    def get(self, request):
+        return HttpResponse(
+            instrumentation.registry.render(),
+            status=status.HTTP_200_OK,
+            content_type=CONTENT_TYPE
+        )
@@ -0,0 +1,8 @@
+from django.conf.urls import url
+
+from api.v1.timeseries.views import TimeSeriesLatestView, TimeSeriesView
+
+urlpatterns = [
+    url(r'^timeseries/(?P<app>[\w-]+)/latest$', TimeSeriesLatestView.as_view(), name='timeseries-latest'),
+    url(r'^timeseries/(?P<app>[\w-]+)$', TimeSeriesView.as_view(), name='timeseries'),
+]
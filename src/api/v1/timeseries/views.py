@@ -0,0 +1,53 @@
+import logging
+import math
+
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from api.v1.hostinguard import timeseries
+from main import conf
+
+settings = conf.get_settings()
+logger = logging.getLogger(settings.LOGGER)
+
+
+# the store only holds what this process collected or ingested, see timeseries.TimeSeriesStore
+NOT_COLLECTED = {
+    'status': 'UNKNOWN_APP',
+    'error': 'no sample collected by this process (is "manage.py hostinguard_collect" collecting elsewhere?)',
+}
+
+
+class TimeSeriesLatestView(APIView):
+
+    def get(self, request, app):
+        """
+        Returns the last sample of every metric of the app, as collected by this process.
+        """
+        store = timeseries.get_store()
+        if app not in store.apps():
+            return Response(status=status.HTTP_404_NOT_FOUND, data=NOT_COLLECTED)
+        return Response(status=status.HTTP_200_OK, data=store.latest(app))
+
+
+class TimeSeriesView(APIView):
+    DEFAULT_MINUTES = 15
+
+    def get(self, request, app):
+        """
+        Returns the samples of the last `minutes` (15 by default) of every metric
+        of the app, or of the comma separated `metrics` only, as collected by this process.
+        """
+        store = timeseries.get_store()
+        if app not in store.apps():
+            return Response(status=status.HTTP_404_NOT_FOUND, data=NOT_COLLECTED)
+        try:
+            minutes = float(request.query_params.get('minutes', self.DEFAULT_MINUTES))
+        except ValueError:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'status': 'INVALID_MINUTES'})
+        if not math.isfinite(minutes) or minutes <= 0:
+            return Response(status=status.HTTP_400_BAD_REQUEST, data={'status': 'INVALID_MINUTES'})
+        metrics = request.query_params.get('metrics')
+        data = store.window(app, seconds=minutes * 60, metrics=metrics.split(',') if metrics else None)
+        return Response(status=status.HTTP_200_OK, data=data)
@@ -0,0 +1,20 @@
+"""
+ASGI config for this project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The async views (see api.v1.async_views) are served natively by it, without
+holding a worker thread while their backends answer.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+import sys
+
+from django.core.asgi import get_asgi_application
+
+sys.path.append('src')
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings.production")
+
+application = get_asgi_application()
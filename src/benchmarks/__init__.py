@@ -0,0 +1,7 @@
+import os
+
+import django
+
+# the benchmarks drive the hostinguard modules outside of a Django server
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings.development')
+django.setup()
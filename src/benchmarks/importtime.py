@@ -0,0 +1,99 @@
+"""
+Measures what starting the Django process costs, out of `python -X importtime`,
+for every entry point: the URL configuration (served by the WSGI/ASGI
+workers) and the management commands.
+
+    cd src && python -m benchmarks.importtime --output ../importtime.json
+
+Reports, as JSON, the total import time (seconds, django.setup() included)
+of every entry point along with its slowest modules, and exits with an error
+when one of them exceeds its budget or imports a backend client upfront.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+from main import conf
+
+settings = conf.get_settings()
+
+# entry points and their startup budget (seconds)
+BUDGETS = {
+    'main.urls': 1.5,
+    'api.v1.hostinguard.management.commands.hostinguard_collect': 1.0,
+    'api.v1.hostinguard.management.commands.hostinguard_retention': 1.0,
+}
+
+# backend clients only to be imported once used
+LAZY_MODULES = (
+    'googleapiclient.discovery',
+    'oauth2client.client',
+    'elasticsearch',
+    'httplib2',
+    'httpx',
+)
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def measure(module, top=10) -> dict:
+    """
+    Imports `module` in a fresh interpreter, returning its total import time,
+    its `top` slowest modules (cumulative seconds) and the lazy modules it
+    imported nonetheless.
+    """
+    statement = (
+        'import json, sys, django; django.setup(); import {module}; '
+        'print(json.dumps([name for name in {lazy!r} if type(sys.modules.get(name)).__name__ == "module"]))'
+    ).format(module=module, lazy=LAZY_MODULES)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=os.path.dirname(settings.BASE_DIR), capture_output=True, text=True, check=True
+    )
+
+    total = 0
+    modules = []
+    for line in process.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        cumulative = int(match.group(2)) / 10 ** 6
+        modules.append((match.group(4), cumulative))
+        if not match.group(3):
+            # top level import, its cumulative time covers the nested ones
+            total += cumulative
+    return {
+        'module': module,
+        'total': total,
+        'budget': BUDGETS.get(module),
+        'slowest': sorted(modules, key=lambda item: item[1], reverse=True)[:top],
+        'eager_backends': json.loads(process.stdout.splitlines()[-1]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measures the import time of the Django process entry points.')
+    parser.add_argument('--modules', nargs='+', default=list(BUDGETS), help='entry points to import')
+    parser.add_argument('--top', type=int, default=10, help='slowest modules reported')
+    parser.add_argument('--output', help='JSON report path, stdout by default')
+    options = parser.parse_args(argv)
+
+    results = [measure(module, options.top) for module in options.modules]
+    report = json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2)
+    if options.output:
+        with open(options.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+
+    over = [result['module'] for result in results
+            if result['eager_backends'] or (result['budget'] and result['total'] > result['budget'])]
+    if over:
+        sys.exit('over budget: ' + ', '.join(over))
+
+
+if __name__ == '__main__':
+    main()
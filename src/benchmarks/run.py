@@ -0,0 +1,164 @@
+"""
+Measures what a collection tick costs, end to end, against the local
+stand-ins of benchmarks.stubs:
+
+    cd src && python -m benchmarks --apps 1 10 100 1000 --ticks 10 --output ../benchmark.json
+
+For every number of apps, reports the ticks per second, the p50/p99 tick
+latency (seconds) and the memory allocated per tick (tracemalloc peak, bytes,
+measured over separate ticks not to slow the timed ones down), as JSON.
+"""
+import argparse
+import json
+import math
+import platform
+import resource
+import time
+import tracemalloc
+
+import requests
+
+from api.v1.hostinguard import collector, es_writer, service_handler
+from benchmarks import stubs
+from main import conf
+from services.googleapi import client as google_client
+
+settings = conf.get_settings()
+
+
+def percentile(values, percent):
+    ranked = sorted(values)
+    return ranked[max(0, math.ceil(len(ranked) * percent / 100) - 1)]
+
+
+def whm_host(number):
+    # every app gets its own WHM host (and pooled session), 127.0.0.0/8 being loopback
+    return '127.0.%d.%d' % (number // 254, number % 254 + 1)
+
+
+def configure(apps, url, extended, shared_ga_key=False):
+    """
+    Points the settings of `apps` monitored apps to the stand-ins, every app
+    reading its own GA view with its own key file, unless `shared_ga_key`.
+    """
+    google_service = stubs.StubGoogleService(url, requests.Session())
+    google_client.Client.clear_cache()
+    service_handler.GoogleHandler.clear_cache()
+    settings.GOOGLE_API, settings.CPANEL, settings.STATIC_RESOURCE, settings.ES = {}, {}, {}, {}
+    profiles = {}
+    for number in range(apps):
+        app = 'app%d' % number
+        key_file = 'stub' if shared_ga_key else app
+        settings.GOOGLE_API[app] = {
+            'API_NAME': 'analytics',
+            'API_VERSION': 'v3',
+            'SCOPES': 'stub',
+            'KEY_FILE_LOCATION': key_file,
+            'PROFILE': app,
+            'CACHE_TTL': math.inf,
+        }
+        profiles.setdefault(key_file, []).append(
+            {'id': app, 'name': app, 'website_url': None, 'property_id': app, 'account_id': 'stub'})
+        settings.CPANEL[app] = {
+            'HOST': whm_host(number),
+            'USERNAME': 'stub',
+            'PASSWORD': 'stub',
+            'USE_SSL': False,
+            'EXTENDED': extended,
+        }
+        settings.STATIC_RESOURCE[app] = {'FREE_EP': url + '/free', 'LOGS_EP': url + '/logs'}
+        settings.ES[app] = {'INDEX': 'hostinguard-' + app, 'DOC_TYPE': 'doc'}
+    settings.ES_SERVICE = url
+    es_writer.reset()
+    # the service and its views are served from the cache, no credentials nor discovery needed
+    for key_file, key_profiles in profiles.items():
+        google_client.Client.prime_cache('analytics', 'v3', 'stub', key_file, google_service, key_profiles)
+
+
+def measure(apps, ticks, memory_ticks, workers, url, extended, shared_ga_key=False) -> dict:
+    configure(apps, url, extended, shared_ga_key)
+    engine = collector.CollectionEngine(max_workers=workers, es_service=url)
+    names = list(settings.ES)
+    # warming sessions, connection pools and caches up
+    engine.run(names)
+
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    for _ in range(ticks):
+        tick_started = time.perf_counter()
+        results = engine.run(names)
+        latencies.append(time.perf_counter() - tick_started)
+        errors += sum(1 for result in results.values() if result['result'] != 'created')
+    elapsed = time.perf_counter() - started
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(memory_ticks):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        engine.run(names)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    return {
+        'apps': apps,
+        'ticks': ticks,
+        'ticks_per_sec': ticks / elapsed,
+        'apps_per_sec': apps * ticks / elapsed,
+        'tick_latency_p50': percentile(latencies, 50),
+        'tick_latency_p99': percentile(latencies, 99),
+        'memory_per_tick_bytes': sum(peaks) // len(peaks) if peaks else None,
+        'errors': errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the collection and persistence of the monitored apps.')
+    parser.add_argument('--apps', type=int, nargs='+', default=[1, 10, 100, 1000], help='numbers of apps')
+    parser.add_argument('--ticks', type=int, default=10, help='timed ticks for every number of apps')
+    parser.add_argument('--memory-ticks', type=int, default=2, help='ticks measuring the memory allocated')
+    parser.add_argument('--workers', type=int, default=getattr(settings, 'COLLECTION', {}).get('MAX_APP_WORKERS', 8),
+                        help='apps collected concurrently')
+    parser.add_argument('--extended', action='store_true', help='collect the extended cPanel data')
+    parser.add_argument('--shared-ga-key', action='store_true',
+                        help='read the GA views of every app with the same key file, at once')
+    parser.add_argument('--whm-latency', type=float, default=20, help='WHM latency (ms)')
+    parser.add_argument('--static-latency', type=float, default=5, help='free and logs endpoints latency (ms)')
+    parser.add_argument('--ga-latency', type=float, default=50, help='Google Analytics latency (ms)')
+    parser.add_argument('--es-latency', type=float, default=10, help='Elasticsearch latency (ms)')
+    parser.add_argument('--log-lines', type=int, default=10, help='status lines of the logs endpoint')
+    parser.add_argument('--output', help='JSON report path, stdout by default')
+    options = parser.parse_args(argv)
+
+    config = stubs.StubConfig(
+        whm_latency=options.whm_latency / 1000,
+        static_latency=options.static_latency / 1000,
+        ga_latency=options.ga_latency / 1000,
+        es_latency=options.es_latency / 1000,
+        log_lines=options.log_lines
+    )
+    # a WHM stand-in listening on every app address, and as many pooled connections
+    _, max_files = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max_files, max_files))
+    backends = stubs.StubBackends(config, [whm_host(number) for number in range(max(options.apps))])
+    backends.start()
+    try:
+        results = [
+            measure(apps, options.ticks, options.memory_ticks, options.workers, backends.url, options.extended,
+                    options.shared_ga_key)
+            for apps in options.apps
+        ]
+    finally:
+        backends.stop()
+
+    report = json.dumps({
+        'python': platform.python_version(),
+        'options': {key: value for key, value in vars(options).items() if key != 'output'},
+        'results': results,
+    }, indent=2)
+    if options.output:
+        with open(options.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
@@ -0,0 +1,198 @@
+"""
+Local stand-ins of the backends a tick talks to, answering with realistic
+payloads after a configurable latency:
+- WHM (json-api loadavg and batch), on the WHM port (2086) of the given loopback addresses
+- the "free -m" and access logs endpoints (/free, /logs)
+- Google Analytics (/ga/realtime, /ga/ga and the /ga/batch of both)
+- Elasticsearch (/_bulk and /<index>/<type> indexing)
+"""
+import json
+import selectors
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+WHM_PORT = 2086
+
+FREE = (
+    '              total        used        free      shared  buff/cache   available\n'
+    'Mem:          31753        2772       14548          74       14432       28411\n'
+    'Swap:         20475           0       20475\n'
+)
+STATUS_CODES = (200, 304, 404, 301, 302, 403, 206, 401, 500, 503)
+GA_RESPONSES = {
+    '/ga/realtime': {'totalsForAllResults': {'rt:activeUsers': '42'}},
+    '/ga/ga': {'totalsForAllResults': {'ga:sessions': '1200', 'ga:users': '900', 'ga:newUsers': '300'}},
+}
+
+
+class StubConfig(object):
+    """
+    Latencies (seconds) of every stand-in and size of the access logs payload.
+    """
+
+    def __init__(self, whm_latency=0.0, static_latency=0.0, ga_latency=0.0, es_latency=0.0, log_lines=10):
+        self.latencies = {'whm': whm_latency, 'static': static_latency, 'ga': ga_latency, 'es': es_latency}
+        self.logs = ''.join(
+            '%d %d\n' % (100000 // (line + 1) ** 2, STATUS_CODES[line % len(STATUS_CODES)] + line // len(STATUS_CODES))
+            for line in range(log_lines)
+        )
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/json-api/loadavg':
+            self.reply('whm', {'one': '0.52', 'five': '0.58', 'fifteen': '0.59'})
+        elif path == '/json-api/batch':
+            self.reply('whm', {'metadata': {'result': 1}, 'data': {'result': [
+                {'metadata': {'result': 1}, 'data': {'one': '0.52', 'five': '0.58', 'fifteen': '0.59'}},
+                {'metadata': {'result': 1}, 'data': {'partition': [
+                    {'mount': '/', 'used': 1000, 'available': 3000, 'percentage': 25}]}},
+                {'metadata': {'result': 1}, 'data': {'acct': [{'totalbytes': 123456}]}},
+                {'metadata': {'result': 1}, 'data': {'service': [{'name': 'mysql', 'running': 1}]}},
+                {'metadata': {'result': 1}, 'data': {'service': [{'name': 'httpd', 'running': 1}]}},
+            ]}})
+        elif path == '/free':
+            self.reply('static', FREE)
+        elif path == '/logs':
+            self.reply('static', self.server.config.logs)
+        elif path in GA_RESPONSES:
+            self.reply('ga', GA_RESPONSES[path])
+        else:
+            self.reply('es', {'name': 'stub', 'version': {'number': '6.8.0'}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if urlparse(self.path).path == '/ga/batch':
+            self.reply('ga', {name: GA_RESPONSES[path] for name, path in json.loads(body)})
+        elif urlparse(self.path).path.endswith('/_bulk'):
+            actions = [json.loads(line) for line in body.splitlines()[::2] if line.strip()]
+            self.reply('es', {'took': 1, 'errors': False, 'items': [
+                {'index': {'_index': action['index']['_index'], '_id': action['index'].get('_id'),
+                           'result': 'created', 'status': 201}}
+                for action in actions
+            ]})
+        else:
+            self.reply('es', {'result': 'created', '_id': 'stub'})
+
+    def do_PUT(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.reply('es', {'acknowledged': True})
+
+    def reply(self, backend, payload):
+        time.sleep(self.server.config.latencies[backend])
+        body = (payload if isinstance(payload, str) else json.dumps(payload)).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain' if isinstance(payload, str) else 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config):
+        super().__init__(address, StubHandler)
+        self.config = config
+
+
+class StubBackends(object):
+    """
+    Runs the stand-ins in a background thread: WHM on WHM_PORT of every one of
+    the `whm_hosts` loopback addresses, the other ones on a random port of
+    127.0.0.1. Nothing listens beyond the loopback interface.
+    """
+
+    def __init__(self, config, whm_hosts=('127.0.0.1',)):
+        self.whm = [StubServer((host, WHM_PORT), config) for host in whm_hosts]
+        self.http = StubServer(('127.0.0.1', 0), config)
+        self.url = 'http://127.0.0.1:%d' % self.http.server_address[1]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for server in self.whm + [self.http]:
+            server.server_close()
+
+    def _serve(self):
+        # serve_forever for many servers at once, every request being handled in its own thread
+        with selectors.DefaultSelector() as selector:
+            for server in self.whm + [self.http]:
+                selector.register(server, selectors.EVENT_READ)
+            while not self._stop.is_set():
+                for key, _ in selector.select(0.5):
+                    key.fileobj._handle_request_noblock()
+
+
+class StubGoogleService(object):
+    """
+    Stands in for the Google Analytics service object, sending its queries to
+    the /ga stand-in.
+    """
+
+    def __init__(self, url, session):
+        self.url = url
+        self.session = session
+
+    def data(self):
+        return self
+
+    def realtime(self):
+        return StubGoogleQuery(self.url + '/ga/realtime', self.session)
+
+    def ga(self):
+        return StubGoogleQuery(self.url + '/ga/ga', self.session)
+
+    def new_batch_http_request(self, callback):
+        return StubGoogleBatch(self.url + '/ga/batch', self.session, callback)
+
+
+class StubGoogleQuery(object):
+
+    def __init__(self, url, session):
+        self.url = url
+        self.session = session
+
+    def get(self, **kwargs):
+        self.params = kwargs
+        return self
+
+    def execute(self, http=None):
+        return self.session.get(self.url, params=self.params, timeout=10).json()
+
+
+class StubGoogleBatch(object):
+    """
+    Sends its queries to the /ga/batch stand-in, answering all of them in a
+    single round trip.
+    """
+
+    def __init__(self, url, session, callback):
+        self.url = url
+        self.session = session
+        self.callback = callback
+        self.queries = []
+
+    def add(self, query, request_id):
+        self.queries.append((request_id, urlparse(query.url).path))
+
+    def execute(self, http=None):
+        responses = self.session.post(self.url, json=self.queries, timeout=10).json()
+        for request_id, _ in self.queries:
+            self.callback(request_id, responses[request_id], None)
@@ -0,0 +1,12 @@
+import functools
+import importlib
+import os
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings():
+    """
+    Returns the settings module named by DJANGO_SETTINGS_MODULE, resolved once
+    per process.
+    """
+    return importlib.import_module(os.environ['DJANGO_SETTINGS_MODULE'])
@@ -62,6 +62,8 @@ ALLOWED_HOSTS = [
 
 INSTALLED_APPS = (
     'api.v1.health',
+    'api.v1.metrics',
+    'api.v1.timeseries',
     'api.v1.hostinguard',
     'django.contrib.admin',
     'django.contrib.auth',
@@ -102,6 +104,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'wsgi.application'
+ASGI_APPLICATION = 'asgi.application'
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': (
@@ -167,7 +170,20 @@ GOOGLE_API = {
         'API_VERSION': 'fake_api_version',
         'SERVICE_ACCOUNT_EMAIL': 'fake@account.email',
         'KEY_FILE_LOCATION': os.getcwd() + 'fake_file',
-        'SCOPES': 'fake_scopes'
+        'SCOPES': 'fake_scopes',
+        # view (profile) to monitor: its id, the URL of its website or None for the
+        # first view readable with KEY_FILE_LOCATION. The views of the apps sharing a
+        # key file are queried at once, BATCH_SIZE queries per batched request and
+        # MAX_CONCURRENCY requests at a time (GA allows 10 queries per batch).
+        'PROFILE': None,
+        'BATCH_SIZE': 10,
+        'MAX_CONCURRENCY': 2,
+        # seconds the built service and the discovered views are reused for (an
+        # unknown PROFILE triggers their discovery earlier, every 5 minutes at most)
+        'CACHE_TTL': 3600,
+        # seconds today's sessions/users/new users totals are reused for (GA refreshes
+        # them far less often than the realtime users, queried on every tick)
+        'TOTALS_TTL': 900
     },
 }
 
@@ -178,7 +194,13 @@ CPANEL = {
         'HOST': 'fake_host',
         'USERNAME': 'fake_username',
         'PASSWORD': 'fake_password',
-        'USE_SSL': False
+        'USE_SSL': False,
+        # connections kept alive towards the host, request timeout (s) and retries of a failed call
+        'POOL_SIZE': 10,
+        'TIMEOUT': 10,
+        'MAX_RETRIES': 3,
+        # also fetch disk, bandwidth, MySQL and Apache status (single WHM batch request)
+        'EXTENDED': False
     },
 }
 
@@ -187,7 +209,20 @@ CPANEL = {
 STATIC_RESOURCE = {
     APP1: {
         'FREE_EP': 'fake_ep',
-        'LOGS_EP': 'fake_ep'
+        'LOGS_EP': 'fake_ep',
+        # read LOGS_EP line by line, it can then serve the raw access log of the day
+        'STREAM_LOGS': False,
+        # path or URL (Range requests needed) of the raw access log: when set, the lines
+        # appended since the previous tick are added as logs_delta and logs_minutes fields
+        'INCREMENTAL_LOGS': None,
+        # position of the response time ("%D") among the fields following the request
+        # line of INCREMENTAL_LOGS, quoted ones counting as one (e.g. 4, or -1 when last):
+        # when set, its percentiles are added as response_time_* fields
+        'RESPONSE_TIME_FIELD': None,
+        # "http" reads the memory data from FREE_EP, "proc" samples the local host
+        # through PROC_ROOT (CPU utilisation, disk and network rates included)
+        'BACKEND': 'http',
+        'PROC_ROOT': '/proc'
     },
 }
 
@@ -198,6 +233,140 @@ ES_SERVICE = 'fake_service'
 ES = {
     APP1: {
         'INDEX': 'fake_index',
-        'DOC_TYPE': 'fake_doc_type'
+        'DOC_TYPE': 'fake_doc_type',
+        # None writes to INDEX forever, "daily" or "monthly" to INDEX-2026.10.18 or
+        # INDEX-2026.10 partitions (mapped through an index template), dropped by
+        # "manage.py hostinguard_retention" once older than RETENTION_DAYS
+        'PARTITION': None,
+        'RETENTION_DAYS': None
     },
 }
+
+# samples pushed by the agents (python -m agent) to the hostinguard-ingest endpoint
+# are accepted only along with TOKEN (X-HostinGuard-Token header): the endpoint
+# refuses every sample until it is set
+INGEST = {
+    'TOKEN': None,
+}
+
+# when ENABLED, collected documents are queued (up to MAX_SIZE) and written by WORKERS
+# background threads, BATCH_SIZE documents per bulk request. POLICY applies to the
+# documents submitted while the queue is full: "block" (up to PUT_TIMEOUT seconds),
+# "drop_newest", "drop_oldest" or "spill" to SPILL_PATH, where the documents
+# rejected by ES go as well. With SPOOL enabled too, the spool takes the place of
+# SPILL_PATH and POLICY is "spill": no document is dropped.
+PIPELINE = {
+    'ENABLED': False,
+    'MAX_SIZE': 10000,
+    'WORKERS': 1,
+    'BATCH_SIZE': 500,
+    'POLICY': 'drop_oldest',
+    'PUT_TIMEOUT': 1,
+    'SPILL_PATH': None,
+}
+
+# when ENABLED, documents are first appended to a write-ahead spool in DIRECTORY
+# (segments of SEGMENT_SIZE bytes, the oldest dropped beyond MAX_BYTES) and replayed
+# to ES by a background thread, BATCH_SIZE documents per bulk request, so that an ES
+# outage loses no data. With PIPELINE enabled too, it only receives the documents
+# overflowing the pipeline queue or rejected by ES.
+# Every process spools into its own subdirectory of DIRECTORY, and replays the ones
+# of stopped processes too, see spool.open_spool.
+SPOOL = {
+    'ENABLED': False,
+    'DIRECTORY': os.path.join(BASE_DIR, 'spool'),
+    'SEGMENT_SIZE': 16 * 1024 * 1024,
+    'MAX_BYTES': 1024 * 1024 * 1024,
+    'BATCH_SIZE': 500,
+    'FSYNC': True,
+}
+
+# when ENABLED, the min/max/avg/sum/count of every metric (along with the last logs_data
+# histogram and the summed logs_delta one) are kept at every resolution, each one written
+# to <INDEX>-<NAME>-<date> indices, partitioned daily or monthly, as soon as one of its
+# buckets is over, and dropped by "manage.py hostinguard_retention" once older than
+# RETENTION_DAYS
+ROLLUP = {
+    'ENABLED': False,
+    'RESOLUTIONS': [
+        {'NAME': '1m', 'SECONDS': 60, 'PARTITION': 'daily', 'RETENTION_DAYS': 7},
+        {'NAME': '5m', 'SECONDS': 300, 'PARTITION': 'daily', 'RETENTION_DAYS': 31},
+        {'NAME': '1h', 'SECONDS': 3600, 'PARTITION': 'monthly', 'RETENTION_DAYS': 366},
+        {'NAME': '1d', 'SECONDS': 86400, 'PARTITION': 'monthly', 'RETENTION_DAYS': None},
+    ],
+}
+
+# when ENABLED, documents are buffered and indexed through the _bulk API (from a background
+# thread) as soon as MAX_DOCS documents are waiting or FLUSH_INTERVAL seconds passed since
+# the last flush, the update request of APP1 being answered once its document is flushed
+ES_BULK = {
+    'ENABLED': False,
+    'MAX_DOCS': 500,
+    'FLUSH_INTERVAL': 5,
+}
+
+# when ENABLED, the outbound calls of every backend are held back by token buckets
+# letting RATE calls per second through (up to BURST at once), shared by all the
+# apps, and by one more bucket per credential (CREDENTIAL_RATE and CREDENTIAL_BURST):
+# the GA key file, the WHM user and host or the static endpoints host. Calls beyond
+# the rate wait for their turn instead of failing, a GA batch counting as many calls
+# as its queries (GA allows 10 queries per second per user), unless their turn would
+# come after MAX_WAIT seconds or after the deadline of their retry policy: they fail
+# straight away then.
+RATE_LIMIT = {
+    'ENABLED': False,
+    'MAX_WAIT': 30,
+    'BACKENDS': {
+        'google': {'RATE': 50, 'BURST': 50, 'CREDENTIAL_RATE': 10, 'CREDENTIAL_BURST': 10},
+        'cpanel': {'RATE': 100, 'BURST': 100, 'CREDENTIAL_RATE': 5, 'CREDENTIAL_BURST': 10},
+        'static': {'RATE': 200, 'BURST': 200, 'CREDENTIAL_RATE': 20, 'CREDENTIAL_BURST': 40},
+    },
+}
+
+# Collection settings
+#####################
+# when CONCURRENT, the sources of a tick are fetched in parallel and every source
+# missing its deadline (seconds) is reported in the "partial_sources" field.
+# MAX_WORKERS threads fetch the sources of all the apps collected at the same time,
+# late sources included, and MAX_APP_WORKERS bounds the apps collected at the same
+# time by a collection pass over all the apps defined in the ES settings.
+COLLECTION = {
+    'MAX_APP_WORKERS': 8,
+    'CONCURRENT': True,
+    'MAX_WORKERS': 16,
+    'SOURCE_TIMEOUT': 30,
+    'SOURCE_TIMEOUTS': {},
+}
+
+# samples kept in memory for every metric of every app, served by the timeseries EPs
+# (e.g. 6 hours of one minute ticks). The memory is the one of each process: the EPs
+# only serve what their own process collected or ingested, nothing while
+# "manage.py hostinguard_collect" collects in another one
+TIMESERIES = {
+    'CAPACITY': 360,
+}
+
+# rules evaluated against every collected document, either static thresholds
+# ("OP" and "VALUE") or anomalies ("TYPE": "anomaly", z-score over an EWMA).
+# Alerts are sent to every sink when a rule starts firing, every COOLDOWN seconds
+# while it keeps firing and when it is resolved.
+ALERTING = {
+    'COOLDOWN': 900,
+    'RULES': [
+        {'NAME': 'high_load', 'METRIC': 'cpu_5', 'OP': '>', 'VALUE': 4},
+        {'NAME': 'swapping', 'METRIC': 'used_swap', 'OP': '>', 'VALUE': 1024},
+        {'NAME': 'low_memory', 'METRIC': 'available', 'TYPE': 'anomaly', 'THRESHOLD': 3, 'ALPHA': 0.1,
+         'WARMUP': 30},
+        {'NAME': 'server_errors', 'METRIC': 'logs_5xx_ratio', 'OP': '>', 'VALUE': 0.05},
+    ],
+    'SINKS': [
+        {'CLASS': 'api.v1.hostinguard.alerting.LogSink'},
+    ],
+}
+
+# "manage.py hostinguard_collect" defaults: seconds between two collection passes
+# and max random delay before each of them
+SCHEDULER = {
+    'INTERVAL': 60,
+    'JITTER': 0,
+}
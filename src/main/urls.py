@@ -2,5 +2,8 @@ from django.conf.urls import include, url
 
 urlpatterns = [
     url(r'', include('api.v1.health.urls')),
+    url(r'', include('api.v1.metrics.urls')),
+    url(r'', include('api.v1.timeseries.urls')),
+    url(r'', include('api.v1.hostinguard.urls')),
     url(r'', include('api.v1.hostinguard.app1.urls')),
 ]
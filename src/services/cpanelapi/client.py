@@ -13,34 +13,125 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import requests
-from requests.auth import AuthBase
+import asyncio
+import threading
+from urllib.parse import urlencode
 
 from services.cpanelapi import exceptions
 
+DEFAULT_TIMEOUT = 10
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
 
-class AccessHashAuth(AuthBase):
+# keep-alive sessions shared by every client talking to the same host
+_sessions = {}
+_sessions_lock = threading.Lock()
+# and their async counterparts, by event loop: their connections are bound to
+# it. They go with the task closing them once the loop shuts down.
+_async_sessions = {}
+
+
+def get_session(base_url, pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES, response_hooks=()):
+    """
+    Returns the pooled session used for every request sent to `base_url`,
+    creating it on first use, along with its `response_hooks` (requests
+    response hooks, e.g. collecting metrics).
+    """
+    # requests is only imported once a host is called, not to slow down the
+    # start of the processes not calling any
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            retry = Retry(total=max_retries, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount(base_url, adapter)
+            session.hooks['response'].extend(response_hooks)
+            _sessions[base_url] = session
+        return session
+
+
+def get_async_session(base_url, pool_size=DEFAULT_POOL_SIZE, response_hooks=()):
+    """
+    Returns the pooled httpx.AsyncClient used by the coroutines of the running
+    event loop for every request sent to `base_url`, creating it on first use,
+    along with its `response_hooks` (called as get_session ones, once the body
+    is read). Failed requests are not retried by the client itself.
+    """
+    import httpx
+
+    async def call_hooks(response):
+        await response.aread()
+        for hook in response_hooks:
+            hook(response)
+
+    loop = asyncio.get_running_loop()
+    with _sessions_lock:
+        if loop not in _async_sessions:
+            sessions = {}
+            _async_sessions[loop] = (sessions, loop.create_task(close_async_sessions(loop, sessions)))
+        sessions = _async_sessions[loop][0]
+        session = sessions.get(base_url)
+        if session is None:
+            session = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=pool_size),
+                event_hooks={'response': [call_hooks] if response_hooks else []}
+            )
+            sessions[base_url] = session
+        return session
+
+
+async def close_async_sessions(loop, sessions):
+    """
+    Closes the async `sessions` of `loop` once it shuts down, cancelling its
+    pending tasks as asyncio.run (and so async_to_sync) does.
+    """
+    try:
+        await loop.create_future()
+    finally:
+        with _sessions_lock:
+            _async_sessions.pop(loop, None)
+        for session in sessions.values():
+            await session.aclose()
+
+
+class AccessHashAuth(object):
     """ Access hash authentication for requests """
 
     def __init__(self, username, access_hash):
         self.access_hash = access_hash.replace('\n', '')
         self.username = username
 
+    @property
+    def header(self):
+        return 'WHM %s:%s' % (self.username, self.access_hash)
+
     def __call__(self, r):
-        r.headers['Authorization'] = 'WHM %s:%s' % (self.username, self.access_hash)
+        r.headers['Authorization'] = self.header
         return r
 
 
 class Client(object):
 
     def __init__(self, username, host, password=None, access_hash=None,
-                 ssl=True, cpanel=False):
+                 ssl=True, cpanel=False, timeout=DEFAULT_TIMEOUT,
+                 pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES,
+                 response_hooks=()):
         """
         Constructs a new instance of the whmclient.Client class.  It can only
         accept a `password` or `access_hash`, but not both.
 
         The `cpanel` flag will send requests to cPanel ports instead of WHM.
         If that option is used, access_hash authentication is not supported.
+
+        Requests go through a keep-alive session shared by all the clients of
+        the same host, holding up to `pool_size` connections and retrying
+        failed connections up to `max_retries` times. The `response_hooks`
+        are installed when the session is created, see get_session.
         """
         self.username = username
         self.host = host
@@ -59,19 +150,23 @@ class Client(object):
         if ssl:
             self.port = 2083 if cpanel else 2087
 
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.response_hooks = response_hooks
+        self.base_url = '%s://%s:%d' % (self.protocol, self.host, self.port)
+        self.session = get_session(
+            self.base_url,
+            pool_size=pool_size,
+            max_retries=max_retries,
+            response_hooks=response_hooks
+        )
+
     def call(self, command, **kwargs):
         """
         Calls the `command` WHM API function with keyword arguments as
         parameters.
         """
-        url = self._build_url(command)
-
-        if kwargs:
-            r = requests.get(url, params=kwargs, auth=self.auth)
-        else:
-            r = requests.get(url, auth=self.auth)
-
-        return r.json()
+        return self._request(command, kwargs)
 
     def call_v1(self, command, **kwargs):
         """
@@ -81,6 +176,42 @@ class Client(object):
         kwargs['api.version'] = 1
         return self.call(command, **kwargs)
 
+    async def call_async(self, command, **kwargs):
+        """
+        Same as call(), through the async session of the running event loop.
+        """
+        return await self._request_async(command, kwargs)
+
+    def batch(self, *commands):
+        """
+        Calls several WHM API1 functions in a single request through the
+        `batch` function.  Every command is a (`function`, `params`) tuple and
+        the per-command responses are returned in the same order.
+        """
+        # `command` is both the repeated batch parameter and call()'s first argument
+        return self._batch_result(self._request('batch', self._batch_params(commands)))
+
+    async def batch_async(self, *commands):
+        """
+        Same as batch(), through the async session of the running event loop.
+        """
+        return self._batch_result(await self._request_async('batch', self._batch_params(commands)))
+
+    @staticmethod
+    def _batch_params(commands):
+        encoded_commands = [
+            '%s?%s' % (function, urlencode(params)) if params else function
+            for function, params in commands
+        ]
+        return {'command': encoded_commands, 'api.version': 1}
+
+    @staticmethod
+    def _batch_result(r):
+        metadata = r.get('metadata', {})
+        if not metadata.get('result'):
+            raise exceptions.CallFailed(metadata.get('reason', 'Batch call failed.'))
+        return r['data']['result']
+
     def api1(self, module, function, *args, **kwargs):
         """
         Calls the `module`::`function` API1 function under the `user` cPanel
@@ -132,6 +263,26 @@ class Client(object):
             raise exceptions.InvalidParameters('Function parameter required.')
         return self.call('cpanel', **kwargs)
 
+    def _request(self, command, params):
+        url = self._build_url(command)
+
+        if params:
+            r = self.session.get(url, params=params, auth=self.auth, timeout=self.timeout)
+        else:
+            r = self.session.get(url, auth=self.auth, timeout=self.timeout)
+
+        return r.json()
+
+    async def _request_async(self, command, params):
+        session = get_async_session(self.base_url, pool_size=self.pool_size, response_hooks=self.response_hooks)
+        if isinstance(self.auth, AccessHashAuth):
+            auth, headers = None, {'Authorization': self.auth.header}
+        else:
+            auth, headers = self.auth, None
+        r = await session.get(self._build_url(command), params=params or None, auth=auth, headers=headers,
+                              timeout=self.timeout)
+        return r.json()
+
     def _build_url(self, call_name):
         return '%s://%s:%d/json-api/%s' % (self.protocol, self.host, self.port,
                                            call_name)
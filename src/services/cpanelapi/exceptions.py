@@ -32,3 +32,7 @@ class InvalidCredentials(ClientException):
 
 class InvalidParameters(ClientException):
     pass
+
+
+class CallFailed(ClientException):
+    pass
@@ -1,13 +1,64 @@
 import logging
+import math
+import socket
+import threading
+import time
 
-from googleapiclient.discovery import build
-from oauth2client.service_account import ServiceAccountCredentials
+# the Google API client stack is only imported once used, it weighs on the
+# start of every process otherwise
 
 logger = logging.getLogger(__name__)
 
+# account summaries listed per management API call
+PROFILES_PAGE_SIZE = 1000
+
+
+def is_auth_error(error):
+    """
+    Tells whether `error` was caused by expired or revoked credentials.
+    """
+    from googleapiclient.errors import HttpError
+    from oauth2client.client import AccessTokenRefreshError
+
+    if isinstance(error, AccessTokenRefreshError):
+        return True
+    return isinstance(error, HttpError) and error.resp.status == 401
+
+
+def is_transient_error(error):
+    """
+    Tells whether a query failing with `error` is worth retrying: rate limits,
+    server errors and network failures.
+    """
+    from googleapiclient.errors import HttpError
+
+    if isinstance(error, HttpError):
+        return error.resp.status in (429, 500, 502, 503, 504)
+    return isinstance(error, (ConnectionError, socket.timeout))
+
 
 class Client(object):
 
+    # seconds between two discoveries of the views while none is readable
+    EMPTY_PROFILES_RETRY_INTERVAL = 300
+
+    # process-wide cache of the built services and the views (profiles) readable
+    # through them, (api_name, api_version, scopes, key_file_location) ->
+    # (expiry, service, profiles, time of their discovery)
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    # credentials by the same key, read once the cached service is queried, and
+    # the HTTP objects authorized with them of the current thread: the service
+    # one must not be shared between threads (httplib2 is not thread-safe)
+    _credentials = {}
+    _local = threading.local()
+
+    def get_credentials(self, scopes, key_file_location):
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        return ServiceAccountCredentials.from_json_keyfile_name(key_file_location, scopes=scopes)
+
     def get_service(self, api_name, api_version, scopes, key_file_location):
         """
         Get a service that communicates to a Google API.
@@ -22,7 +73,9 @@ class Client(object):
             A service that is connected to the specified API.
         """
 
-        credentials = ServiceAccountCredentials.from_json_keyfile_name(key_file_location, scopes=scopes)
+        from googleapiclient.discovery import build
+
+        credentials = self.get_credentials(scopes, key_file_location)
 
         # Build the service object.
         service = build(api_name, api_version, credentials=credentials)
@@ -30,32 +83,210 @@ class Client(object):
         logger.info('service for Google API created.')
         return service
 
-    @staticmethod
-    def get_first_profile_id(service):
+    def get_cached_service(self, api_name, api_version, scopes, key_file_location, ttl):
         """
-        Use the Analytics service object to get the first profile id.
+        Get a service and the views readable through it, reusing the ones built
+        and discovered by previous calls with the same arguments for `ttl` seconds.
+
+        Returns:
+            A (service, profiles) tuple, see get_profiles.
+        """
+        key = self._cache_key(api_name, api_version, scopes, key_file_location)
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            cached = entry is not None and entry[0] > now
+            rediscover = cached and not entry[2] and now - entry[3] >= self.EMPTY_PROFILES_RETRY_INTERVAL
+            if rediscover:
+                # claimed by this call, the concurrent ones keep the empty views meanwhile
+                self._cache[key] = entry[:3] + (now,)
+        if cached:
+            if not rediscover:
+                return entry[1], entry[2]
+            # no view was readable at the last discovery, e.g. it failed: not kept for the
+            # whole ttl, but discovered again every EMPTY_PROFILES_RETRY_INTERVAL
+            return entry[1], self.refresh_profiles(api_name, api_version, scopes, key_file_location)
+
+        service = self.get_service(
+            api_name=api_name,
+            api_version=api_version,
+            scopes=scopes,
+            key_file_location=key_file_location
+        )
+        profiles = self.get_profiles(service)
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + ttl, service, profiles, time.monotonic())
+        return service, profiles
+
+    @classmethod
+    def prime_cache(cls, api_name, api_version, scopes, key_file_location, service, profiles, ttl=math.inf,
+                    credentials=None):
+        """
+        Caches `service` (e.g. a stand-in one) and its `profiles` as if built and
+        discovered by get_cached_service, along with the `credentials` of the
+        per thread HTTP objects (None: the service ones are used).
         """
+        key = cls._cache_key(api_name, api_version, scopes, key_file_location)
+        with cls._cache_lock:
+            cls._cache[key] = (time.monotonic() + ttl, service, profiles, time.monotonic())
+            cls._credentials[key] = credentials
 
-        # Get a list of all Google Analytics accounts for this user
-        accounts = service.management().accounts().list().execute()
+    def refresh_profiles(self, api_name, api_version, scopes, key_file_location):
+        """
+        Discover again the views readable through the cached service, e.g. after
+        a site was added, keeping the service and its expiry.
 
-        if accounts.get('items'):
-            # Get the first Google Analytics account.
-            account = accounts.get('items')[0].get('id')
+        Returns:
+            The refreshed profiles, see get_profiles.
+        """
+        key = self._cache_key(api_name, api_version, scopes, key_file_location)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry is None:
+            raise LookupError('no cached service for ' + str(key_file_location))
 
-            # Get a list of all the properties for the first account.
-            properties = service.management().webproperties().list(
-                accountId=account).execute()
+        # the cached service is shared between threads, its HTTP object is not
+        http = self.get_thread_http(api_name, api_version, scopes, key_file_location)
+        profiles = self.get_profiles(entry[1], http=http)
+        known = {profile['id'] for profile in entry[2]}
+        added = [profile['id'] for profile in profiles if profile['id'] not in known]
+        removed = known.difference(profile['id'] for profile in profiles)
+        if added or removed:
+            logger.info('Google API views added: ' + str(added) + ', removed: ' + str(sorted(removed)))
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache[key] = self._cache[key][:2] + (profiles, time.monotonic())
+        return profiles
 
-            if properties.get('items'):
-                # Get the first property id.
-                property = properties.get('items')[0].get('id')
+    def get_thread_http(self, api_name, api_version, scopes, key_file_location):
+        """
+        Get an HTTP object authorized with the credentials of the cached service
+        and owned by the current thread, for every query sent through the service.
+
+        Returns:
+            The HTTP object, None when the service needs no credentials.
+        """
+        key = self._cache_key(api_name, api_version, scopes, key_file_location)
+        with self._cache_lock:
+            if key not in self._credentials:
+                self._credentials[key] = self.get_credentials(scopes, key_file_location)
+            credentials = self._credentials[key]
+        if credentials is None:
+            return None
 
-                # Get a list of all views (profiles) for the first property.
-                profiles = service.management().profiles().list(
-                    accountId=account,
-                    webPropertyId=property).execute()
+        import httplib2
 
-                if profiles.get('items'):
-                    # return the first view (profile) id.
-                    return profiles.get('items')[0].get('id')
+        # (credentials, HTTP object) by key, renewed along with the credentials
+        https = getattr(self._local, 'https', None)
+        if https is None:
+            https = self._local.https = {}
+        entry = https.get(key)
+        if entry is None or entry[0] is not credentials:
+            entry = https[key] = (credentials, credentials.authorize(httplib2.Http()))
+        return entry[1]
+
+    def invalidate(self, api_name, api_version, scopes, key_file_location):
+        """
+        Drop the cached service, e.g. after an authentication error.
+        """
+        key = self._cache_key(api_name, api_version, scopes, key_file_location)
+        with self._cache_lock:
+            self._cache.pop(key, None)
+            self._credentials.pop(key, None)
+        logger.info('cached service for Google API invalidated.')
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+            cls._credentials.clear()
+
+    @staticmethod
+    def _cache_key(api_name, api_version, scopes, key_file_location):
+        if not isinstance(scopes, str):
+            scopes = tuple(scopes)
+        return api_name, api_version, scopes, key_file_location
+
+    @staticmethod
+    def execute_batch(service, queries, http=None, raise_on_error=True):
+        """
+        Executes the (name, query) `queries` through a single batched HTTP
+        request, a lone query being executed straight away.
+
+        Args:
+            http: The HTTP object to send the request through, the service one by default.
+            raise_on_error: When False, the errors of the failed queries are returned
+                in place of their responses.
+
+        Returns:
+            The query responses by name.
+
+        Raises:
+            The error of the first failed query, once all of them are over.
+        """
+        responses = {}
+        errors = []
+        if len(queries) == 1:
+            name, query = queries[0]
+            try:
+                return {name: query.execute(http=http)}
+            except Exception as e:
+                if raise_on_error:
+                    raise
+                return {name: e}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+                responses[request_id] = exception
+            else:
+                responses[request_id] = response
+
+        batch = service.new_batch_http_request(callback=callback)
+        for name, query in queries:
+            batch.add(query, request_id=name)
+        batch.execute(http=http)
+        if errors and raise_on_error:
+            raise errors[0]
+        return responses
+
+    @staticmethod
+    def get_profiles(service, http=None):
+        """
+        Use the Analytics service object to list every view (profile) of every
+        property of every account readable through it, in a single paginated
+        walk of the account summaries, sent through `http` (the service HTTP
+        object by default).
+
+        Returns:
+            A list of {'id', 'name', 'website_url', 'property_id', 'account_id'} dicts.
+        """
+        profiles = []
+        start_index = 1
+        while True:
+            summaries = service.management().accountSummaries().list(
+                start_index=start_index,
+                max_results=PROFILES_PAGE_SIZE).execute(http=http)
+            items = summaries.get('items', [])
+            for account in items:
+                for web_property in account.get('webProperties', []):
+                    for profile in web_property.get('profiles', []):
+                        profiles.append({
+                            'id': profile.get('id'),
+                            'name': profile.get('name'),
+                            'website_url': web_property.get('websiteUrl'),
+                            'property_id': web_property.get('id'),
+                            'account_id': account.get('id')
+                        })
+            start_index += len(items)
+            if not items or start_index > summaries.get('totalResults', 0):
+                return profiles
+
+    @classmethod
+    def get_first_profile_id(cls, service):
+        """
+        Use the Analytics service object to get the first profile id.
+        """
+        profiles = cls.get_profiles(service)
+        if profiles:
+            return profiles[0]['id']
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+
+DEFAULT_ROOT = '/proc'
+DEFAULT_SYS_ROOT = '/sys'
+READ_SIZE = 64 * 1024
+# /proc/diskstats counts 512 bytes sectors, whatever the device
+SECTOR_SIZE = 512
+# virtual block devices, not worth reporting I/O for
+IGNORED_DEVICES = ('loop', 'ram', 'zram')
+
+
+class Client(object):
+    """
+    Reads the host measurements straight from procfs: /proc/meminfo,
+    /proc/loadavg, /proc/stat, /proc/diskstats and /proc/net/dev.
+    Files are opened once and read again with os.pread from offset 0, which
+    makes the kernel render them anew, so sampling every second is cheap.
+    CPU utilisation and I/O rates are computed out of the counters of the
+    previous sample.
+    """
+    FILES = ('meminfo', 'loadavg', 'stat', 'diskstats', 'net/dev')
+
+    def __init__(self, root=DEFAULT_ROOT, sys_root=DEFAULT_SYS_ROOT):
+        self.root = root
+        self.sys_root = sys_root
+        self._fds = {}
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def read(self, name) -> str:
+        fd = self._fds.get(name)
+        if fd is None:
+            fd = self._fds[name] = os.open(os.path.join(self.root, name), os.O_RDONLY)
+        chunks = []
+        offset = 0
+        while True:
+            chunk = os.pread(fd, READ_SIZE, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b''.join(chunks).decode('ascii', 'replace')
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds = {}
+
+    def meminfo(self) -> dict:
+        """
+        Returns the /proc/meminfo fields, in kB.
+        """
+        fields = {}
+        for line in self.read('meminfo').splitlines():
+            name, _, value = line.partition(':')
+            if value:
+                fields[name] = int(value.split()[0])
+        return fields
+
+    def loadavg(self) -> tuple:
+        return tuple(float(value) for value in self.read('loadavg').split()[:3])
+
+    def cpu_times(self) -> tuple:
+        """
+        Returns the (busy, total) jiffies of all the CPUs since boot.
+        """
+        for line in self.read('stat').splitlines():
+            if line.startswith('cpu '):
+                times = [int(value) for value in line.split()[1:]]
+                # guest times are already part of user and nice
+                total = sum(times[:8])
+                idle = times[3] + (times[4] if len(times) > 4 else 0)
+                return total - idle, total
+        return 0, 0
+
+    def disk_bytes(self) -> tuple:
+        """
+        Returns the (read, written) bytes of the block devices since boot.
+        """
+        read = written = 0
+        # whole disks only, partitions are accounted by their disk already
+        try:
+            disks = set(os.listdir(os.path.join(self.sys_root, 'block')))
+        except OSError:
+            disks = None
+        for line in self.read('diskstats').splitlines():
+            fields = line.split()
+            if len(fields) < 10 or fields[2].startswith(IGNORED_DEVICES):
+                continue
+            if disks is not None and fields[2].replace('/', '!') not in disks:
+                continue
+            read += int(fields[5]) * SECTOR_SIZE
+            written += int(fields[9]) * SECTOR_SIZE
+        return read, written
+
+    def net_bytes(self) -> tuple:
+        """
+        Returns the (received, transmitted) bytes of the network interfaces
+        but the loopback one, since boot.
+        """
+        received = transmitted = 0
+        # the first two lines are headers
+        for line in self.read('net/dev').splitlines()[2:]:
+            interface, _, counters = line.partition(':')
+            fields = counters.split()
+            if interface.strip() == 'lo' or len(fields) < 9:
+                continue
+            received += int(fields[0])
+            transmitted += int(fields[8])
+        return received, transmitted
+
+    def sample(self) -> dict:
+        """
+        Returns the current measurements, rates being None on the first sample.
+        """
+        with self._lock:
+            meminfo = self.meminfo()
+            load = self.loadavg()
+            counters = {
+                'time': time.monotonic(),
+                'cpu': self.cpu_times(),
+                'disk': self.disk_bytes(),
+                'net': self.net_bytes(),
+            }
+            previous, self._previous = self._previous, counters
+
+        data = {'meminfo': meminfo, 'loadavg': load, 'cpu_usage': None, 'disk_rates': None, 'net_rates': None}
+        if previous is None:
+            return data
+        elapsed = counters['time'] - previous['time']
+        busy, total = (now - before for now, before in zip(counters['cpu'], previous['cpu']))
+        data['cpu_usage'] = 100.0 * busy / total if total > 0 else 0.0
+        if elapsed > 0:
+            data['disk_rates'] = tuple(
+                max(0, now - before) / elapsed for now, before in zip(counters['disk'], previous['disk']))
+            data['net_rates'] = tuple(
+                max(0, now - before) / elapsed for now, before in zip(counters['net'], previous['net']))
+        return data
+
+    def measure(self) -> dict:
+        """
+        Returns a sample in the HostinGuard document schema: the "free -m"
+        fields in MB (total_mem, used_mem, ..., free_swap), the load averages
+        (proc_load_1/5/15, not to clash with the cpu_1/5/15 of WHM when both
+        sources are enabled), then cpu_usage_pct and the disk and network rates in
+        bytes per second, once there is a previous sample.
+        """
+        sample = self.sample()
+        meminfo = {name: value // 1024 for name, value in sample['meminfo'].items()}
+        buffers_cache = meminfo.get('Buffers', 0) + meminfo.get('Cached', 0) + meminfo.get('SReclaimable', 0)
+
+        data = {
+            'total_mem': meminfo['MemTotal'],
+            'used_mem': meminfo['MemTotal'] - meminfo['MemFree'] - buffers_cache,
+            'free_mem': meminfo['MemFree'],
+            'shared': meminfo.get('Shmem', 0),
+            'buffers_cache': buffers_cache,
+            'available': meminfo.get('MemAvailable', meminfo['MemFree']),
+            'total_swap': meminfo.get('SwapTotal', 0),
+            'used_swap': meminfo.get('SwapTotal', 0) - meminfo.get('SwapFree', 0),
+            'free_swap': meminfo.get('SwapFree', 0),
+        }
+        data['proc_load_1'], data['proc_load_5'], data['proc_load_15'] = sample['loadavg']
+        if sample['cpu_usage'] is not None:
+            data['cpu_usage_pct'] = sample['cpu_usage']
+        if sample['disk_rates'] is not None:
+            data['disk_read_bytes_per_sec'], data['disk_write_bytes_per_sec'] = sample['disk_rates']
+        if sample['net_rates'] is not None:
+            data['net_rx_bytes_per_sec'], data['net_tx_bytes_per_sec'] = sample['net_rates']
+        return data
+
+
+# clients by procfs root, they must survive between ticks to compute rates
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(root=DEFAULT_ROOT) -> Client:
+    with _clients_lock:
+        if root not in _clients:
+            _clients[root] = Client(root)
+        return _clients[root]
+
+
+def reset():
+    """
+    Closes and drops every client, along with their previous samples.
+    """
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
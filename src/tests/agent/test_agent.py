@@ -0,0 +1,57 @@
+import urllib.error
+import urllib.request
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from agent import protocol
+from agent.agent import Agent
+
+
+class TestAgent(TestCase):
+
+    def build_agent(self):
+        agent = Agent(url='http://fake_host/hostinguard-ingest', app='app1', interval=1, batch_size=2, token='secret')
+        flexmock(agent.client).should_receive('measure').and_return({'cpu_1': 0.5})
+        return agent
+
+    def test_push(self):
+        pushed = []
+
+        def stubbed_urlopen(request, timeout):
+            pushed.append(request)
+            return flexmock(__enter__=lambda: None, __exit__=lambda *args: None)
+
+        flexmock(urllib.request).should_receive('urlopen').replace_with(stubbed_urlopen)
+        agent = self.build_agent()
+        agent.sample()
+        agent.sample()
+        self.assertTrue(agent.push())
+        self.assertEqual(len(agent.pending), 0)
+        self.assertEqual(pushed[0].get_header('X-hostinguard-token'), 'secret')
+        self.assertEqual([data for _, _, data in protocol.decode(pushed[0].data)], [{'cpu_1': 0.5}] * 2)
+
+    def test_push_failed_keeps_samples(self):
+        flexmock(urllib.request).should_receive('urlopen').and_raise(OSError('connection refused'))
+        agent = self.build_agent()
+        agent.sample()
+        self.assertFalse(agent.push())
+        self.assertEqual(len(agent.pending), 1)
+
+    def test_push_retried_on_transient_errors(self):
+        agent = self.build_agent()
+        agent.sample()
+        for code in (429, 503):
+            flexmock(urllib.request).should_receive('urlopen').and_raise(
+                urllib.error.HTTPError(agent.url, code, 'unavailable', {}, None))
+            self.assertFalse(agent.push())
+            self.assertEqual(len(agent.pending), 1)
+
+    def test_push_rejected_drops_samples(self):
+        agent = self.build_agent()
+        for code in (400, 403):
+            agent.sample()
+            flexmock(urllib.request).should_receive('urlopen').and_raise(
+                urllib.error.HTTPError(agent.url, code, 'rejected', {}, None))
+            self.assertFalse(agent.push())
+            self.assertEqual(len(agent.pending), 0)
@@ -0,0 +1,55 @@
+import zlib
+from unittest import TestCase
+
+from agent import protocol
+
+
+class TestProtocol(TestCase):
+
+    def test_round_trip(self):
+        samples = [
+            (1000.0, {'cpu_1': 0.52, 'total_mem': 31753, 'logs_data': {404: 3, 200: 120}}),
+            (1001.0, {'cpu_1': 0.61, 'total_mem': 31753}),
+        ]
+        decoded = protocol.decode(protocol.encode('app1', samples))
+        self.assertEqual(decoded, [
+            ('app1', 1000.0, {'cpu_1': 0.52, 'total_mem': 31753, 'logs_data': {'404': 3, '200': 120}}),
+            ('app1', 1001.0, {'cpu_1': 0.61, 'total_mem': 31753}),
+        ])
+
+    def test_concatenated_frames(self):
+        frames = protocol.encode('app1', [(1.0, {'a': 1})])
+        frames += protocol.encode('app2', [(2.0, {'b': 2})], compress=False)
+        self.assertEqual(protocol.decode(frames), [('app1', 1.0, {'a': 1}), ('app2', 2.0, {'b': 2})])
+
+    def test_metric_names_sent_once(self):
+        samples = [(float(second), {'a_long_metric_name': second}) for second in range(100)]
+        frame = protocol.encode('app1', samples, compress=False)
+        self.assertEqual(frame.count(b'a_long_metric_name'), 1)
+
+    def test_unsupported_version(self):
+        frame = bytearray(protocol.encode('app1', [(1.0, {'a': 1})]))
+        frame[2] = protocol.VERSION + 1
+        with self.assertRaisesRegex(protocol.ProtocolError, 'unsupported frame version'):
+            protocol.decode(bytes(frame))
+
+    def test_malformed_frames(self):
+        frame = protocol.encode('app1', [(1.0, {'a': 1})])
+        for malformed in (b'XX' + frame[2:], frame[:-3], frame[:4]):
+            with self.assertRaises(protocol.ProtocolError):
+                protocol.decode(malformed)
+        body = zlib.compress(b'\x00')
+        header = protocol.HEADER.pack(protocol.MAGIC, protocol.VERSION, protocol.COMPRESSED, 1, len(body))
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.decode(header + body)
+
+    def test_decompression_bomb(self):
+        body = zlib.compress(b'\x00' * (protocol.MAX_BODY_SIZE + 1))
+        header = protocol.HEADER.pack(protocol.MAGIC, protocol.VERSION, protocol.COMPRESSED, 1, len(body))
+        with self.assertRaisesRegex(protocol.ProtocolError, 'too large'):
+            protocol.decode(header + body)
+        # the limit holds across the frames of a request too
+        body = zlib.compress(b'\x00' * (protocol.MAX_BODY_SIZE // 2 + 1))
+        header = protocol.HEADER.pack(protocol.MAGIC, protocol.VERSION, protocol.COMPRESSED, 1, len(body))
+        with self.assertRaisesRegex(protocol.ProtocolError, 'too large'):
+            protocol.decode((header + body) * 2)
@@ -1,20 +1,38 @@
 from django.test import TestCase
 from flexmock import flexmock
 from rest_framework.reverse import reverse
-from rest_framework.status import HTTP_201_CREATED, HTTP_400_BAD_REQUEST
+from rest_framework.status import (HTTP_201_CREATED, HTTP_202_ACCEPTED,
+                                   HTTP_400_BAD_REQUEST)
 
-from api.v1.hostinguard import service_handler
+from api.v1.hostinguard import es_writer, service_handler
+from api.v1.hostinguard.app1 import views
+
+
+def returning(value):
+    """
+    Returns a coroutine function returning `value`, standing in for an async handler.
+    """
+    async def handler(*args, **kwargs):
+        return value
+    return handler
 
 
 class HostinGuardView(TestCase):
 
-    def test_post_success(self):
+    @staticmethod
+    def stub_sources():
         flexmock(service_handler.GoogleHandler).should_receive('get_google_data').and_return({'a': 1}).once()
-        flexmock(service_handler.CPanelHandler).should_receive('get_cpanel_data').and_return({'b': 2}).once()
-        flexmock(service_handler.StaticResourceHandler).should_receive('get_memory_data').and_return({'c': 3}).once()
-        flexmock(service_handler.StaticResourceHandler).should_receive('get_logs_data').and_return({'d': 4}).once()
+        flexmock(service_handler.CPanelHandler).should_receive(
+            'get_cpanel_data_async').replace_with(returning({'b': 2})).once()
+        flexmock(service_handler.StaticResourceHandler).should_receive(
+            'get_memory_data_async').replace_with(returning({'c': 3})).once()
+        flexmock(service_handler.StaticResourceHandler).should_receive(
+            'get_logs_data_async').replace_with(returning({'d': 4})).once()
+
+    def test_post_success(self):
+        self.stub_sources()
         flexmock(service_handler.ElasticSearchHandler).should_receive(
-            'write_result').and_return({'result': 'created'}).once()
+            'write_result_async').replace_with(returning({'result': 'created'})).once()
         url = reverse('app1-hostinguard-update')
         data = {}
         response = self.client.post(url, data)
@@ -22,14 +40,57 @@ class HostinGuardView(TestCase):
         self.assertEqual(response.data['status'], 'SUCCESS')
 
     def test_post_failure(self):
-        flexmock(service_handler.GoogleHandler).should_receive('get_google_data').and_return({'a': 1}).once()
-        flexmock(service_handler.CPanelHandler).should_receive('get_cpanel_data').and_return({'b': 2}).once()
-        flexmock(service_handler.StaticResourceHandler).should_receive('get_memory_data').and_return({'c': 3}).once()
-        flexmock(service_handler.StaticResourceHandler).should_receive('get_logs_data').and_return({'d': 4}).once()
+        self.stub_sources()
         flexmock(service_handler.ElasticSearchHandler).should_receive(
-            'write_result').and_return({'result': 'huston_we_have_a_problem'}).once()
+            'write_result_async').replace_with(returning({'result': 'huston_we_have_a_problem'})).once()
         url = reverse('app1-hostinguard-update')
         data = {}
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['status'], 'FAILURE')
+
+    def test_post_bulk_flushed(self):
+        es_writer.reset()
+        flexmock(views.settings, ES_BULK={'ENABLED': True, 'MAX_DOCS': 1, 'FLUSH_INTERVAL': 60})
+        self.stub_sources()
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(
+            lambda client, actions, **kwargs: [(True, {'index': {'result': 'created'}}) for _ in actions]
+        ).once()
+        url = reverse('app1-hostinguard-update')
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'SUCCESS')
+        es_writer.reset()
+
+    def test_post_bulk_rejected(self):
+        es_writer.reset()
+        flexmock(views.settings, ES_BULK={'ENABLED': True, 'MAX_DOCS': 1, 'FLUSH_INTERVAL': 60})
+        self.stub_sources()
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(
+            lambda client, actions, **kwargs: [(False, {'index': {'error': 'mapper_parsing_exception'}})]
+        ).once()
+        url = reverse('app1-hostinguard-update')
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'mapper_parsing_exception')
+        es_writer.reset()
+
+    def test_post_pipeline_queued(self):
+        flexmock(views.pipeline).should_receive('is_enabled').and_return(True)
+        flexmock(views.pipeline).should_receive('get_pipeline').and_return(
+            flexmock().should_receive('write').and_return({'result': 'queued'}).once().mock())
+        self.stub_sources()
+        url = reverse('app1-hostinguard-update')
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'QUEUED')
+
+    def test_post_spooled(self):
+        flexmock(views.spool).should_receive('is_enabled').and_return(True)
+        flexmock(views.spool).should_receive('get_spool').and_return(
+            flexmock().should_receive('append').once().mock())
+        self.stub_sources()
+        url = reverse('app1-hostinguard-update')
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'SPOOLED')
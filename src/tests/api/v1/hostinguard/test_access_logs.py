@@ -0,0 +1,177 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from unittest import TestCase
+
+import requests
+from flexmock import flexmock
+
+from api.v1.hostinguard import access_logs, ratelimit
+
+
+class TestCountStatuses(TestCase):
+
+    def test_aggregated_lines(self):
+        lines = [' 663620 200 ', '   795 404', '', 'garbage']
+        self.assertEqual(access_logs.count_statuses(lines), {200: 663620, 404: 795})
+
+    def test_raw_lines(self):
+        lines = [
+            b'1.2.3.4 - - [18/Oct/2026:10:00:00 +0000] "GET / HTTP/1.1" 200 1234 "-" "curl/7.58.0"',
+            '1.2.3.4 - - [18/Oct/2026:10:00:01 +0000] "GET /missing HTTP/1.1" 404 12 "-" "Mozilla/5.0"',
+            '1.2.3.4 - - [18/Oct/2026:10:00:02 +0000] "GET / HTTP/1.1" 200 1234',
+            '1.2.3.4 - - [17/Oct/2026:23:59:59 +0000] "GET / HTTP/1.1" 500 0',
+            '1.2.3.4 - - [18/Oct/2026:10:00:03 +0000] "\\x16\\x03" - -',
+        ]
+        counts = access_logs.count_statuses(lines, at=datetime(2026, 10, 18, 12, tzinfo=timezone.utc))
+        self.assertEqual(counts, {200: 2, 404: 1})
+
+    def test_raw_lines_local_day(self):
+        lines = [
+            '1.2.3.4 - - [19/Oct/2026:00:30:00 +0200] "GET / HTTP/1.1" 200 1234',
+            '1.2.3.4 - - [18/Oct/2026:23:30:00 +0200] "GET / HTTP/1.1" 500 0',
+            '1.2.3.4 - - [18/Oct/2026:17:30:00 -0500] "GET / HTTP/1.1" 404 12',
+            '1.2.3.4 - - [18/Oct/2026:22:30:00 garbage] "GET / HTTP/1.1" 500 0',
+        ]
+        # already the 19th in the offset of the first lines, still the 18th in that of the third one
+        counts = access_logs.count_statuses(lines, at=datetime(2026, 10, 18, 22, 30, tzinfo=timezone.utc))
+        self.assertEqual(counts, {200: 1, 404: 1})
+
+    def test_parse_minute(self):
+        self.assertEqual(access_logs.parse_minute('18/Oct/2026:10:05'), '2026-10-18T10:05')
+        self.assertEqual(access_logs.parse_minute('18/Okt/2026:10:05'), None)
+        self.assertEqual(access_logs.parse_minute('31/Feb/2026:10:05'), None)
+        self.assertEqual(access_logs.format_day(datetime(2026, 5, 1)), '01/May/2026')
+
+
+class TestLatencyHistogram(TestCase):
+
+    def test_percentile(self):
+        histogram = access_logs.LatencyHistogram(precision=0.01)
+        for value in range(1, 1001):
+            histogram.add(value)
+        self.assertAlmostEqual(histogram.percentile(50), 500, delta=10)
+        self.assertAlmostEqual(histogram.percentile(99), 990, delta=20)
+        self.assertEqual(histogram.max, 1000)
+
+    def test_percentile_empty(self):
+        self.assertEqual(access_logs.LatencyHistogram().percentile(50), 0)
+
+
+class TestIncrementalLogIngester(TestCase):
+    LINE = '1.2.3.4 - - [18/Oct/2026:10:%02d:00 +0000] "GET / HTTP/1.1" %d 1234 "-" "curl/7.58.0" %d\n'
+
+    def setUp(self):
+        self.log = tempfile.NamedTemporaryFile(mode='w', delete=False)
+        self.log.write(self.LINE % (0, 500, 1000))
+        self.log.flush()
+
+    def tearDown(self):
+        self.log.close()
+        os.remove(self.log.name)
+
+    def test_ingest_new_lines_only(self):
+        ingester = access_logs.IncrementalLogIngester(self.log.name, response_time_field=4)
+        self.assertEqual(ingester.ingest()['logs_delta'], {})
+
+        self.log.write(self.LINE % (1, 200, 2000))
+        self.log.write(self.LINE % (2, 200, 4000))
+        self.log.write(self.LINE % (2, 404, 1000))
+        # incomplete line, left to the next tick
+        self.log.write('1.2.3.4 - - [18/Oct/2026:10:03:00')
+        self.log.flush()
+        data = ingester.ingest()
+        self.assertEqual(data['logs_delta'], {200: 2, 404: 1})
+        self.assertEqual(data['logs_minutes'], [
+            {'minute': '2026-10-18T10:01', 'counts': {200: 1}},
+            {'minute': '2026-10-18T10:02', 'counts': {200: 1, 404: 1}},
+        ])
+        self.assertAlmostEqual(data['response_time_p50'], 2, delta=0.1)
+        self.assertEqual(data['response_time_max'], 4)
+
+        self.log.write(' +0000] "GET / HTTP/1.1" 301 0 "-" "curl/7.58.0" 10\n')
+        self.log.flush()
+        self.assertEqual(ingester.ingest()['logs_delta'], {301: 1})
+        self.assertEqual(ingester.ingest()['logs_delta'], {})
+
+    def test_ingest_truncated_log(self):
+        self.log.write(self.LINE % (1, 200, 1000))
+        self.log.flush()
+        ingester = access_logs.IncrementalLogIngester(self.log.name)
+        ingester.ingest()
+        self.log.truncate(0)
+        self.log.seek(0)
+        self.log.write(self.LINE % (5, 503, 1000))
+        self.log.flush()
+        self.assertEqual(ingester.ingest()['logs_delta'], {503: 1})
+
+    def test_ingest_failed_read_again(self):
+        ingester = access_logs.IncrementalLogIngester(self.log.name)
+        ingester.ingest()
+        offset = ingester.offset
+        self.log.write(self.LINE % (1, 200, 1000))
+        self.log.write(self.LINE % (2, 404, 1000))
+        self.log.flush()
+        parse_line = ingester.parse_line
+        parsed = []
+
+        def failing_parse_line(line):
+            if parsed:
+                raise ValueError('unexpected line')
+            parsed.append(line)
+            return parse_line(line)
+
+        flexmock(ingester).should_receive('parse_line').replace_with(failing_parse_line)
+        with self.assertRaises(ValueError):
+            ingester.ingest()
+        self.assertEqual(ingester.offset, offset)
+        flexmock(ingester).should_receive('parse_line').replace_with(parse_line)
+        self.assertEqual(ingester.ingest()['logs_delta'], {200: 1, 404: 1})
+
+    def test_ingest_without_response_time_field(self):
+        ingester = access_logs.IncrementalLogIngester(self.log.name)
+        ingester.ingest()
+        self.log.write(self.LINE % (1, 200, 2000))
+        self.log.flush()
+        data = ingester.ingest()
+        self.assertEqual(data['logs_delta'], {200: 1})
+        # the bytes field is not mistaken for a response time
+        self.assertFalse([field for field in data if field.startswith('response_time_')])
+
+    def test_response_time_field_position(self):
+        line = b'1.2.3.4 - - [18/Oct/2026:10:00:00 +0000] "GET / HTTP/1.1" 200 1234 "-" "Mozilla/5.0 (X11)" 2000'
+        for position in (4, -1):
+            ingester = access_logs.IncrementalLogIngester(self.log.name, response_time_field=position)
+            self.assertEqual(ingester.parse_line(line), ('2026-10-18T10:00', 200, 2000))
+        ingester = access_logs.IncrementalLogIngester(self.log.name, response_time_field=7)
+        self.assertEqual(ingester.parse_line(line), ('2026-10-18T10:00', 200, None))
+
+    def test_minutes_cache_bounded(self):
+        ingester = access_logs.IncrementalLogIngester(self.log.name)
+        ingester.ingest()
+        for hour in range(25):
+            for minute in range(60):
+                ingester.parse_line(('1.2.3.4 - - [%d/Oct/2026:%02d:%02d:00 +0000] "GET / HTTP/1.1" 200 1'
+                                     % (18 + hour // 24, hour % 24, minute)).encode('utf-8'))
+            ingester.ingest()
+            self.assertLessEqual(len(ingester._minutes), ingester.MINUTES_CACHE_SIZE + 60)
+
+    def test_ingest_url_retried(self):
+        flexmock(time).should_receive('sleep')
+        flexmock(ratelimit.Limit).should_receive('wait').times(3)
+        flexmock(requests).should_receive('head').and_raise(requests.ConnectionError('down')).and_return(
+            flexmock(headers={'Content-Length': '10'}))
+        ingester = access_logs.IncrementalLogIngester('http://fake_host/access.log')
+        self.assertEqual(ingester.ingest()['logs_delta'], {})
+        self.assertEqual(ingester.offset, 10)
+
+        stubbed_response = flexmock(status_code=206, iter_content=lambda size: iter([
+            (self.LINE % (1, 200, 2000)).encode('utf-8')]))
+        stubbed_response.should_receive('__enter__').and_return(stubbed_response)
+        stubbed_response.should_receive('__exit__')
+        stubbed_response.should_receive('raise_for_status')
+        flexmock(requests).should_receive('get').with_args(
+            'http://fake_host/access.log', headers={'Range': 'bytes=10-'}, timeout=5, stream=True
+        ).and_return(stubbed_response).once()
+        self.assertEqual(ingester.ingest()['logs_delta'], {200: 1})
@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import TestCase
+
+import requests
+from django.core.exceptions import ImproperlyConfigured
+from flexmock import flexmock
+
+from api.v1.hostinguard import alerting
+
+
+class TestDeriveMetrics(TestCase):
+
+    def test_logs_5xx_ratio(self):
+        derived = alerting.derive_metrics({'logs_data': {200: 90, 503: 5, 500: 5, 999: 1}})
+        self.assertEqual(derived['logs_5xx_ratio'], 0.1)
+
+    def test_missing_logs(self):
+        self.assertEqual(alerting.derive_metrics({'logs_data': {999: 1}}), {})
+
+
+class TestAnomalyRule(TestCase):
+
+    def test_check(self):
+        rule = alerting.AnomalyRule(name='memory', metric='available', threshold=3, alpha=0.2, warmup=5)
+        state = rule.new_state()
+        for value in [1000, 1010, 990, 1005, 995, 1000]:
+            firing, _ = rule.check(value, state)
+            self.assertFalse(firing)
+        firing, _ = rule.check(200, state)
+        self.assertTrue(firing)
+
+    def test_check_warmup(self):
+        rule = alerting.AnomalyRule(name='memory', metric='available', warmup=10)
+        state = rule.new_state()
+        rule.check(1000, state)
+        rule.check(1010, state)
+        firing, _ = rule.check(10, state)
+        self.assertFalse(firing)
+
+
+class TestAlertEngine(TestCase):
+
+    def setUp(self):
+        self.sink = flexmock(send=lambda alert: None)
+        self.engine = alerting.AlertEngine(
+            rules=[alerting.ThresholdRule(name='high_load', metric='cpu_5', op='>', value=4)],
+            sinks=[self.sink],
+            cooldown=60
+        )
+
+    def test_evaluate_deduplicated(self):
+        self.sink.should_receive('send').twice()
+        self.assertEqual(self.engine.evaluate('app1', {'cpu_5': 1}, timestamp=0), [])
+        self.assertEqual(self.engine.evaluate('app1', {'cpu_5': 5}, timestamp=10)[0]['state'], alerting.FIRING)
+        self.assertEqual(self.engine.evaluate('app1', {'cpu_5': 6}, timestamp=20), [])
+        self.assertEqual(self.engine.evaluate('app1', {'cpu_5': 1}, timestamp=30)[0]['state'], alerting.RESOLVED)
+        self.assertEqual(self.engine.evaluate('app1', {'cpu_5': 1}, timestamp=40), [])
+
+    def test_evaluate_cooldown(self):
+        self.assertEqual(len(self.engine.evaluate('app1', {'cpu_5': 5}, timestamp=0)), 1)
+        self.assertEqual(len(self.engine.evaluate('app1', {'cpu_5': 5}, timestamp=30)), 0)
+        self.assertEqual(len(self.engine.evaluate('app1', {'cpu_5': 5}, timestamp=60)), 1)
+
+    def test_evaluate_per_app(self):
+        self.assertEqual(len(self.engine.evaluate('app1', {'cpu_5': 5}, timestamp=0)), 1)
+        self.assertEqual(len(self.engine.evaluate('app2', {'cpu_5': 5}, timestamp=0)), 1)
+
+    def test_invalid_rules(self):
+        with self.assertRaises(ImproperlyConfigured):
+            alerting.ThresholdRule(name='high_load', metric='cpu_5', op='=>', value=4)
+        with self.assertRaises(ImproperlyConfigured):
+            alerting.build_rule({'NAME': 'high_load', 'METRIC': 'cpu_5', 'OP': '>'})
+        with self.assertRaises(ImproperlyConfigured):
+            alerting.build_rule({'NAME': 'memory', 'METRIC': 'available', 'TYPE': 'anomalous'})
+
+    def test_get_alert_engine_invalid_rules_ignored(self):
+        flexmock(alerting.settings, ALERTING={'RULES': [
+            {'NAME': 'high_load', 'METRIC': 'cpu_5', 'OP': '=>', 'VALUE': 4},
+            {'NAME': 'swapping', 'METRIC': 'used_swap', 'OP': '>', 'VALUE': 1024},
+        ]})
+        alerting.reset()
+        engine = alerting.get_alert_engine()
+        alerting.reset()
+        self.assertEqual([rule.name for rule in engine.rules], ['swapping'])
+        self.assertEqual(engine.evaluate('app1', {'cpu_5': 5, 'used_swap': 2048}, timestamp=0)[0]['rule'], 'swapping')
+
+    def test_evaluate_failing_sink(self):
+        self.sink.should_receive('send').and_raise(IOError('sink down'))
+        self.assertEqual(len(self.engine.evaluate('app1', {'cpu_5': 5}, timestamp=0)), 1)
+
+
+class TestSinks(TestCase):
+
+    def test_file_sink(self):
+        path = tempfile.mktemp()
+        sink = alerting.build_sink({'CLASS': 'api.v1.hostinguard.alerting.FileSink', 'PATH': path})
+        sink.send({'app': 'app1', 'state': alerting.FIRING})
+        with open(path) as alerts:
+            self.assertEqual(json.loads(alerts.readline())['app'], 'app1')
+        os.remove(path)
+
+    def test_webhook_sink(self):
+        posted = []
+        flexmock(requests).should_receive('post').replace_with(lambda url, json, timeout: posted.append(json)).once()
+        sink = alerting.build_sink({'CLASS': 'api.v1.hostinguard.alerting.WebhookSink', 'URL': 'http://fake_hook'})
+        sink.send({'app': 'app1', 'rule': 'high_load', 'state': alerting.FIRING})
+        sink.join()
+        self.assertEqual(posted[0]['rule'], 'high_load')
+
+    def test_webhook_sink_full(self):
+        posting, released = threading.Event(), threading.Event()
+        posted = []
+
+        def post(url, json, timeout):
+            posting.set()
+            released.wait(1)
+            posted.append(json['rule'])
+
+        flexmock(requests).should_receive('post').replace_with(post)
+        sink = alerting.WebhookSink('http://fake_hook', max_pending=1)
+        sink.send({'app': 'app1', 'rule': 'high_load', 'state': alerting.FIRING})
+        posting.wait(1)
+        # not holding up the caller while the endpoint is slow, one alert waiting at most
+        sink.send({'app': 'app1', 'rule': 'swapping', 'state': alerting.FIRING})
+        sink.send({'app': 'app1', 'rule': 'low_memory', 'state': alerting.FIRING})
+        released.set()
+        sink.join()
+        self.assertEqual(posted, ['high_load', 'swapping'])
@@ -0,0 +1,31 @@
+import asyncio
+from unittest import TestCase
+
+from asgiref.sync import async_to_sync
+
+from api.v1.hostinguard import async_http
+
+
+class TestGetClient(TestCase):
+
+    def setUp(self):
+        async_http.reset()
+
+    def test_client_shared_by_the_loop(self):
+        async def get_clients():
+            return async_http.get_client(), async_http.get_client()
+
+        first, second = async_to_sync(get_clients)()
+        self.assertIs(first, second)
+
+    def test_clients_closed_with_their_loop(self):
+        async def get_client():
+            client = async_http.get_client()
+            await asyncio.sleep(0)
+            self.assertFalse(client.is_closed)
+            return client
+
+        clients = [async_to_sync(get_client)() for _ in range(5)]
+        self.assertEqual(len({id(client) for client in clients}), 5)
+        self.assertTrue(all(client.is_closed for client in clients))
+        self.assertEqual(async_http._clients, {})
@@ -0,0 +1,180 @@
+import asyncio
+import time
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from api.v1.hostinguard import collector, es_writer, service_handler
+from api.v1.hostinguard.constants import PARTIAL_SOURCES
+
+
+def slow_source():
+    time.sleep(0.5)
+    return {'slow': 1}
+
+
+def failing_source():
+    raise ValueError('backend down')
+
+
+class TestSequentialCollector(TestCase):
+
+    def test_collect(self):
+        data = collector.SequentialCollector().collect({
+            'a': lambda: {'a': 1},
+            'b': lambda: {'b': 2},
+        })
+        self.assertEqual(data, {'a': 1, 'b': 2})
+
+
+class TestConcurrentCollector(TestCase):
+
+    def test_collect(self):
+        concurrent_collector = collector.ConcurrentCollector(max_workers=2, timeout=1)
+        data = concurrent_collector.collect({
+            'a': lambda: {'a': 1},
+            'b': lambda: {'b': 2},
+        })
+        self.assertEqual(data, {'a': 1, 'b': 2})
+
+    def test_collect_deadline_missed(self):
+        concurrent_collector = collector.ConcurrentCollector(
+            max_workers=2,
+            timeout=1,
+            source_timeouts={'slow': 0.05}
+        )
+        started = time.monotonic()
+        data = concurrent_collector.collect({
+            'fast': lambda: {'fast': 1},
+            'slow': slow_source,
+        })
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(data['fast'], 1)
+        self.assertNotIn('slow', data)
+        self.assertEqual(data[PARTIAL_SOURCES], ['slow'])
+
+    def test_collect_late_sources_bounded(self):
+        concurrent_collector = collector.ConcurrentCollector(max_workers=1, timeout=0.05)
+        self.assertIs(concurrent_collector.get_executor(), collector.ConcurrentCollector(1, 1).get_executor())
+        ran = []
+        data = concurrent_collector.collect({'slow': slow_source})
+        self.assertEqual(data[PARTIAL_SOURCES], ['slow'])
+        # the only worker is still busy with the late source
+        data = concurrent_collector.collect({'fast': lambda: ran.append('fast') or {'fast': 1}})
+        self.assertEqual(data[PARTIAL_SOURCES], ['fast'])
+        time.sleep(0.5)
+        self.assertEqual(ran, [])
+
+    def test_collect_async_deadline_missed(self):
+        async def fast_source():
+            return {'fast': 1}
+
+        async def slow_async_source():
+            await asyncio.sleep(0.5)
+            return {'slow': 1}
+
+        concurrent_collector = collector.ConcurrentCollector(
+            max_workers=2,
+            timeout=1,
+            source_timeouts={'slow': 0.05}
+        )
+        started = time.monotonic()
+        data = asyncio.run(concurrent_collector.collect_async({'fast': fast_source, 'slow': slow_async_source}))
+        self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(data['fast'], 1)
+        self.assertNotIn('slow', data)
+        self.assertEqual(data[PARTIAL_SOURCES], ['slow'])
+
+    def test_collect_source_failure(self):
+        concurrent_collector = collector.ConcurrentCollector(max_workers=2, timeout=1)
+        data = concurrent_collector.collect({
+            'fast': lambda: {'fast': 1},
+            'failing': failing_source,
+        })
+        self.assertEqual(data['fast'], 1)
+        self.assertEqual(data[PARTIAL_SOURCES], ['failing'])
+
+
+class TestCollectionEngine(TestCase):
+
+    def setUp(self):
+        flexmock(collector.settings, ES={
+            'app1': {'INDEX': 'index_1', 'DOC_TYPE': 'doc'},
+            'app2': {'INDEX': 'index_2', 'DOC_TYPE': 'doc'},
+        })
+        flexmock(collector.settings, GOOGLE_API={})
+        flexmock(collector.settings, STATIC_RESOURCE={})
+        flexmock(collector.settings, CPANEL={
+            'app1': {'HOST': 'host_1', 'USERNAME': 'user', 'PASSWORD': 'password', 'USE_SSL': True},
+            'app2': {'HOST': 'host_2', 'USERNAME': 'user', 'PASSWORD': 'password', 'USE_SSL': True},
+        })
+
+    def test_get_apps(self):
+        self.assertEqual(collector.get_apps(), ['app1', 'app2'])
+
+    def test_build_sources(self):
+        self.assertEqual(list(collector.build_sources('app1')), ['cpanel'])
+
+    def test_run(self):
+        flexmock(service_handler.CPanelHandler).should_receive('get_cpanel_data').and_return({'cpu_1': 0.1}).twice()
+        bulk_calls = []
+
+        def stubbed_bulk(client, actions, **kwargs):
+            bulk_calls.append(actions)
+            return [(True, {'index': {'result': 'created'}}) for _ in actions]
+
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(stubbed_bulk)
+        results = collector.CollectionEngine(max_workers=2, es_service='fake_es_service').run()
+
+        self.assertEqual(results['app1']['result'], 'created')
+        self.assertEqual(results['app2']['result'], 'created')
+        self.assertEqual(len(bulk_calls), 1)
+        self.assertEqual(sorted(action['_index'] for action in bulk_calls[0]), ['index_1', 'index_2'])
+
+    def test_run_collection_failure(self):
+        flexmock(collector.SequentialCollector).should_receive('collect').and_raise(ValueError('boom'))
+        flexmock(collector).should_receive('get_collector').and_return(collector.SequentialCollector())
+        flexmock(es_writer).should_receive('streaming_bulk').never()
+        results = collector.CollectionEngine(max_workers=2, es_service='fake_es_service').run(['app1'])
+        self.assertEqual(results['app1']['result'], 'error')
+
+    def test_run_async(self):
+        async def stubbed_cpanel_data(*args):
+            return {'cpu_1': 0.1}
+
+        bulk_calls = []
+
+        async def stubbed_bulk(es_service, actions):
+            bulk_calls.append(actions)
+            return [{'result': 'created'} for _ in actions]
+
+        flexmock(service_handler.CPanelHandler).should_receive('get_cpanel_data').never()
+        flexmock(service_handler.CPanelHandler).should_receive('get_cpanel_data_async').replace_with(
+            stubbed_cpanel_data).twice()
+        flexmock(es_writer).should_receive('bulk_async').replace_with(stubbed_bulk).once()
+        engine = collector.CollectionEngine(max_workers=2, es_service='fake_es_service')
+        results = asyncio.run(engine.run_async())
+
+        self.assertEqual(results, {'app1': {'result': 'created'}, 'app2': {'result': 'created'}})
+        self.assertEqual(sorted(index for index, _, _ in bulk_calls[0]), ['index_1', 'index_2'])
+        self.assertEqual(bulk_calls[0][0][2]['cpu_1'], 0.1)
+
+    def test_collect_google_profiles_at_once(self):
+        google_api = {'API_NAME': 'analytics', 'API_VERSION': 'v3', 'SCOPES': 'scopes', 'KEY_FILE_LOCATION': 'key'}
+        flexmock(collector.settings, GOOGLE_API={
+            'app1': dict(google_api, PROFILE='profile_1'),
+            'app2': dict(google_api, PROFILE='profile_2'),
+        })
+        flexmock(collector.settings, CPANEL={})
+        flexmock(service_handler.GoogleHandler).should_receive('get_profiles_data').with_args(
+            ['profile_1', 'profile_2']).and_return({
+                'profile_1': {'active_users': 1},
+                'profile_2': ValueError('profile_2 unreadable'),
+            }).once()
+        flexmock(service_handler.GoogleHandler).should_receive('get_google_data').never()
+        flexmock(collector).should_receive('get_collector').and_return(
+            collector.ConcurrentCollector(max_workers=2, timeout=1))
+
+        documents = collector.CollectionEngine(max_workers=2, es_service='fake_es_service').collect(['app1', 'app2'])
+        self.assertEqual(documents['app1'], {'active_users': 1})
+        self.assertEqual(documents['app2'], {PARTIAL_SOURCES: ['google']})
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from unittest import TestCase
+
+import httpx
+from flexmock import flexmock
+
+from api.v1.hostinguard import async_http, es_writer
+
+
+class TestBulkWriter(TestCase):
+
+    def setUp(self):
+        es_writer.reset()
+
+    def test_get_es_client_shared(self):
+        self.assertIs(es_writer.get_es_client('fake_es_service'), es_writer.get_es_client('fake_es_service'))
+
+    def test_write_buffered(self):
+        flexmock(es_writer).should_receive('streaming_bulk').never()
+        writer = es_writer.BulkWriter(es_service='fake_es_service', max_docs=2, flush_interval=60)
+        future = writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': 1})
+        writer.stop()
+        self.assertFalse(future.done())
+
+    def test_write_flushed_on_size(self):
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(
+            lambda client, actions, **kwargs: [(True, {'index': {'result': 'created'}}) for _ in actions]
+        ).once()
+        writer = es_writer.BulkWriter(es_service='fake_es_service', max_docs=2, flush_interval=60)
+        futures = [writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': i}) for i in range(2)]
+        self.assertEqual([future.result(timeout=1)['result'] for future in futures], ['created', 'created'])
+        writer.stop()
+        self.assertEqual(writer.flush(), {})
+
+    def test_write_flushed_on_time(self):
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(
+            lambda client, actions, **kwargs: [(True, {'index': {'result': 'created'}}) for _ in actions]
+        ).once()
+        writer = es_writer.BulkWriter(es_service='fake_es_service', max_docs=100, flush_interval=0.1)
+        future = writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': 1})
+        # flushed by the background thread, without any further write
+        self.assertEqual(future.result(timeout=1)['result'], 'created')
+        writer.stop()
+
+    def test_write_rejected(self):
+        flexmock(es_writer).should_receive('streaming_bulk').and_return(
+            [(True, {'index': {'result': 'created'}}), (False, {'index': {'error': 'mapper_parsing_exception'}})]
+        ).once()
+        writer = es_writer.BulkWriter(es_service='fake_es_service', max_docs=2, flush_interval=60)
+        future_ok = writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': 1})
+        future_ko = writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': 'b'})
+        self.assertEqual(future_ok.result(timeout=1)['result'], 'created')
+        self.assertEqual(future_ko.result(timeout=1)['result'], 'error')
+        self.assertEqual(future_ko.result()['error'], 'mapper_parsing_exception')
+        writer.stop()
+
+    def test_reset_cancels_pending_writes(self):
+        flexmock(es_writer).should_receive('streaming_bulk').never()
+        writer = es_writer.get_bulk_writer(es_service='fake_es_service', max_docs=2, flush_interval=60)
+        future = writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': 1})
+        es_writer.reset()
+        self.assertTrue(future.cancelled())
+
+    def test_flush_per_document_errors(self):
+        bulk_results = [
+            (True, {'index': {'result': 'created'}}),
+            (False, {'index': {'error': 'mapper_parsing_exception'}}),
+        ]
+        flexmock(es_writer).should_receive('streaming_bulk').and_return(bulk_results).once()
+        writer = es_writer.BulkWriter(es_service='fake_es_service', max_docs=100, flush_interval=60)
+        doc_ok = writer.add(index='fake_index', doc_type='fake_doc_type', data={'a': 1})
+        doc_ko = writer.add(index='fake_index', doc_type='fake_doc_type', data={'a': 'b'})
+        results = writer.flush()
+        self.assertEqual(results[doc_ok]['result'], 'created')
+        self.assertEqual(results[doc_ko]['result'], 'error')
+        self.assertEqual(results[doc_ko]['error'], 'mapper_parsing_exception')
+
+    def test_write_missing_bulk_results(self):
+        flexmock(es_writer).should_receive('streaming_bulk').and_return(
+            [(True, {'index': {'result': 'created'}})]
+        ).once()
+        writer = es_writer.BulkWriter(es_service='fake_es_service', max_docs=2, flush_interval=60)
+        future_ok = writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': 1})
+        future_missing = writer.write(index='fake_index', doc_type='fake_doc_type', data={'a': 2})
+        self.assertEqual(future_ok.result(timeout=1)['result'], 'created')
+        # resolved as failed rather than left pending
+        self.assertEqual(future_missing.result(timeout=1)['result'], 'error')
+        self.assertEqual(future_missing.result()['status'], 'N/A')
+        writer.stop()
+
+
+class TestBulkAsync(TestCase):
+
+    def test_get_base_url(self):
+        self.assertEqual(es_writer.get_base_url('fake_es_service'), 'http://fake_es_service:9200')
+        self.assertEqual(es_writer.get_base_url('https://es.example.com:9243/'), 'https://es.example.com:9243')
+
+    def test_bulk_async(self):
+        bodies = []
+
+        def handler(request):
+            bodies.append(request.content.decode('utf-8'))
+            return httpx.Response(200, json={'errors': True, 'items': [
+                {'index': {'status': 201, 'result': 'created'}},
+                {'index': {'status': 400, 'error': 'mapper_parsing_exception'}},
+            ]})
+
+        flexmock(async_http).should_receive('get_client').and_return(
+            httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        results = asyncio.run(es_writer.bulk_async('fake_es_service', [
+            ('fake_index', 'fake_doc_type', {'a': 1}),
+            ('fake_index', 'fake_doc_type', {'a': 'b'}),
+        ]))
+        self.assertEqual([result['result'] for result in results], ['created', 'error'])
+        self.assertEqual(results[1]['status'], 400)
+        lines = bodies[0].splitlines()
+        self.assertEqual(json.loads(lines[0])['index']['_index'], 'fake_index')
+        self.assertEqual(json.loads(lines[3])['a'], 'b')
+
+    def test_bulk_async_unreachable(self):
+        def handler(request):
+            raise httpx.ConnectError('connection refused')
+
+        flexmock(async_http).should_receive('get_client').and_return(
+            httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        results = asyncio.run(es_writer.bulk_async('fake_es_service', [('fake_index', 'fake_doc_type', {'a': 1})]))
+        self.assertEqual(results[0]['result'], 'error')
+        self.assertEqual(results[0]['status'], 'N/A')
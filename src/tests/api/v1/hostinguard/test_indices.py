@@ -0,0 +1,67 @@
+from datetime import date, datetime, timezone
+from io import StringIO
+from unittest import TestCase
+
+from django.core.management import call_command
+from elasticsearch.client import IndicesClient
+from flexmock import flexmock
+
+from api.v1.hostinguard import es_writer, indices
+
+# 2026-10-18T10:00:00Z
+TIMESTAMP = 1792317600
+
+
+class TestIndices(TestCase):
+
+    def setUp(self):
+        es_writer.reset()
+        indices._installed.clear()
+
+    def test_partitioned_index(self):
+        self.assertEqual(indices.partitioned_index('hostinguard-app1', TIMESTAMP), 'hostinguard-app1-2026.10.18')
+        self.assertEqual(indices.partitioned_index('hostinguard-app1', TIMESTAMP, indices.MONTHLY),
+                         'hostinguard-app1-2026.10')
+
+    def test_get_index_not_partitioned(self):
+        flexmock(IndicesClient).should_receive('put_template').never()
+        self.assertEqual(indices.get_index('app1'), 'fake_index')
+
+    def test_get_index_partitioned(self):
+        es_settings = {'app1': {'INDEX': 'fake_index', 'DOC_TYPE': 'fake_doc_type', 'PARTITION': indices.DAILY}}
+        flexmock(indices.settings, ES=es_settings)
+        flexmock(IndicesClient).should_receive('put_template').with_args(
+            name='hostinguard-app1', body=dict).once()
+        timestamp = datetime.fromtimestamp(TIMESTAMP, tz=timezone.utc)
+        self.assertEqual(indices.get_index('app1', timestamp), 'fake_index-2026.10.18')
+        # the template is installed once
+        self.assertEqual(indices.get_index('app1', timestamp), 'fake_index-2026.10.18')
+
+    def test_template_mappings(self):
+        mappings = indices.get_template('fake_index', 'fake_doc_type')['mappings']['fake_doc_type']
+        self.assertEqual(mappings['properties']['total_mem'], {'type': 'long'})
+        self.assertEqual(mappings['properties']['timestamp'], {'type': 'date'})
+        strings = [template['strings'] for template in mappings['dynamic_templates'] if 'strings' in template]
+        self.assertEqual(strings[0]['mapping']['type'], 'keyword')
+
+    def test_expired_indices(self):
+        names = [
+            'fake_index-2026.10.17', 'fake_index-2026.10.10', 'fake_index-2026.09.30',
+            'fake_index-2026.09', 'fake_index-2026.08',
+            'fake_index-5m-2026.01.01', 'fake_index', 'other_index-2020.01.01',
+        ]
+        expired = indices.expired_indices(names, 'fake_index', retention_days=10, today=date(2026, 10, 18))
+        self.assertEqual(expired, ['fake_index-2026.08', 'fake_index-2026.09', 'fake_index-2026.09.30'])
+
+    def test_retention_command(self):
+        flexmock(indices.settings, ES={'app1': {'INDEX': 'fake_index', 'DOC_TYPE': 'fake_doc_type',
+                                                'RETENTION_DAYS': 30}})
+        flexmock(indices.settings, ROLLUP={'RESOLUTIONS': []})
+        flexmock(IndicesClient).should_receive('get').and_return({
+            'fake_index-2000.01.01': {},
+            'fake_index-2999.01.01': {},
+        })
+        flexmock(IndicesClient).should_receive('delete').with_args(index='fake_index-2000.01.01').once()
+        out = StringIO()
+        call_command('hostinguard_retention', stdout=out)
+        self.assertEqual(out.getvalue(), 'dropped: fake_index-2000.01.01\n')
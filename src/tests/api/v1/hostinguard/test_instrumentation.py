@@ -0,0 +1,88 @@
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from api.v1.hostinguard import instrumentation, retry
+
+
+class TestRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = instrumentation.Registry()
+
+    def test_counters(self):
+        self.registry.inc('fake_total', {'source': 'a'})
+        self.registry.inc('fake_total', {'source': 'a'}, 2)
+        self.registry.inc('fake_total', {'source': 'b'})
+        self.assertEqual(self.registry.counter('fake_total', {'source': 'a'}), 3)
+        self.assertIn('# TYPE fake_total counter\nfake_total{source="a"} 3\nfake_total{source="b"} 1\n',
+                      self.registry.render())
+
+    def test_histogram(self):
+        for value in (0.003, 0.2, 0.3, 100):
+            self.registry.observe('fake_seconds', value)
+        rendered = self.registry.render()
+        self.assertIn('fake_seconds_bucket{le="0.005"} 1\n', rendered)
+        self.assertIn('fake_seconds_bucket{le="0.25"} 2\n', rendered)
+        self.assertIn('fake_seconds_bucket{le="0.5"} 3\n', rendered)
+        self.assertIn('fake_seconds_bucket{le="30"} 3\n', rendered)
+        self.assertIn('fake_seconds_bucket{le="+Inf"} 4\n', rendered)
+        self.assertIn('fake_seconds_count 4\n', rendered)
+
+    def test_gauges(self):
+        self.registry.register_gauges(lambda: [('fake_depth', None, 7)])
+        self.registry.register_gauges(lambda: 1 / 0)
+        self.assertIn('# TYPE fake_depth gauge\nfake_depth 7\n', self.registry.render())
+
+    def test_label_values_escaped(self):
+        self.registry.inc('fake_total', {'endpoint': 'a"b\\c'})
+        self.assertIn(r'fake_total{endpoint="a\"b\\c"} 1', self.registry.render())
+
+
+class TestTimed(TestCase):
+
+    def setUp(self):
+        instrumentation.registry.reset()
+
+    def tearDown(self):
+        instrumentation.registry.reset()
+
+    def test_calls_and_failures(self):
+        @instrumentation.timed('fake_handler')
+        def handler(fail):
+            if fail:
+                raise ValueError('fake error')
+            return 'fake_data'
+
+        labels = {'handler': 'fake_handler'}
+        self.assertEqual(handler(False), 'fake_data')
+        with self.assertRaises(ValueError):
+            handler(True)
+        self.assertEqual(instrumentation.registry.counter('hostinguard_handler_calls_total', labels), 2)
+        self.assertEqual(instrumentation.registry.counter('hostinguard_handler_failures_total', labels), 1)
+        self.assertEqual(instrumentation.registry.histogram('hostinguard_handler_duration_seconds', labels).count, 2)
+
+    def test_retried_outbound_call(self):
+        flexmock(retry.time).should_receive('sleep')
+        outcomes = iter([ConnectionError('fake error'), 'fake_result'])
+
+        def flaky():
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        policy = retry.RetryPolicy(max_attempts=3, deadline=10, retry_on_exceptions=(ConnectionError,))
+        self.assertEqual(retry.call(flaky, policy=policy, endpoint='fake_endpoint'), 'fake_result')
+        labels = {'endpoint': 'fake_endpoint'}
+        self.assertEqual(instrumentation.registry.counter('hostinguard_outbound_calls_total', labels), 1)
+        self.assertEqual(instrumentation.registry.counter('hostinguard_outbound_retries_total', labels), 1)
+        self.assertEqual(instrumentation.registry.counter('hostinguard_outbound_failures_total', labels), 0)
+
+    def test_response_bytes(self):
+        response = flexmock(url='http://fake_host:8080/free', content=b'fake_data')
+        instrumentation.count_response_bytes(response, stream=False)
+        instrumentation.count_response_bytes(response, stream=True)
+        self.assertEqual(list(instrumentation.counted_lines(response.url, [b'ab', b'c'])), [b'ab', b'c'])
+        self.assertEqual(
+            instrumentation.registry.counter('hostinguard_http_response_bytes_total', {'host': 'fake_host'}), 9 + 5)
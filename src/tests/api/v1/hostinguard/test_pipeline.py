@@ -0,0 +1,130 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from api.v1.hostinguard import es_writer, persistence, pipeline, spool
+
+
+def created(client, actions, **kwargs):
+    return [(True, {'index': {'result': 'created'}}) for _ in actions]
+
+
+def rejected(client, actions, **kwargs):
+    return [(False, {'index': {'error': 'cluster_block_exception'}}) for _ in actions]
+
+
+class TestIngestionPipeline(TestCase):
+
+    def setUp(self):
+        self.spill_path = tempfile.mktemp()
+
+    def tearDown(self):
+        if os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
+
+    def build_pipeline(self, **options):
+        defaults = {'es_service': 'fake_es_service', 'maxsize': 2, 'workers': 1, 'batch_size': 10}
+        defaults.update(options)
+        return pipeline.IngestionPipeline(**defaults)
+
+    def test_submit_written(self):
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(created)
+        ingestion_pipeline = self.build_pipeline()
+        ingestion_pipeline.start()
+        self.assertTrue(ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': 1}))
+        ingestion_pipeline.stop()
+        stats = ingestion_pipeline.stats()
+        self.assertEqual(stats['written'], 1)
+        self.assertEqual(stats['depth'], 0)
+
+    def test_submit_drop_newest(self):
+        ingestion_pipeline = self.build_pipeline(policy=pipeline.DROP_NEWEST)
+        self.assertTrue(ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': 1}))
+        self.assertTrue(ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': 2}))
+        self.assertFalse(ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': 3}))
+        self.assertEqual(ingestion_pipeline.stats()['dropped'], 1)
+        self.assertEqual(ingestion_pipeline.stats()['depth'], 2)
+
+    def test_submit_drop_oldest(self):
+        written = []
+
+        def stubbed_bulk(client, actions, **kwargs):
+            written.extend(action['_source']['a'] for action in actions)
+            return created(client, actions)
+
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(stubbed_bulk)
+        ingestion_pipeline = self.build_pipeline(policy=pipeline.DROP_OLDEST)
+        for value in range(3):
+            self.assertTrue(ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': value}))
+        ingestion_pipeline.start()
+        ingestion_pipeline.stop()
+        self.assertEqual(written, [1, 2])
+        self.assertEqual(ingestion_pipeline.stats()['dropped'], 1)
+
+    def test_submit_spill(self):
+        ingestion_pipeline = self.build_pipeline(
+            maxsize=1,
+            policy=pipeline.SPILL,
+            spill=pipeline.JsonLinesSpill(self.spill_path)
+        )
+        ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': 1})
+        self.assertFalse(ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': 2}))
+        with open(self.spill_path) as spill:
+            document = json.loads(spill.readline())
+        self.assertEqual(document['data']['a'], 2)
+        self.assertEqual(ingestion_pipeline.stats()['spilled'], 1)
+
+    def test_rejected_documents_spilled(self):
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(rejected)
+        ingestion_pipeline = self.build_pipeline(spill=pipeline.JsonLinesSpill(self.spill_path))
+        ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': 1})
+        ingestion_pipeline.start()
+        ingestion_pipeline.stop()
+        self.assertEqual(ingestion_pipeline.stats()['spilled'], 1)
+        self.assertEqual(ingestion_pipeline.stats()['written'], 0)
+
+    def test_slow_storage_does_not_block_submit(self):
+        release = threading.Event()
+
+        def slow_bulk(client, actions, **kwargs):
+            release.wait(1)
+            return created(client, actions)
+
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(slow_bulk)
+        ingestion_pipeline = self.build_pipeline(maxsize=100)
+        ingestion_pipeline.start()
+        for value in range(50):
+            self.assertTrue(ingestion_pipeline.submit('fake_index', 'fake_doc_type', {'a': value}))
+        release.set()
+        ingestion_pipeline.stop()
+        self.assertEqual(ingestion_pipeline.stats()['written'], 50)
+
+
+class TestPipelineWithSpool(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spool = spool.Spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        flexmock(spool).should_receive('is_enabled').and_return(True)
+        flexmock(spool).should_receive('get_spool').and_return(self.spool)
+        # the queue stays full without writers
+        flexmock(pipeline.IngestionPipeline).should_receive('start')
+        flexmock(pipeline.settings, PIPELINE={'ENABLED': True, 'MAX_SIZE': 1, 'POLICY': pipeline.DROP_NEWEST})
+        pipeline._pipeline = None
+
+    def tearDown(self):
+        pipeline._pipeline = None
+        shutil.rmtree(self.directory)
+
+    def test_overflow_spooled(self):
+        actions = [('fake_index', 'fake_doc_type', {'a': 1}), ('fake_index', 'fake_doc_type', {'a': 2})]
+        results = persistence.write('fake_es_service', actions)
+        self.assertEqual(results, [{'result': 'queued'}, {'result': 'spooled'}])
+        [(document, _)] = self.spool.read(10)
+        self.assertEqual(document['data']['a'], 2)
+        self.assertEqual(pipeline.get_pipeline().stats()['spilled'], 1)
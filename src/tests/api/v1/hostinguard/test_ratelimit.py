@@ -0,0 +1,134 @@
+import asyncio
+import threading
+import time
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from api.v1.hostinguard import instrumentation, ratelimit, retry
+from api.v1.hostinguard.exceptions import RateLimited
+
+RATE_LIMIT = {
+    'ENABLED': True,
+    'BACKENDS': {
+        'fake_backend': {'RATE': 10, 'BURST': 3, 'CREDENTIAL_RATE': 1, 'CREDENTIAL_BURST': 1},
+    },
+}
+
+
+class TestTokenBucket(TestCase):
+
+    def test_burst_then_rate(self):
+        bucket = ratelimit.TokenBucket(rate=10, burst=2)
+        delays = [bucket.reserve() for _ in range(5)]
+        self.assertEqual(delays[:2], [0.0, 0.0])
+        for expected, delay in zip((0.1, 0.2, 0.3), delays[2:]):
+            self.assertAlmostEqual(delay, expected, delta=0.01)
+
+    def test_refill(self):
+        bucket = ratelimit.TokenBucket(rate=1000, burst=1)
+        bucket.reserve()
+        time.sleep(0.01)
+        self.assertEqual(bucket.reserve(), 0.0)
+
+    def test_max_wait(self):
+        bucket = ratelimit.TokenBucket(rate=10, burst=1)
+        self.assertEqual(bucket.reserve(max_wait=0.05), 0.0)
+        self.assertIsNone(bucket.reserve(max_wait=0.05))
+        # turned down callers take no token
+        self.assertAlmostEqual(bucket.reserve(max_wait=0.5), 0.1, delta=0.01)
+
+    def test_concurrent_reservations(self):
+        bucket = ratelimit.TokenBucket(rate=100, burst=1)
+        delays = []
+
+        def reserve():
+            for _ in range(50):
+                delays.append(bucket.reserve())
+
+        threads = [threading.Thread(target=reserve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # every call got its own turn, 10ms after the previous one
+        self.assertAlmostEqual(max(delays), 199 / 100, delta=0.1)
+
+
+class TestLimit(TestCase):
+
+    def setUp(self):
+        ratelimit.reset()
+        instrumentation.registry.reset()
+        flexmock(ratelimit.settings, RATE_LIMIT=RATE_LIMIT)
+
+    def tearDown(self):
+        ratelimit.reset()
+        instrumentation.registry.reset()
+
+    def test_disabled(self):
+        flexmock(ratelimit.settings, RATE_LIMIT={'ENABLED': False})
+        flexmock(time).should_receive('sleep').never()
+        for _ in range(10):
+            ratelimit.Limit('fake_backend', 'fake_credential').wait()
+
+    def test_unconfigured_backend(self):
+        self.assertEqual(ratelimit.get_buckets('other_backend', 'fake_credential'), [])
+
+    def test_credential_bucket(self):
+        self.assertEqual(ratelimit.Limit('fake_backend', 'credential_1').reserve(), 0.0)
+        self.assertAlmostEqual(ratelimit.Limit('fake_backend', 'credential_1').reserve(), 1, delta=0.01)
+        # another credential only shares the backend bucket
+        self.assertEqual(ratelimit.Limit('fake_backend', 'credential_2').reserve(), 0.0)
+        self.assertAlmostEqual(ratelimit.Limit('fake_backend', 'credential_3').reserve(), 0.1, delta=0.01)
+        labels = {'backend': 'fake_backend'}
+        self.assertEqual(instrumentation.registry.counter('hostinguard_ratelimit_delayed_total', labels), 2)
+        self.assertEqual(instrumentation.registry.histogram('hostinguard_ratelimit_wait_seconds', labels).count, 4)
+
+    def test_max_wait(self):
+        flexmock(ratelimit.settings, RATE_LIMIT=dict(RATE_LIMIT, MAX_WAIT=0.5))
+        self.assertEqual(ratelimit.Limit('fake_backend', 'credential_1').reserve(), 0.0)
+        with self.assertRaises(RateLimited):
+            ratelimit.Limit('fake_backend', 'credential_1').reserve()
+        # the backend tokens of the call turned down are given back
+        self.assertEqual(ratelimit.Limit('fake_backend', 'credential_2').reserve(), 0.0)
+        self.assertEqual(ratelimit.Limit('fake_backend', 'credential_3').reserve(), 0.0)
+        self.assertEqual(
+            instrumentation.registry.counter('hostinguard_ratelimit_rejected_total', {'backend': 'fake_backend'}), 1)
+
+    def test_tokens(self):
+        self.assertAlmostEqual(ratelimit.Limit('fake_backend', tokens=4).reserve(), 0.1, delta=0.01)
+
+    def test_retried_calls_wait(self):
+        sleeps = []
+        flexmock(time).should_receive('sleep').replace_with(sleeps.append)
+        policy = retry.RetryPolicy(max_attempts=4, deadline=60, base_delay=0,
+                                   retry_on_result=lambda result: not result)
+        results = iter(['', '', '', 'data'])
+        limit = ratelimit.Limit('fake_backend')
+        self.assertEqual(retry.call(lambda: next(results), policy, endpoint='fake_endpoint', limit=limit), 'data')
+        self.assertAlmostEqual(sleeps[-1], 0.1, delta=0.01)
+
+    def test_retried_calls_fail_past_deadline(self):
+        flexmock(time).should_receive('sleep').never()
+        policy = retry.RetryPolicy(max_attempts=4, deadline=0.5)
+        ratelimit.Limit('fake_backend', 'fake_credential').reserve()
+        calls = []
+        with self.assertRaises(RateLimited):
+            retry.call(lambda: calls.append(1), policy, endpoint='fake_endpoint',
+                       limit=ratelimit.Limit('fake_backend', 'fake_credential'))
+        self.assertEqual(calls, [])
+
+    def test_wait_async(self):
+        delays = []
+
+        async def no_sleep(delay):
+            delays.append(delay)
+
+        async def wait():
+            for _ in range(4):
+                await ratelimit.Limit('fake_backend').wait_async()
+
+        flexmock(asyncio).should_receive('sleep').replace_with(no_sleep).once()
+        asyncio.run(wait())
+        self.assertAlmostEqual(delays[0], 0.1, delta=0.01)
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from api.v1.hostinguard import instrumentation, retry
+
+
+class Flaky(object):
+    """
+    Fails `failures` times before returning 'ok'.
+    """
+
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error('flaky')
+        return 'ok'
+
+
+class TestRetryPolicy(TestCase):
+
+    def test_get_delay_full_jitter(self):
+        policy = retry.RetryPolicy(max_attempts=5, deadline=60, base_delay=1, max_delay=4)
+        for attempt in range(10):
+            self.assertTrue(0 <= policy.get_delay(attempt) <= min(4, 2 ** attempt))
+
+    def test_should_retry_exception_predicate(self):
+        policy = retry.RetryPolicy(max_attempts=5, deadline=60, retry_on_exceptions=lambda e: 'retry' in str(e))
+        self.assertTrue(policy.should_retry_exception(ValueError('retry me')))
+        self.assertFalse(policy.should_retry_exception(ValueError('fatal')))
+
+
+def outbound(name, endpoint):
+    return instrumentation.registry.counter('hostinguard_outbound_%s_total' % name, {'endpoint': endpoint})
+
+
+class TestCall(TestCase):
+
+    def setUp(self):
+        instrumentation.registry.reset()
+        flexmock(time).should_receive('sleep')
+
+    def tearDown(self):
+        instrumentation.registry.reset()
+
+    def test_call_retried_exception(self):
+        policy = retry.RetryPolicy(max_attempts=3, deadline=60, retry_on_exceptions=(ConnectionError,))
+        func = Flaky(failures=2)
+        self.assertEqual(retry.call(func, policy, endpoint='flaky'), 'ok')
+        self.assertEqual(outbound('calls', 'flaky'), 1)
+        self.assertEqual(outbound('retries', 'flaky'), 2)
+        self.assertEqual(outbound('failures', 'flaky'), 0)
+
+    def test_call_attempts_exhausted(self):
+        policy = retry.RetryPolicy(max_attempts=2, deadline=60, retry_on_exceptions=(ConnectionError,))
+        with self.assertRaises(ConnectionError):
+            retry.call(Flaky(failures=5), policy, endpoint='flaky')
+        self.assertEqual(outbound('failures', 'flaky'), 1)
+
+    def test_call_not_retryable_exception(self):
+        policy = retry.RetryPolicy(max_attempts=5, deadline=60, retry_on_exceptions=(ConnectionError,))
+        func = Flaky(failures=1, error=KeyError)
+        with self.assertRaises(KeyError):
+            retry.call(func, policy, endpoint='flaky')
+        self.assertEqual(func.calls, 1)
+
+    def test_call_retried_result(self):
+        results = iter(['', '', 'data'])
+        policy = retry.RetryPolicy(max_attempts=5, deadline=60, retry_on_result=lambda result: not result)
+        self.assertEqual(retry.call(lambda: next(results), policy, endpoint='empty'), 'data')
+        self.assertEqual(outbound('retries', 'empty'), 2)
+
+    def test_call_deadline(self):
+        policy = retry.RetryPolicy(max_attempts=100, deadline=0, retry_on_result=lambda result: not result)
+        self.assertEqual(retry.call(lambda: '', policy, endpoint='empty'), '')
+        self.assertEqual(outbound('retries', 'empty'), 0)
+
+
+class TestCallAsync(TestCase):
+
+    def test_call_async(self):
+        flaky = Flaky(failures=2)
+
+        async def func():
+            return flaky()
+
+        async def no_sleep(delay):
+            pass
+
+        flexmock(asyncio).should_receive('sleep').replace_with(no_sleep).twice()
+        policy = retry.RetryPolicy(max_attempts=3, deadline=60, retry_on_exceptions=(ConnectionError,))
+        result = asyncio.run(retry.call_async(func, policy, endpoint='flaky_async'))
+        self.assertEqual(result, 'ok')
@@ -0,0 +1,92 @@
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from api.v1.hostinguard import indices, persistence, rollup
+
+# 2026-10-18T10:00:00Z
+START = 1792317600
+
+
+class TestRollupStage(TestCase):
+
+    def setUp(self):
+        self.written = []
+        flexmock(indices).should_receive('ensure_template').and_return(True)
+        flexmock(persistence).should_receive('write').replace_with(
+            lambda es_service, actions: self.written.extend(actions) or [{'result': 'created'} for _ in actions])
+        self.stage = rollup.RollupStage(
+            resolutions=[
+                rollup.Resolution('5m', 300),
+                rollup.Resolution('1m', 60),
+                rollup.Resolution('1h', 3600, indices.MONTHLY),
+            ],
+            es_service='fake_es_service'
+        )
+
+    def written_documents(self, resolution):
+        return [action for action in self.written if action[2]['resolution'] == resolution]
+
+    def test_bucket_written_once_over(self):
+        self.stage.add('app1', {'cpu_1': 1.0, 'logs_data': {404: 2}, 'logs_delta': {404: 2}}, START)
+        self.stage.add('app1', {'cpu_1': 3.0, 'logs_data': {404: 3, 200: 5}, 'logs_delta': {404: 1, 200: 5}},
+                       START + 30)
+        self.assertEqual(self.written, [])
+        self.stage.add('app1', {'cpu_1': 2.0}, START + 60)
+
+        index, doc_type, document = self.written[0]
+        self.assertEqual(index, 'fake_index-1m-2026.10.18')
+        self.assertEqual(doc_type, 'fake_doc_type')
+        self.assertEqual(document['timestamp'].timestamp(), START)
+        self.assertEqual(document['metrics']['cpu_1'], {'min': 1.0, 'max': 3.0, 'avg': 2.0, 'sum': 4.0, 'count': 2})
+        # the daily counts are snapshots, the last one of the bucket is kept
+        self.assertEqual(document['logs_data'], {'404': 3, '200': 5})
+        self.assertEqual(document['logs_delta'], {'404': 3, '200': 5})
+
+    def test_logs_data_not_summed(self):
+        for second in range(0, 60, 10):
+            self.stage.add('app1', {'logs_data': {200: 100 + second}}, START + second)
+        self.stage.flush()
+        for resolution in ('1m', '5m', '1h'):
+            self.assertEqual(self.written_documents(resolution)[0][2]['logs_data'], {'200': 150})
+
+    def test_late_sample_in_its_own_bucket(self):
+        self.stage.add('app1', {'cpu_1': 1.0}, START)
+        self.stage.add('app1', {'cpu_1': 2.0}, START + 60)
+        # the bucket of minute 0 is over
+        self.stage.add('app1', {'cpu_1': 9.0}, START + 30)
+        minutes = self.written_documents('1m')
+        self.assertEqual([document['timestamp'].timestamp() for _, _, document in minutes], [START, START])
+        self.assertEqual(minutes[1][2]['metrics']['cpu_1']['count'], 1)
+        self.assertEqual(minutes[1][2]['metrics']['cpu_1']['max'], 9.0)
+
+        self.stage.flush()
+        self.assertEqual(self.written_documents('1m')[-1][2]['metrics']['cpu_1']['max'], 2.0)
+        five_minutes = self.written_documents('5m')
+        self.assertEqual(len(five_minutes), 1)
+        self.assertEqual(five_minutes[0][2]['metrics']['cpu_1']['count'], 3)
+
+    def test_cascading_resolutions(self):
+        for minute in range(61):
+            self.stage.add('app1', {'cpu_1': float(minute)}, START + minute * 60)
+        self.assertEqual(len(self.written_documents('1m')), 60)
+        five_minutes = self.written_documents('5m')
+        # the 5m bucket starting at minute 55 is over along with the 1m one of minute 60
+        self.assertEqual(len(five_minutes), 11)
+        self.assertEqual(five_minutes[1][2]['metrics']['cpu_1'], {'min': 5.0, 'max': 9.0, 'avg': 7.0, 'sum': 35.0,
+                                                                  'count': 5})
+        self.assertEqual(self.written_documents('1h'), [])
+
+        self.stage.flush()
+        hours = self.written_documents('1h')
+        self.assertEqual(len(hours), 2)
+        index, _, document = hours[0]
+        self.assertEqual(index, 'fake_index-1h-2026.10')
+        self.assertEqual(document['metrics']['cpu_1']['count'], 60)
+        self.assertEqual(document['metrics']['cpu_1']['max'], 59.0)
+        self.assertEqual(hours[1][2]['metrics']['cpu_1']['count'], 1)
+
+    def test_template(self):
+        template = self.stage.template('fake_index', 'fake_doc_type')
+        self.assertEqual(template['index_patterns'], ['fake_index-1m-*', 'fake_index-5m-*', 'fake_index-1h-*'])
+        self.assertIn('fake_doc_type', template['mappings'])
@@ -0,0 +1,53 @@
+import threading
+from unittest import TestCase
+
+from django.core.management import call_command
+from flexmock import flexmock
+
+from api.v1.hostinguard import collector
+from api.v1.hostinguard.scheduler import Scheduler
+
+
+class TestScheduler(TestCase):
+
+    def test_next_tick(self):
+        scheduler = Scheduler(engine=None, interval=10)
+        self.assertEqual(scheduler.next_tick(100, 100.5), 110)
+        self.assertEqual(scheduler.next_tick(100, 109.9), 110)
+
+    def test_next_tick_overrun(self):
+        scheduler = Scheduler(engine=None, interval=10)
+        self.assertEqual(scheduler.next_tick(100, 125), 130)
+
+    def test_tick_skips_running_apps(self):
+        release = threading.Event()
+
+        def slow_run(apps):
+            release.wait(1)
+            return {app: {'result': 'created'} for app in apps}
+
+        engine = flexmock(run=slow_run)
+        scheduler = Scheduler(engine=engine, interval=10, apps=['app1', 'app2'])
+        self.assertEqual(scheduler.tick(), ['app1', 'app2'])
+        self.assertEqual(scheduler.tick(), [])
+        release.set()
+        scheduler.wait()
+        self.assertEqual(scheduler.tick(), ['app1', 'app2'])
+        scheduler.wait()
+
+    def test_tick_failing_pass(self):
+        engine = flexmock()
+        engine.should_receive('run').and_raise(ValueError('boom')).twice()
+        scheduler = Scheduler(engine=engine, interval=10, apps=['app1'])
+        scheduler.tick()
+        scheduler.wait()
+        self.assertEqual(scheduler.tick(), ['app1'])
+        scheduler.wait()
+
+
+class TestHostinGuardCollectCommand(TestCase):
+
+    def test_collect_once(self):
+        flexmock(collector.CollectionEngine).should_receive('run').with_args(['app1']).and_return(
+            {'app1': {'result': 'created'}}).once()
+        call_command('hostinguard_collect', '--once', '--apps', 'app1')
@@ -1,17 +1,87 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
 import time
 from unittest import TestCase
 
+import httpx
 import requests
+from asgiref.sync import async_to_sync
 from elasticsearch import Elasticsearch
 from flexmock import flexmock
+from freezegun import freeze_time
+from oauth2client.client import AccessTokenRefreshError
 
-from api.v1.hostinguard import service_handler
+from api.v1.hostinguard import (async_http, es_writer, instrumentation,
+                                service_handler)
+from api.v1.hostinguard.exceptions import ResourceUnavailable
+from services.cpanelapi import client as cpanel_client
 from services.cpanelapi.client import Client as CPanelClient
+from services.cpanelapi.exceptions import CallFailed
 from services.googleapi.client import Client as GoogleClient
+from services.procfs import client as procfs_client
+
+PROFILES = [
+    {'id': 'profile_id', 'name': 'All Web Site Data', 'website_url': 'https://www.example.com',
+     'property_id': 'UA-1-1', 'account_id': '1'},
+    {'id': 'other_profile_id', 'name': 'All Web Site Data', 'website_url': 'https://www.example.org/',
+     'property_id': 'UA-1-2', 'account_id': '1'},
+]
+
+
+def mock_client(handler):
+    """
+    Returns an httpx.AsyncClient answering the requests through `handler`.
+    """
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class FakeBatch(object):
+    """
+    Stands in for the batch request of a Google API service, executing its
+    queries one after another.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.queries = []
+
+    def add(self, query, request_id):
+        self.queries.append((request_id, query))
+
+    def execute(self, http=None):
+        for request_id, query in self.queries:
+            try:
+                self.callback(request_id, query.execute(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
 
 
 class TestGoogleHandler(TestCase):
 
+    def setUp(self):
+        GoogleClient.clear_cache()
+        service_handler.GoogleHandler.clear_cache()
+        # no key file: the queries go through the HTTP object of the stubbed services
+        flexmock(GoogleClient).should_receive('get_credentials').and_return(None)
+
+    @staticmethod
+    def stub_google_service():
+        stubbed_query = flexmock()
+        stubbed_query.should_receive('execute').and_return({
+            'totalsForAllResults': {
+                'rt:activeUsers': '1',
+                'ga:sessions': '2',
+                'ga:users': '3',
+                'ga:newUsers': '4'
+            }
+        })
+        stubbed_get = flexmock().should_receive('get').and_return(stubbed_query).mock()
+        stubbed_data = flexmock(realtime=lambda: stubbed_get, ga=lambda: stubbed_get)
+        return flexmock(data=lambda: stubbed_data, new_batch_http_request=FakeBatch)
+
     def test_get_google_data(self):
         mock_google_response_1 = {
             'totalsForAllResults': {
@@ -34,9 +104,10 @@ class TestGoogleHandler(TestCase):
 
         stubbed_google_service = flexmock().should_receive('data').and_return(
             stubbed_realtime_1).and_return(stubbed_realtime_2).twice().mock()
+        stubbed_google_service.should_receive('new_batch_http_request').replace_with(FakeBatch).once()
         stubbed_google_client = flexmock(GoogleClient)
         stubbed_google_client.should_receive('get_service').and_return(stubbed_google_service).once()
-        stubbed_google_client.should_receive('get_first_profile_id').and_return('profile_id').once()
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES).once()
 
         google_handler = service_handler.GoogleHandler(
             api_name='fake_api_name',
@@ -51,6 +122,275 @@ class TestGoogleHandler(TestCase):
         self.assertEqual(google_data['unique_users_cnt'], 3)
         self.assertEqual(google_data['new_users_cnt'], 4)
 
+    def test_get_google_data_cached_service(self):
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(self.stub_google_service()).once()
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES).once()
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes=['fake_scope'],
+            key_file_location='fake_key_file_location'
+        )
+        google_handler.get_google_data()
+        google_data = google_handler.get_google_data()
+        self.assertEqual(google_data['active_users'], 1)
+
+    def test_get_google_data_expired_cache(self):
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(self.stub_google_service()).twice()
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES).twice()
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location',
+            cache_ttl=0
+        )
+        google_handler.get_google_data()
+        google_handler.get_google_data()
+
+    def test_get_google_data_auth_error(self):
+        revoked_service = flexmock()
+        revoked_service.should_receive('data').and_raise(AccessTokenRefreshError('invalid_grant'))
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(
+            revoked_service).and_return(self.stub_google_service()).twice()
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES).twice()
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location'
+        )
+        google_data = google_handler.get_google_data()
+        self.assertEqual(google_data['users_cnt'], 2)
+
+    def test_get_google_data_cached_totals(self):
+        stubbed_realtime = flexmock().should_receive('execute').and_return(
+            {'totalsForAllResults': {'rt:activeUsers': '1'}}).and_return(
+            {'totalsForAllResults': {'rt:activeUsers': '5'}}).mock()
+        stubbed_totals = flexmock().should_receive('execute').and_return({
+            'totalsForAllResults': {'ga:sessions': '2', 'ga:users': '3', 'ga:newUsers': '4'}
+        }).once().mock()
+        stubbed_data = flexmock(
+            realtime=lambda: flexmock(get=lambda **kwargs: stubbed_realtime),
+            ga=lambda: flexmock(get=lambda **kwargs: stubbed_totals)
+        )
+        stubbed_google_service = flexmock(data=lambda: stubbed_data)
+        stubbed_google_service.should_receive('new_batch_http_request').replace_with(FakeBatch).once()
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(stubbed_google_service)
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES)
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location'
+        )
+        google_handler.get_google_data()
+        google_data = google_handler.get_google_data()
+        self.assertEqual(google_data['active_users'], 5)
+        self.assertEqual(google_data['users_cnt'], 2)
+
+    def test_get_google_data_totals_refreshed_next_day(self):
+        stubbed_google_service = self.stub_google_service()
+        stubbed_google_service.should_receive('new_batch_http_request').replace_with(FakeBatch).twice()
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(stubbed_google_service)
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES)
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location'
+        )
+        with freeze_time('2026-10-18 23:59:00'):
+            google_handler.get_google_data()
+        with freeze_time('2026-10-19 00:00:30'):
+            google_handler.get_google_data()
+
+    def test_get_google_data_batch_error(self):
+        failing_query = flexmock().should_receive('execute').and_raise(ValueError('fake error')).mock()
+        stubbed_data = flexmock(
+            realtime=lambda: flexmock(get=lambda **kwargs: failing_query),
+            ga=lambda: flexmock(get=lambda **kwargs: failing_query)
+        )
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(
+            flexmock(data=lambda: stubbed_data, new_batch_http_request=FakeBatch))
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES)
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location'
+        )
+        with self.assertRaises(ValueError):
+            google_handler.get_google_data()
+
+    def test_get_profiles_data(self):
+        queried = []
+
+        def get(**kwargs):
+            queried.append(kwargs['ids'])
+            return flexmock().should_receive('execute').and_return({'totalsForAllResults': {
+                'rt:activeUsers': '1' if kwargs['ids'] == 'ga:profile_id' else '6',
+                'ga:sessions': '2',
+                'ga:users': '3',
+                'ga:newUsers': '4'
+            }}).mock()
+
+        stubbed_data = flexmock(realtime=lambda: flexmock(get=get), ga=lambda: flexmock(get=get))
+        stubbed_google_service = flexmock(data=lambda: stubbed_data)
+        stubbed_google_service.should_receive('new_batch_http_request').replace_with(FakeBatch).twice()
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(stubbed_google_service).once()
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES).twice()
+        # one per batch, and one for the discovery triggered by the unknown view
+        stubbed_google_client.should_receive('get_thread_http').and_return(None).times(3)
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location',
+            batch_size=2
+        )
+        profiles_data = google_handler.get_profiles_data([None, 'https://www.example.org', 'unknown_profile_id'])
+        self.assertEqual(profiles_data[None]['active_users'], 1)
+        self.assertEqual(profiles_data['https://www.example.org']['active_users'], 6)
+        self.assertIsInstance(profiles_data['unknown_profile_id'], ResourceUnavailable)
+        self.assertEqual(sorted(set(queried)), ['ga:other_profile_id', 'ga:profile_id'])
+        self.assertEqual(len(queried), 4)
+        # the views are discovered again at most every PROFILES_REFRESH_INTERVAL
+        google_handler.get_profiles_data(['unknown_profile_id'])
+
+    def test_get_profiles_data_retries_failed_queries_only(self):
+        flexmock(time).should_receive('sleep')
+        executed = []
+
+        def get(**kwargs):
+            def execute(http=None):
+                executed.append(kwargs['ids'])
+                if kwargs['ids'] == 'ga:other_profile_id' and executed.count(kwargs['ids']) == 1:
+                    raise ConnectionError('connection reset')
+                return {'totalsForAllResults': {
+                    'rt:activeUsers': '1', 'ga:sessions': '2', 'ga:users': '3', 'ga:newUsers': '4'}}
+            return flexmock(execute=execute)
+
+        stubbed_data = flexmock(realtime=lambda: flexmock(get=get), ga=lambda: flexmock(get=get))
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(
+            flexmock(data=lambda: stubbed_data, new_batch_http_request=FakeBatch))
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES)
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location'
+        )
+        profiles_data = google_handler.get_profiles_data(['profile_id', 'other_profile_id'])
+        self.assertEqual(profiles_data['other_profile_id']['active_users'], 1)
+        # realtime and totals of both views, the failed realtime query once more
+        self.assertEqual(executed.count('ga:profile_id'), 2)
+        self.assertEqual(executed.count('ga:other_profile_id'), 3)
+
+    def test_get_google_data_thread_http(self):
+        http = object()
+        executed_with = []
+        stubbed_query = flexmock()
+        stubbed_query.should_receive('execute').replace_with(lambda http=None: executed_with.append(http) or {
+            'totalsForAllResults': {'rt:activeUsers': '1', 'ga:sessions': '2', 'ga:users': '3', 'ga:newUsers': '4'}
+        })
+        stubbed_get = flexmock().should_receive('get').and_return(stubbed_query).mock()
+        stubbed_data = flexmock(realtime=lambda: stubbed_get, ga=lambda: stubbed_get)
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(flexmock(data=lambda: stubbed_data)).once()
+        stubbed_google_client.should_receive('get_profiles').and_return(PROFILES).once()
+        stubbed_google_client.should_receive('get_thread_http').and_return(http).once()
+
+        google_handler = service_handler.GoogleHandler(
+            api_name='fake_api_name',
+            api_version='fake_api_version',
+            scopes='fake_scopes',
+            key_file_location='fake_key_file_location',
+            batch_size=1
+        )
+        google_handler.set_cached_totals('profile_id', {'ga:sessions': '2', 'ga:users': '3', 'ga:newUsers': '4'})
+        google_handler.get_google_data()
+        # a lone query is not sent through the HTTP object of the shared service either
+        self.assertEqual(executed_with, [http])
+
+    def test_get_cached_service_no_profiles(self):
+        stubbed_google_client = flexmock(GoogleClient)
+        stubbed_google_client.should_receive('get_service').and_return(self.stub_google_service()).once()
+        stubbed_google_client.should_receive('get_profiles').and_return([]).and_return(PROFILES).twice()
+        args = ('fake_api_name', 'fake_api_version', 'fake_scopes', 'fake_key_file_location')
+
+        with freeze_time('2026-10-18 12:00:00') as frozen_time:
+            self.assertEqual(GoogleClient().get_cached_service(*args, ttl=3600)[1], [])
+            # not discovered again before EMPTY_PROFILES_RETRY_INTERVAL
+            self.assertEqual(GoogleClient().get_cached_service(*args, ttl=3600)[1], [])
+            frozen_time.tick(GoogleClient.EMPTY_PROFILES_RETRY_INTERVAL)
+            # discovered again through the cached service
+            self.assertEqual(GoogleClient().get_cached_service(*args, ttl=3600)[1], PROFILES)
+            self.assertEqual(GoogleClient().get_cached_service(*args, ttl=3600)[1], PROFILES)
+
+    def test_find_profile(self):
+        profiles = [{'id': '123', 'website_url': None}, {'id': '456', 'website_url': 'https://www.example.com/'}]
+        self.assertEqual(service_handler.GoogleHandler.find_profile(profiles, None), '123')
+        self.assertEqual(service_handler.GoogleHandler.find_profile(profiles, 456), '456')
+        self.assertEqual(service_handler.GoogleHandler.find_profile(profiles, 'https://www.example.com'), '456')
+        self.assertIsNone(service_handler.GoogleHandler.find_profile(profiles, 789))
+
+    def test_get_thread_http(self):
+        authorized = []
+
+        def get_credentials(scopes, key_file_location):
+            credentials = flexmock()
+            credentials.should_receive('authorize').replace_with(lambda http: authorized.append(http) or http)
+            return credentials
+
+        flexmock(GoogleClient).should_receive('get_credentials').replace_with(get_credentials)
+        client = GoogleClient()
+        args = ('fake_api_name', 'fake_api_version', 'fake_scopes', 'fake_key_file_location')
+        http = client.get_thread_http(*args)
+        self.assertIs(client.get_thread_http(*args), http)
+        self.assertIsNot(client.get_thread_http('fake_api_name', 'fake_api_version', 'fake_scopes', 'other_key'), http)
+        # new credentials, new HTTP object
+        client.invalidate(*args)
+        self.assertIsNot(client.get_thread_http(*args), http)
+        self.assertEqual(len(authorized), 3)
+
+    def test_get_profiles(self):
+        pages = [
+            {'totalResults': 2, 'items': [{'id': '1', 'webProperties': [
+                {'id': 'UA-1-1', 'websiteUrl': 'https://www.example.com', 'profiles': [
+                    {'id': '11', 'name': 'All Web Site Data'}, {'id': '12', 'name': 'Filtered'}]}]}]},
+            {'totalResults': 2, 'items': [{'id': '2', 'webProperties': [
+                {'id': 'UA-2-1', 'websiteUrl': 'https://www.example.org', 'profiles': [
+                    {'id': '21', 'name': 'All Web Site Data'}]}]}]},
+        ]
+        summaries = flexmock()
+        summaries.should_receive('list').with_args(start_index=1, max_results=1000).and_return(
+            flexmock(execute=lambda http=None: pages[0])).twice()
+        summaries.should_receive('list').with_args(start_index=2, max_results=1000).and_return(
+            flexmock(execute=lambda http=None: pages[1])).twice()
+        service = flexmock(management=lambda: flexmock(accountSummaries=lambda: summaries))
+
+        profiles = GoogleClient.get_profiles(service)
+        self.assertEqual([profile['id'] for profile in profiles], ['11', '12', '21'])
+        self.assertEqual(profiles[2]['website_url'], 'https://www.example.org')
+        self.assertEqual(GoogleClient.get_first_profile_id(service), '11')
+
 
 class TestCPanelHandler(TestCase):
 
@@ -60,7 +400,7 @@ class TestCPanelHandler(TestCase):
             'five': 0.5,
             'fifteen': 0.15
         }
-        flexmock(CPanelClient).new_instances(flexmock().should_receive('call').and_return(stubbed_response).mock())
+        flexmock(CPanelClient).should_receive('call').and_return(stubbed_response).once()
         cpanel_handler = service_handler.CPanelHandler(
             host='fake_host',
             username='fake_username',
@@ -73,6 +413,136 @@ class TestCPanelHandler(TestCase):
         self.assertEqual(cpanel_data['cpu_5'], 0.5)
         self.assertEqual(cpanel_data['cpu_15'], 0.15)
 
+    def test_get_cpanel_data_shared_session(self):
+        stubbed_response = flexmock(json=lambda: {'one': 0.1, 'five': 0.5, 'fifteen': 0.15})
+        flexmock(requests.Session).should_receive('get').and_return(stubbed_response).twice()
+        for _ in range(2):
+            service_handler.CPanelHandler(
+                host='shared_host',
+                username='fake_username',
+                password='fake_password',
+                use_ssl=True
+            ).get_cpanel_data()
+
+        session = cpanel_client.get_session('https://shared_host:2087')
+        self.assertIs(CPanelClient('fake_username', 'shared_host', password='fake_password').session, session)
+        self.assertEqual(session.hooks['response'], [instrumentation.count_response_bytes])
+
+    def test_get_cpanel_data_retried_by_policy_only(self):
+        flexmock(time).should_receive('sleep')
+        flexmock(requests.Session).should_receive('get').and_raise(requests.ConnectionError).times(3)
+        cpanel_handler = service_handler.CPanelHandler(
+            host='flaky_host',
+            username='fake_username',
+            password='fake_password',
+            use_ssl=True,
+            max_retries=2
+        )
+        with self.assertRaises(requests.ConnectionError):
+            cpanel_handler.get_cpanel_data()
+
+        adapter = cpanel_client.get_session('https://flaky_host:2087').get_adapter('https://flaky_host:2087')
+        self.assertEqual(adapter.max_retries.total, 0)
+
+    def test_async_sessions_closed_with_their_loop(self):
+        async def get_session():
+            return cpanel_client.get_async_session('https://shared_host:2087')
+
+        sessions = [async_to_sync(get_session)() for _ in range(3)]
+        self.assertEqual(len({id(session) for session in sessions}), 3)
+        self.assertTrue(all(session.is_closed for session in sessions))
+        self.assertEqual(cpanel_client._async_sessions, {})
+
+    def test_get_cpanel_data_async(self):
+        requests_sent = []
+
+        def handler(request):
+            requests_sent.append(request)
+            return httpx.Response(200, json={'one': '0.1', 'five': '0.5', 'fifteen': '0.15'})
+
+        flexmock(requests.Session).should_receive('get').never()
+        flexmock(cpanel_client).should_receive('get_async_session').with_args(
+            'https://fake_host:2087',
+            pool_size=cpanel_client.DEFAULT_POOL_SIZE,
+            response_hooks=(instrumentation.count_response_bytes,)
+        ).and_return(mock_client(handler))
+        cpanel_handler = service_handler.CPanelHandler(
+            host='fake_host',
+            username='fake_username',
+            password='fake_password',
+            use_ssl=True
+        )
+        cpanel_data = asyncio.run(cpanel_handler.get_cpanel_data_async())
+
+        self.assertEqual(cpanel_data, {'cpu_1': 0.1, 'cpu_5': 0.5, 'cpu_15': 0.15})
+        self.assertEqual(str(requests_sent[0].url), 'https://fake_host:2087/json-api/loadavg')
+        self.assertTrue(requests_sent[0].headers['Authorization'].startswith('Basic '))
+
+    def test_get_extended_cpanel_data(self):
+        def ok(data):
+            return {'metadata': {'result': 1}, 'data': data}
+
+        stubbed_response = {
+            'metadata': {'result': 1},
+            'data': {
+                'result': [
+                    ok({'one': '0.1', 'five': '0.5', 'fifteen': '0.15'}),
+                    ok({'partition': [
+                        {'mount': '/', 'used': 100, 'available': 300, 'percentage': 25},
+                        {'mount': '/boot', 'used': 50, 'available': 50, 'percentage': 50},
+                    ]}),
+                    ok({'acct': [{'totalbytes': '1000'}, {'totalbytes': '24'}]}),
+                    ok({'service': [{'name': 'mysql', 'running': 1}]}),
+                    {'metadata': {'result': 0, 'reason': 'Access denied'}},
+                ]
+            }
+        }
+        flexmock(requests.Session).should_receive('get').with_args(
+            'http://fake_host:2086/json-api/batch',
+            params={
+                'command': [
+                    'systemloadavg',
+                    'getdiskusage',
+                    'showbw',
+                    'servicestatus?service=mysql',
+                    'servicestatus?service=httpd'
+                ],
+                'api.version': 1
+            },
+            auth=('fake_username', 'fake_password'),
+            timeout=cpanel_client.DEFAULT_TIMEOUT
+        ).and_return(flexmock(json=lambda: stubbed_response)).once()
+        cpanel_handler = service_handler.CPanelHandler(
+            host='fake_host',
+            username='fake_username',
+            password='fake_password',
+            use_ssl=False,
+            extended=True
+        )
+        cpanel_data = cpanel_handler.get_cpanel_data()
+
+        self.assertEqual(cpanel_data['cpu_1'], 0.1)
+        self.assertEqual(cpanel_data['cpu_15'], 0.15)
+        self.assertEqual(cpanel_data['disk_used'], 150)
+        self.assertEqual(cpanel_data['disk_available'], 350)
+        self.assertEqual(cpanel_data['disk_used_pct'], 50)
+        self.assertEqual(cpanel_data['bandwidth_bytes'], 1024)
+        self.assertEqual(cpanel_data['mysql_running'], 1)
+        self.assertNotIn('apache_running', cpanel_data)
+
+    def test_get_extended_cpanel_data_batch_failure(self):
+        stubbed_response = {'metadata': {'result': 0, 'reason': 'Unknown app'}}
+        flexmock(requests.Session).should_receive('get').and_return(flexmock(json=lambda: stubbed_response))
+        cpanel_handler = service_handler.CPanelHandler(
+            host='fake_host',
+            username='fake_username',
+            password='fake_password',
+            use_ssl=False,
+            extended=True
+        )
+        with self.assertRaises(CallFailed):
+            cpanel_handler.get_cpanel_data()
+
 
 class TestStaticResourceHandler(TestCase):
 
@@ -87,6 +557,19 @@ class TestStaticResourceHandler(TestCase):
         data = static_resource_handler.get_data_with_retry(url)
         self.assertEqual(data.text, 'this_is_fake_data')
 
+    def test_get_data_with_retry_endpoint_by_host(self):
+        instrumentation.registry.reset()
+        flexmock(requests).should_receive('get').and_return(flexmock(text='this_is_fake_data', status_code=200))
+        static_resource_handler = service_handler.StaticResourceHandler(
+            free_ep='fake_free_ep',
+            logs_ep='fake_logs_ep'
+        )
+        for url in ('http://fake_host/free?tick=1', 'http://fake_host/logs?tick=2'):
+            static_resource_handler.get_data_with_retry(url)
+        self.assertEqual(instrumentation.registry.counter(
+            'hostinguard_outbound_calls_total', {'endpoint': 'static:fake_host'}), 2)
+        instrumentation.registry.reset()
+
     def test_get_data_with_retry_missing_data(self):
         url = 'fake_url'
         flexmock(requests).should_receive('get').and_return(flexmock(text='', status_code=200))
@@ -132,6 +615,15 @@ class TestStaticResourceHandler(TestCase):
         self.assertEqual(memory_data['used_swap'], 0)
         self.assertEqual(memory_data['free_swap'], 20475)
 
+    def test_get_memory_data_unavailable(self):
+        flexmock(service_handler.StaticResourceHandler).should_receive('get_data_with_retry').and_return(None)
+        static_resource_handler = service_handler.StaticResourceHandler(
+            free_ep='fake_free_ep',
+            logs_ep='fake_logs_ep'
+        )
+        with self.assertRaises(ResourceUnavailable):
+            static_resource_handler.get_memory_data()
+
     def test_get_logs_data_ok(self):
         stubbed_logs = ' 663620 200 \n' \
                        '  11882 304 \n' \
@@ -157,6 +649,78 @@ class TestStaticResourceHandler(TestCase):
         self.assertEqual(logs_data[404], 795)
         self.assertEqual(logs_data[400], 2)
 
+    def test_get_logs_data_raw_lines_of_today(self):
+        stubbed_logs = '1.2.3.4 - - [17/Oct/2026:23:59:59 +0000] "GET / HTTP/1.1" 500 0\n' \
+                       '1.2.3.4 - - [18/Oct/2026:10:00:00 +0000] "GET / HTTP/1.1" 200 1234\n' \
+                       '1.2.3.4 - - [18/Oct/2026:10:00:01 +0000] "GET /x HTTP/1.1" 404 12'
+        flexmock(service_handler.StaticResourceHandler).should_receive(
+            'get_data_with_retry').and_return(flexmock(text=stubbed_logs))
+        flexmock(service_handler.StaticResourceHandler).should_receive(
+            'get_data_with_retry_async').replace_with(lambda url: asyncio.sleep(0, flexmock(text=stubbed_logs)))
+        static_resource_handler = service_handler.StaticResourceHandler(
+            free_ep='fake_free_ep',
+            logs_ep='fake_logs_ep'
+        )
+        with freeze_time('2026-10-18 12:00:00'):
+            logs_data = static_resource_handler.get_logs_data()
+            logs_data_async = asyncio.run(static_resource_handler.get_logs_data_async())
+        # yesterday's 500 left out
+        self.assertEqual(logs_data, {200: 1, 404: 1})
+        self.assertEqual(logs_data_async, {200: 1, 404: 1})
+
+    def test_get_logs_data_streamed(self):
+        stubbed_lines = [
+            b'1.2.3.4 - - [18/Oct/2026:10:00:00 +0000] "GET / HTTP/1.1" 200 1234 "-" "curl/7.58.0"',
+            b'1.2.3.4 - - [18/Oct/2026:10:00:01 +0000] "GET / HTTP/1.1" 200 1234 "-" "curl/7.58.0"',
+            b'1.2.3.4 - - [18/Oct/2026:10:00:02 +0000] "GET /x HTTP/1.1" 404 12 "-" "curl/7.58.0"',
+        ]
+        stubbed_response = flexmock(status_code=200, iter_lines=lambda: iter(stubbed_lines))
+        stubbed_response.should_receive('__enter__').and_return(stubbed_response)
+        stubbed_response.should_receive('__exit__')
+        flexmock(requests).should_receive('get').with_args('fake_logs_ep', timeout=5, stream=True).and_return(
+            stubbed_response).once()
+        static_resource_handler = service_handler.StaticResourceHandler(
+            free_ep='fake_free_ep',
+            logs_ep='fake_logs_ep',
+            stream_logs=True
+        )
+        with freeze_time('2026-10-18 12:00:00'):
+            logs_data = static_resource_handler.get_logs_data()
+        self.assertEqual(logs_data, {200: 2, 404: 1})
+
+    def test_get_memory_data_async(self):
+        stubbed_free = '              total        used        free      shared  buff/cache   available\n' \
+                       'Mem:          31753        2772       14548          74       14432       28411\n' \
+                       'Swap:         20475           0       20475'
+        flexmock(requests).should_receive('get').never()
+        flexmock(async_http).should_receive('get_client').and_return(
+            mock_client(lambda request: httpx.Response(200, text=stubbed_free)))
+        static_resource_handler = service_handler.StaticResourceHandler(
+            free_ep='http://fake_host/free',
+            logs_ep='http://fake_host/logs'
+        )
+        memory_data = asyncio.run(static_resource_handler.get_memory_data_async())
+        self.assertEqual(memory_data['total_mem'], 31753)
+        self.assertEqual(memory_data['free_swap'], 20475)
+
+    def test_get_logs_data_streamed_async(self):
+        stubbed_lines = [
+            '1.2.3.4 - - [18/Oct/2026:10:00:00 +0000] "GET / HTTP/1.1" 200 1234 "-" "curl/7.58.0"',
+            '1.2.3.4 - - [18/Oct/2026:10:00:01 +0000] "GET / HTTP/1.1" 200 1234 "-" "curl/7.58.0"',
+            '1.2.3.4 - - [18/Oct/2026:10:00:02 +0000] "GET /x HTTP/1.1" 404 12 "-" "curl/7.58.0"',
+        ]
+        flexmock(async_http).should_receive('get_client').and_return(
+            mock_client(lambda request: httpx.Response(200, text='\n'.join(stubbed_lines))))
+        flexmock(service_handler.StaticResourceHandler, STREAM_CHUNK_LINES=2)
+        static_resource_handler = service_handler.StaticResourceHandler(
+            free_ep='http://fake_host/free',
+            logs_ep='http://fake_host/logs',
+            stream_logs=True
+        )
+        with freeze_time('2026-10-18 12:00:00'):
+            logs_data = asyncio.run(static_resource_handler.get_logs_data_async())
+        self.assertEqual(logs_data, {200: 2, 404: 1})
+
     def test_get_logs_missing_data(self):
         stubbed_logs = None
         flexmock(service_handler.StaticResourceHandler).should_receive('get_data_with_retry').and_return(stubbed_logs)
@@ -168,15 +732,100 @@ class TestStaticResourceHandler(TestCase):
         self.assertEqual(logs_data[999], 1)
 
 
+class TestProcResourceHandler(TestCase):
+    MEMINFO = (
+        'MemTotal:       32515072 kB\n'
+        'MemFree:        14897152 kB\n'
+        'MemAvailable:   29092864 kB\n'
+        'Buffers:          204800 kB\n'
+        'Cached:         14225408 kB\n'
+        'Shmem:             75776 kB\n'
+        'SReclaimable:     348160 kB\n'
+        'SwapTotal:      20966400 kB\n'
+        'SwapFree:       20966400 kB\n'
+    )
+    NET_DEV = (
+        'Inter-|   Receive                                                |  Transmit\n'
+        ' face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets\n'
+        '    lo: {lo} 10 0 0 0 0 0 0 {lo} 10 0 0 0 0 0 0\n'
+        '  eth0: {rx} 10 0 0 0 0 0 0 {tx} 10 0 0 0 0 0 0\n'
+    )
+
+    def setUp(self):
+        self.proc_root = tempfile.mkdtemp()
+        self.sys_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.proc_root, 'net'))
+        os.makedirs(os.path.join(self.sys_root, 'block', 'sda'))
+        self.write_proc(busy=100, idle=900, sectors=0, rx=0, tx=0)
+
+    def tearDown(self):
+        procfs_client.reset()
+        shutil.rmtree(self.proc_root)
+        shutil.rmtree(self.sys_root)
+
+    def write_proc(self, busy, idle, sectors, rx, tx):
+        files = {
+            'meminfo': self.MEMINFO,
+            'loadavg': '0.52 0.58 0.59 1/467 12345\n',
+            'stat': 'cpu  %d 0 0 %d 0 0 0 0 0 0\ncpu0 %d 0 0 %d 0 0 0 0 0 0\n' % (busy, idle, busy, idle),
+            'diskstats': (
+                '   8       0 sda 10 0 %d 0 10 0 %d 0 0 0 0\n'
+                '   8       1 sda1 10 0 %d 0 10 0 %d 0 0 0 0\n'
+                '   7       0 loop0 10 0 999 0 10 0 999 0 0 0 0\n'
+            ) % (sectors, sectors, sectors, sectors),
+            'net/dev': self.NET_DEV.format(lo=999, rx=rx, tx=tx),
+        }
+        for name, content in files.items():
+            with open(os.path.join(self.proc_root, name), 'w') as proc_file:
+                proc_file.write(content)
+
+    def test_get_memory_data(self):
+        proc_resource_handler = service_handler.ProcResourceHandler(proc_root=self.proc_root)
+        data = proc_resource_handler.get_memory_data()
+        self.assertEqual(data['total_mem'], 31753)
+        self.assertEqual(data['free_mem'], 14548)
+        self.assertEqual(data['buffers_cache'], 14432)
+        self.assertEqual(data['used_mem'], 2773)
+        self.assertEqual(data['available'], 28411)
+        self.assertEqual(data['used_swap'], 0)
+        self.assertEqual(data['proc_load_5'], 0.58)
+        # the WHM load averages are left alone
+        self.assertNotIn('cpu_5', data)
+        self.assertNotIn('cpu_usage_pct', data)
+
+        self.write_proc(busy=400, idle=1600, sectors=0, rx=0, tx=0)
+        data = proc_resource_handler.get_memory_data()
+        self.assertEqual(data['cpu_usage_pct'], 30.0)
+        self.assertIn('net_rx_bytes_per_sec', data)
+
+    def test_rates(self):
+        client = procfs_client.Client(root=self.proc_root, sys_root=self.sys_root)
+        self.assertIsNone(client.sample()['disk_rates'])
+        self.write_proc(busy=100, idle=900, sectors=8, rx=1000, tx=500)
+        time.sleep(0.01)
+        sample = client.sample()
+        client.close()
+        disk_read, disk_written = sample['disk_rates']
+        received, transmitted = sample['net_rates']
+        # the partition and the loop device are not accounted
+        self.assertEqual(disk_read, disk_written)
+        self.assertGreater(disk_read, 0)
+        self.assertEqual(received, 2 * transmitted)
+        self.assertEqual(sample['cpu_usage'], 0.0)
+
+
 class TestElasticSearchHandler(TestCase):
 
+    def setUp(self):
+        es_writer.reset()
+
     def test_write_result(self):
         mock_data = {
             'fake_field_1': 1,
             'fake_field:2': 2,
             'fake_field_n': 100
         }
-        flexmock(Elasticsearch).new_instances(flexmock().should_receive('index').and_return({'created': True}).mock())
+        flexmock(Elasticsearch).should_receive('index').and_return({'created': True}).once()
         elastic_search_handler = service_handler.ElasticSearchHandler(
             es_service='fake_es_service',
             index='fake_index',
@@ -184,3 +833,22 @@ class TestElasticSearchHandler(TestCase):
         )
         result = elastic_search_handler.write_result(mock_data)
         self.assertTrue(result['created'])
+
+    def test_write_result_async(self):
+        requests_sent = []
+
+        def handler(request):
+            requests_sent.append(request)
+            return httpx.Response(201, json={'_id': 'fake_id', 'result': 'created'})
+
+        flexmock(Elasticsearch).should_receive('index').never()
+        flexmock(async_http).should_receive('get_client').and_return(mock_client(handler))
+        elastic_search_handler = service_handler.ElasticSearchHandler(
+            es_service='fake_es_service',
+            index='fake_index',
+            doc_type='fake_doc_type'
+        )
+        result = asyncio.run(elastic_search_handler.write_result_async({'fake_field_1': 1}))
+        self.assertEqual(result['result'], 'created')
+        self.assertEqual(str(requests_sent[0].url), 'http://fake_es_service:9200/fake_index/fake_doc_type')
+        self.assertEqual(json.loads(requests_sent[0].content)['fake_field_1'], 1)
@@ -0,0 +1,198 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from flexmock import flexmock
+
+from api.v1.hostinguard import es_writer, exceptions, spool
+
+
+def created(client, actions, **kwargs):
+    return [(True, {'index': {'result': 'created'}}) for _ in actions]
+
+
+def unreachable(client, actions, **kwargs):
+    raise ConnectionError('es unreachable')
+
+
+class TestSpool(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def build_spool(self, **options):
+        defaults = {'directory': self.directory, 'segment_size': 1024, 'max_bytes': 1024 * 1024, 'fsync': False}
+        defaults.update(options)
+        return spool.Spool(**defaults)
+
+    def append(self, write_ahead_spool, count):
+        for value in range(count):
+            write_ahead_spool.append({'index': 'fake_index', 'doc_type': 'fake_doc_type', 'data': {'a': value}})
+
+    def test_read_and_ack(self):
+        write_ahead_spool = self.build_spool()
+        self.append(write_ahead_spool, 3)
+        batch = write_ahead_spool.read(2)
+        self.assertEqual([document['data']['a'] for document, _ in batch], [0, 1])
+        write_ahead_spool.ack(batch[-1][1])
+        self.assertEqual([document['data']['a'] for document, _ in write_ahead_spool.read(10)], [2])
+
+    def test_segments_deleted_once_acknowledged(self):
+        write_ahead_spool = self.build_spool(segment_size=200)
+        self.append(write_ahead_spool, 20)
+        segments = len(os.listdir(self.directory))
+        self.assertGreater(segments, 2)
+        batch = write_ahead_spool.read(100)
+        self.assertEqual(len(batch), 20)
+        write_ahead_spool.ack(batch[-1][1])
+        self.assertEqual(write_ahead_spool.read(100), [])
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.log')]), 1)
+
+    def test_recovery_after_restart(self):
+        write_ahead_spool = self.build_spool(segment_size=200)
+        self.append(write_ahead_spool, 10)
+        write_ahead_spool.ack(write_ahead_spool.read(4)[-1][1])
+        write_ahead_spool.close()
+        recovered = self.build_spool(segment_size=200)
+        self.assertEqual([document['data']['a'] for document, _ in recovered.read(100)], list(range(4, 10)))
+
+    def test_torn_tail_truncated(self):
+        write_ahead_spool = self.build_spool()
+        self.append(write_ahead_spool, 2)
+        segment = os.path.join(self.directory, spool.SEGMENT_NAME % 1)
+        with open(segment, 'ab') as torn:
+            torn.write(spool.HEADER.pack(100, 0) + b'{"index": ')
+        write_ahead_spool.close()
+        recovered = self.build_spool()
+        self.assertEqual(len(recovered.read(100)), 2)
+        self.append(recovered, 1)
+        self.assertEqual([document['data']['a'] for document, _ in recovered.read(100)], [0, 1, 0])
+
+    def test_bounded_disk_usage(self):
+        write_ahead_spool = self.build_spool(segment_size=200, max_bytes=600)
+        self.append(write_ahead_spool, 50)
+        self.assertLessEqual(write_ahead_spool.size(), 600 + 200)
+        self.assertGreater(write_ahead_spool.dropped, 0)
+        documents = write_ahead_spool.read(100)
+        self.assertEqual(documents[-1][0]['data']['a'], 49)
+        self.assertEqual(len(documents) + write_ahead_spool.dropped, 50)
+
+    def test_directory_owned_by_one_spool(self):
+        write_ahead_spool = self.build_spool()
+        with self.assertRaises(exceptions.ResourceUnavailable):
+            self.build_spool()
+        write_ahead_spool.close()
+        self.build_spool().close()
+
+    def test_open_spool(self):
+        first = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        second = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        self.assertNotEqual(first.directory, second.directory)
+        self.append(first, 2)
+        first.close()
+        # the documents of a stopped process are taken over by the next one
+        third = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        self.assertEqual(third.directory, first.directory)
+        self.assertEqual(len(third.read(10)), 2)
+
+    def test_replay_orphans(self):
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(created)
+        first = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        second = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        self.append(first, 2)
+        self.append(second, 3)
+        first.close()
+        second.close()
+        # only one of the two processes restarts, taking the first slot over
+        restarted = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        self.assertEqual(restarted.directory, first.directory)
+        replayer = spool.SpoolReplayer(
+            restarted,
+            es_service='fake_es_service',
+            batch_size=2,
+            orphans_root=self.directory
+        )
+        self.assertEqual(replayer.replay_orphans(), 3)
+        self.assertEqual(len(restarted.read(10)), 2)
+        # the orphan is released once drained
+        orphan = spool.Spool(second.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        self.assertEqual(orphan.read(10), [])
+        orphan.close()
+
+    def test_replay_orphans_skips_owned_spools(self):
+        flexmock(es_writer).should_receive('streaming_bulk').never()
+        first = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        second = spool.open_spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        self.append(second, 3)
+        replayer = spool.SpoolReplayer(first, es_service='fake_es_service', batch_size=10, orphans_root=self.directory)
+        self.assertEqual(replayer.replay_orphans(), 0)
+        self.assertEqual(len(second.read(10)), 3)
+
+
+class TestSpoolReplayer(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.spool = spool.Spool(self.directory, segment_size=1024, max_bytes=1024 * 1024, fsync=False)
+        for value in range(3):
+            self.spool.append({'index': 'fake_index', 'doc_type': 'fake_doc_type', 'data': {'a': value}})
+        self.replayer = spool.SpoolReplayer(self.spool, es_service='fake_es_service', batch_size=10)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay(self):
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(created)
+        self.assertEqual(self.replayer.replay_batch(), 3)
+        self.assertEqual(self.spool.read(10), [])
+
+    def test_replay_keeps_documents_while_es_unreachable(self):
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(unreachable)
+        self.assertEqual(self.replayer.replay_batch(), -1)
+        self.assertEqual(len(self.spool.read(10)), 3)
+
+    def test_replay_is_idempotent(self):
+        indexed_ids = []
+
+        def stubbed_bulk(client, actions, **kwargs):
+            indexed_ids.extend(action['_id'] for action in actions)
+            return created(client, actions)
+
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(stubbed_bulk)
+        spooled_ids = [document['id'] for document, _ in self.spool.read(10)]
+        self.replayer.replay_batch()
+        self.assertEqual(indexed_ids, spooled_ids)
+
+    def test_replay_sets_poison_documents_aside(self):
+        poison_id = self.spool.read(1)[0][0]['id']
+
+        def stubbed_bulk(client, actions, **kwargs):
+            return [
+                (False, {'index': {'status': 400, 'error': 'mapper_parsing_exception'}})
+                if action['_id'] == poison_id else (True, {'index': {'result': 'created'}})
+                for action in actions
+            ]
+
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(stubbed_bulk)
+        self.assertEqual(self.replayer.replay_batch(), 3)
+        self.assertEqual(self.spool.read(10), [])
+        with open(os.path.join(self.directory, spool.DEAD_LETTER_NAME)) as dead_letter:
+            lines = [json.loads(line) for line in dead_letter]
+        self.assertEqual([line['document']['id'] for line in lines], [poison_id])
+        self.assertEqual(lines[0]['error'], 'mapper_parsing_exception')
+
+    def test_replay_again_on_transient_errors(self):
+        def stubbed_bulk(client, actions, **kwargs):
+            return [(False, {'index': {'status': 429, 'error': 'es_rejected_execution_exception'}})] + [
+                (True, {'index': {'result': 'created'}}) for _ in actions[1:]
+            ]
+
+        flexmock(es_writer).should_receive('streaming_bulk').replace_with(stubbed_bulk)
+        self.assertEqual(self.replayer.replay_batch(), -1)
+        self.assertEqual(len(self.spool.read(10)), 3)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, spool.DEAD_LETTER_NAME)))
@@ -0,0 +1,57 @@
+from unittest import TestCase
+
+from api.v1.hostinguard import timeseries
+
+
+class TestRingBuffer(TestCase):
+
+    def test_append_overwrites_oldest(self):
+        ring = timeseries.RingBuffer(capacity=3)
+        self.assertIsNone(ring.latest())
+        for timestamp in range(5):
+            ring.append(timestamp, timestamp * 10)
+        self.assertEqual(ring.latest(), (4, 40))
+        self.assertEqual(ring.since(0), [[2, 20], [3, 30], [4, 40]])
+
+    def test_since(self):
+        ring = timeseries.RingBuffer(capacity=10)
+        for timestamp in range(12):
+            ring.append(timestamp, 1)
+        self.assertEqual([sample[0] for sample in ring.since(8.5)], [9, 10, 11])
+        self.assertEqual(ring.since(100), [])
+
+    def test_append_out_of_order(self):
+        ring = timeseries.RingBuffer(capacity=4)
+        for timestamp in (1, 3, 5, 2):
+            ring.append(timestamp, timestamp * 10)
+        self.assertEqual(ring.since(0), [[1, 10], [2, 20], [3, 30], [5, 50]])
+        self.assertEqual(ring.latest(), (5, 50))
+        # full: the oldest sample makes room, unless the late one is older still
+        ring.append(4, 40)
+        self.assertEqual(ring.since(0), [[2, 20], [3, 30], [4, 40], [5, 50]])
+        ring.append(0, 0)
+        self.assertEqual(ring.since(0), [[2, 20], [3, 30], [4, 40], [5, 50]])
+        self.assertEqual([sample[0] for sample in ring.since(3.5)], [4, 5])
+
+
+class TestTimeSeriesStore(TestCase):
+
+    def test_record(self):
+        store = timeseries.TimeSeriesStore(capacity=10)
+        store.record('app1', {'cpu_1': 0.5, 'logs_data': {200: 10}, 'partial_sources': ['google']}, timestamp=1)
+        store.record('app1', {'cpu_1': 0.7, 'logs_data': {200: 12}}, timestamp=2)
+
+        self.assertEqual(store.apps(), ['app1'])
+        self.assertEqual(store.latest('app1'), {
+            'cpu_1': {'timestamp': 2, 'value': 0.7},
+            'logs_data.200': {'timestamp': 2, 'value': 12},
+        })
+
+    def test_window(self):
+        store = timeseries.TimeSeriesStore(capacity=10)
+        store.record('app1', {'cpu_1': 0.5, 'available': 100}, timestamp=0)
+        store.record('app1', {'cpu_1': 0.7, 'available': 90})
+        window = store.window('app1', seconds=60, metrics=['cpu_1'])
+        self.assertEqual(list(window), ['cpu_1'])
+        self.assertEqual(len(window['cpu_1']), 1)
+        self.assertEqual(window['cpu_1'][0][1], 0.7)
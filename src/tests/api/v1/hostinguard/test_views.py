@@ -0,0 +1,109 @@
+from django.test import TestCase
+from flexmock import flexmock
+from rest_framework.reverse import reverse
+from rest_framework.status import (HTTP_201_CREATED, HTTP_202_ACCEPTED,
+                                   HTTP_400_BAD_REQUEST, HTTP_403_FORBIDDEN)
+
+from agent import protocol
+from api.v1.hostinguard import collector, es_writer, views
+
+
+def returning(value):
+    """
+    Returns a coroutine function returning `value`, standing in for an async method.
+    """
+    async def method(*args, **kwargs):
+        return value
+    return method
+
+
+class HostinGuardCollectView(TestCase):
+
+    def test_post_success(self):
+        flexmock(collector.CollectionEngine).should_receive('run_async').replace_with(returning({
+            'app1': {'result': 'created'},
+            'app2': {'result': 'created'},
+        })).once()
+        url = reverse('hostinguard-collect')
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'SUCCESS')
+
+    def test_post_queued(self):
+        flexmock(collector.CollectionEngine).should_receive('run_async').replace_with(returning({
+            'app1': {'result': 'queued'},
+            'app2': {'result': 'queued'},
+        })).once()
+        url = reverse('hostinguard-collect')
+        response = self.client.post(url, {})
+        # the same contract as the APP1 update EP
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'QUEUED')
+
+    def test_post_failure(self):
+        flexmock(collector.CollectionEngine).should_receive('run_async').replace_with(returning({
+            'app1': {'result': 'created'},
+            'app2': {'result': 'error', 'error': 'collection failed'},
+        })).once()
+        url = reverse('hostinguard-collect')
+        response = self.client.post(url, {})
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['status'], 'FAILURE')
+        self.assertEqual(response.data['apps']['app2']['error'], 'collection failed')
+
+
+class HostinGuardIngestView(TestCase):
+
+    def setUp(self):
+        flexmock(views.settings, INGEST={'TOKEN': 'secret'})
+
+    def post_frames(self, frames, **headers):
+        headers.setdefault('HTTP_X_HOSTINGUARD_TOKEN', 'secret')
+        url = reverse('hostinguard-ingest')
+        return self.client.post(url, frames, content_type='application/octet-stream', **headers)
+
+    def test_post_success(self):
+        bulk_calls = []
+
+        async def stubbed_bulk(es_service, actions):
+            bulk_calls.append(actions)
+            return [{'result': 'created'} for _ in actions]
+
+        flexmock(es_writer).should_receive('bulk_async').replace_with(stubbed_bulk)
+        frames = protocol.encode('app1', [(1000.0, {'cpu_1': 0.5}), (1001.0, {'cpu_1': 0.7})])
+        response = self.post_frames(frames)
+        self.assertEqual(response.status_code, HTTP_201_CREATED)
+        self.assertEqual(response.data['documents'], 2)
+        self.assertEqual(len(bulk_calls), 1)
+        self.assertEqual([data['cpu_1'] for _, _, data in bulk_calls[0]], [0.5, 0.7])
+        self.assertEqual(bulk_calls[0][0][2]['timestamp'].timestamp(), 1000.0)
+
+    def test_post_spooled(self):
+        flexmock(views.collector).should_receive('write_documents_async').replace_with(
+            returning([{'result': 'spooled'}])).once()
+        response = self.post_frames(protocol.encode('app1', [(1000.0, {'cpu_1': 0.5})]))
+        self.assertEqual(response.status_code, HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'SPOOLED')
+
+    def test_post_malformed(self):
+        response = self.post_frames(b'not a frame')
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'not a hostinguard frame')
+
+    def test_post_unknown_app(self):
+        response = self.post_frames(protocol.encode('unknown', [(1000.0, {'cpu_1': 0.5})]))
+        self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'unknown apps: unknown')
+
+    def test_post_invalid_token(self):
+        frames = protocol.encode('app1', [(1000.0, {'cpu_1': 0.5})])
+        response = self.post_frames(frames, HTTP_X_HOSTINGUARD_TOKEN='bad')
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['error'], 'invalid token')
+
+    def test_post_no_token_configured(self):
+        flexmock(views.settings, INGEST={'TOKEN': None})
+        frames = protocol.encode('app1', [(1000.0, {'cpu_1': 0.5})])
+        response = self.post_frames(frames, HTTP_X_HOSTINGUARD_TOKEN='')
+        self.assertEqual(response.status_code, HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['error'], 'ingest disabled')
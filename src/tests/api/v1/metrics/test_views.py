@@ -0,0 +1,23 @@
+from django.urls import reverse
+from rest_framework.status import HTTP_200_OK
+from rest_framework.test import APITestCase
+
+from api.v1.hostinguard import instrumentation
+
+
+class TestMetricsView(APITestCase):
+
+    def setUp(self):
+        instrumentation.registry.reset()
+
+    def tearDown(self):
+        instrumentation.registry.reset()
+
+    def test_get_ok(self):
+        instrumentation.record_outbound('cpanel:fake_host', attempts=2, duration=0.2, failed=False)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('hostinguard_outbound_calls_total{endpoint="cpanel:fake_host"} 1', body)
+        self.assertIn('hostinguard_outbound_retries_total{endpoint="cpanel:fake_host"} 1', body)
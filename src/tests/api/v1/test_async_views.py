@@ -0,0 +1,58 @@
+import asyncio
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from api.v1.async_views import AsyncAPIView
+from api.v1.health.views import HealthView
+
+
+class FakeView(AsyncAPIView):
+
+    async def get(self, request):
+        await asyncio.sleep(0)
+        return Response(status=status.HTTP_200_OK, data={'async': True})
+
+    def put(self, request):
+        return Response(status=status.HTTP_200_OK, data={'async': False})
+
+    async def post(self, request):
+        raise ValueError('boom')
+
+
+class TestAsyncAPIView(TestCase):
+
+    def setUp(self):
+        self.view = FakeView.as_view()
+        self.factory = APIRequestFactory()
+
+    def test_as_view(self):
+        self.assertTrue(asyncio.iscoroutinefunction(self.view))
+        self.assertTrue(self.view.csrf_exempt)
+        self.assertIs(self.view.cls, FakeView)
+
+    def test_dispatch(self):
+        response = asyncio.run(self.view(self.factory.get('/fake')))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'async': True})
+
+    def test_dispatch_sync_handler(self):
+        response = asyncio.run(self.view(self.factory.put('/fake')))
+        self.assertEqual(response.data, {'async': False})
+
+    def test_dispatch_not_allowed(self):
+        response = asyncio.run(self.view(self.factory.delete('/fake')))
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_dispatch_error(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(self.view(self.factory.post('/fake')))
+
+    async def test_async_client(self):
+        self.assertTrue(asyncio.iscoroutinefunction(HealthView.as_view()))
+        response = await self.async_client.get(reverse('health'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('date', response.json())
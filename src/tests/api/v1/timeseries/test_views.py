@@ -0,0 +1,39 @@
+from django.urls import reverse
+from flexmock import flexmock
+from rest_framework.status import (HTTP_200_OK, HTTP_400_BAD_REQUEST,
+                                   HTTP_404_NOT_FOUND)
+from rest_framework.test import APITestCase
+
+from api.v1.hostinguard import timeseries
+
+
+class TestTimeSeriesViews(APITestCase):
+
+    def setUp(self):
+        store = timeseries.TimeSeriesStore(capacity=10)
+        store.record('app1', {'cpu_1': 0.5, 'available': 100})
+        flexmock(timeseries).should_receive('get_store').and_return(store)
+
+    def test_get_latest(self):
+        url = reverse('timeseries-latest', kwargs={'app': 'app1'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(response.data['cpu_1']['value'], 0.5)
+
+    def test_get_latest_unknown_app(self):
+        url = reverse('timeseries-latest', kwargs={'app': 'app2'})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTP_404_NOT_FOUND)
+
+    def test_get_window(self):
+        url = reverse('timeseries', kwargs={'app': 'app1'})
+        response = self.client.get(url, {'minutes': 15, 'metrics': 'available'})
+        self.assertEqual(response.status_code, HTTP_200_OK)
+        self.assertEqual(list(response.data), ['available'])
+        self.assertEqual(response.data['available'][0][1], 100)
+
+    def test_get_window_invalid_minutes(self):
+        url = reverse('timeseries', kwargs={'app': 'app1'})
+        for minutes in ('many', 'nan', 'inf', '-5', '0'):
+            response = self.client.get(url, {'minutes': minutes})
+            self.assertEqual(response.status_code, HTTP_400_BAD_REQUEST, minutes)
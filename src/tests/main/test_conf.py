@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+from benchmarks import importtime
+from main import conf
+
+
+class TestConf(TestCase):
+
+    def test_get_settings(self):
+        settings = conf.get_settings()
+        self.assertIs(settings, sys.modules['main.settings.development'])
+        self.assertIs(conf.get_settings(), settings)
+
+
+class TestStartup(TestCase):
+    # the budgets are those of "make benchmark-startup", a loaded machine being given that much more
+    BUDGET_MARGIN = 3
+
+    def test_startup_budget(self):
+        for module, budget in importtime.BUDGETS.items():
+            result = importtime.measure(module, top=1)
+            self.assertGreater(result['total'], 0, module)
+            self.assertLessEqual(result['total'], budget * self.BUDGET_MARGIN, module)
+            self.assertEqual(result['eager_backends'], [], module)
+
+    def test_first_use_from_threads(self):
+        # the HTTP clients are imported by the first sources of a tick, run by many threads at once
+        statement = (
+            'import threading, django; django.setup()\n'
+            'from api.v1.hostinguard import access_logs, service_handler\n'
+            'barrier, failures = threading.Barrier(16), []\n'
+            'def use():\n'
+            '    barrier.wait()\n'
+            '    try:\n'
+            '        service_handler.is_network_error(ValueError())\n'
+            '        access_logs.is_network_error(ValueError())\n'
+            '    except Exception as e:\n'
+            '        failures.append(repr(e))\n'
+            'threads = [threading.Thread(target=use) for _ in range(16)]\n'
+            'for thread in threads: thread.start()\n'
+            'for thread in threads: thread.join()\n'
+            'print(failures)'
+        )
+        process = subprocess.run(
+            [sys.executable, '-c', statement],
+            cwd=os.path.dirname(conf.get_settings().BASE_DIR), stdout=subprocess.PIPE, check=True
+        )
+        self.assertEqual(process.stdout.decode('utf-8').splitlines()[-1], '[]')